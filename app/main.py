@@ -1,22 +1,27 @@
 import streamlit as st
 import sys
 import os
+from datetime import datetime
 
 # Thêm thư mục gốc vào sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.llm_handler import generate_user_story
+from core.llm_handler import generate_user_story_stream, lookup_similar_story, search_contexts_batch
+from core.generation_queue import generation_queue
 from core.data_connector import data_connector
-from core.vector_db import VectorDBConnector
+from core.vector_db import get_vector_db
 
-# Khởi tạo vector database
-@st.cache_resource
-def init_vector_db():
-    vdb = VectorDBConnector()
-    vdb.initialize()
-    return vdb
+# Vector database dùng chung toàn process với llm_handler (một client, một bộ index)
+vector_db = get_vector_db()
 
-vector_db = init_vector_db()
+def queue_notifier(placeholder):
+    """Hiển thị vị trí trong hàng đợi Ollama khi phải chờ"""
+    def on_queue(position):
+        if position:
+            placeholder.info(f"⏳ Đang chờ tới lượt Ollama - vị trí {position} trong hàng đợi")
+        else:
+            placeholder.empty()
+    return on_queue
 
 st.set_page_config(
     page_title="BrainStory AI Agent",
@@ -41,6 +46,16 @@ if vector_db.is_initialized:
 else:
     st.sidebar.error("❌ Vector DB chưa khởi tạo")
 
+# Hàng đợi generation (dùng chung cho mọi session)
+st.sidebar.header("⏳ Hàng đợi Ollama")
+queue_stats = generation_queue.stats()
+st.sidebar.metric("Đang chạy", f"{queue_stats['in_flight']}/{queue_stats['max_in_flight']}")
+st.sidebar.metric("Đang chờ", queue_stats["queued"])
+st.sidebar.caption(
+    f"Chờ TB {queue_stats['queue_wait']['avg']}s (p95 {queue_stats['queue_wait']['p95']}s) · "
+    f"Tạo TB {queue_stats['service_time']['avg']}s (p95 {queue_stats['service_time']['p95']}s)"
+)
+
 # Tab chính
 tab1, tab2, tab3, tab4 = st.tabs(["🎯 Tạo User Story", "📊 GitHub Data", "🏢 Rally Data", "🔍 Vector Search"])
 
@@ -53,15 +68,30 @@ with tab1:
         ["Nhập thủ công", "Từ GitHub Issues", "Từ Rally Features", "Kết hợp tất cả"]
     )
     
+    # Bỏ qua generation cache để tạo lại story mới
+    force_regenerate = st.checkbox("🔄 Tạo mới (bỏ qua cache và story tương tự)", value=False)
+    
     if data_source == "Nhập thủ công":
         input_text = st.text_area("Nhập yêu cầu tính năng, email hoặc ghi chú:")
         
         if st.button("🚀 Tạo User Story"):
             if input_text:
-                with st.spinner("Đang tạo user story..."):
-                    result = generate_user_story(input_text)
+                similar = None if force_regenerate else lookup_similar_story(input_text)
+                if similar:
+                    # Đã có story cho yêu cầu gần giống: dùng lại, không gọi AI
+                    st.info(
+                        f"♻️ Dùng lại story đã tạo cho yêu cầu tương tự "
+                        f"(độ tương đồng: {similar['similarity']:.2f}): \"{similar['prompt']}\". "
+                        f"Chọn \"Tạo mới\" để tạo lại."
+                    )
+                    st.markdown(similar["story"])
+                else:
+                    # Hiển thị từng token ngay khi model sinh ra
+                    st.write_stream(generate_user_story_stream(
+                        input_text, force_regenerate=force_regenerate, semantic_cache=False,
+                        on_queue=queue_notifier(st.empty())
+                    ))
                     st.success("✅ Đã tạo user story!")
-                    st.markdown(result)
             else:
                 st.warning("Vui lòng nhập yêu cầu!")
     
@@ -75,32 +105,56 @@ with tab1:
                     
                     if "error" in github_data:
                         st.error(github_data["error"])
+                        st.session_state.pop("github_issues_data", None)
                     else:
-                        st.success(f"✅ Tìm thấy {len(github_data['issues'])} issues")
-                        
-                        # Hiển thị danh sách issues để chọn
-                        if github_data["issues"]:
-                            selected_issues = st.multiselect(
-                                "Chọn issues để tạo User Story:",
-                                options=range(len(github_data["issues"])),
-                                format_func=lambda x: f"#{github_data['issues'][x]['number']} - {github_data['issues'][x]['title']}"
-                            )
-                            
-                            if st.button("🎯 Tạo User Story từ Issues đã chọn"):
-                                if selected_issues:
-                                    combined_text = "\n".join([
-                                        f"Issue #{github_data['issues'][i]['number']}: {github_data['issues'][i]['title']}\n{github_data['issues'][i]['body']}"
-                                        for i in selected_issues
-                                    ])
-                                    
-                                    with st.spinner("Đang tạo user story từ GitHub issues..."):
-                                        result = generate_user_story(combined_text)
-                                        st.success("✅ Đã tạo user story từ GitHub Enterprise!")
-                                        st.markdown(result)
-                                else:
-                                    st.warning("Vui lòng chọn ít nhất 1 issue!")
+                        # Giữ dữ liệu qua các lần rerun để chọn issues và tạo story
+                        st.session_state["github_issues_data"] = github_data
             else:
                 st.warning("Vui lòng nhập repository!")
+        
+        github_data = st.session_state.get("github_issues_data")
+        if github_data:
+            st.success(f"✅ Tìm thấy {len(github_data['issues'])} issues")
+            
+            # Hiển thị danh sách issues để chọn
+            if github_data["issues"]:
+                selected_issues = st.multiselect(
+                    "Chọn issues để tạo User Story:",
+                    options=range(len(github_data["issues"])),
+                    format_func=lambda x: f"#{github_data['issues'][x]['number']} - {github_data['issues'][x]['title']}"
+                )
+                
+                issue_texts = [
+                    f"Issue #{github_data['issues'][i]['number']}: {github_data['issues'][i]['title']}\n{github_data['issues'][i]['body']}"
+                    for i in selected_issues
+                ]
+                
+                col_combined, col_each = st.columns(2)
+                
+                with col_combined:
+                    generate_combined = st.button("🎯 Tạo User Story từ Issues đã chọn")
+                with col_each:
+                    generate_each = st.button("📚 Tạo User Story riêng cho từng issue")
+                
+                if (generate_combined or generate_each) and not selected_issues:
+                    st.warning("Vui lòng chọn ít nhất 1 issue!")
+                elif generate_combined:
+                    st.write_stream(generate_user_story_stream(
+                        "\n".join(issue_texts), force_regenerate=force_regenerate,
+                        on_queue=queue_notifier(st.empty())
+                    ))
+                    st.success("✅ Đã tạo user story từ GitHub Enterprise!")
+                elif generate_each:
+                    # Retrieval cho tất cả issues trong một batch query, sau đó stream từng story
+                    with st.spinner("Đang tìm context liên quan..."):
+                        contexts = search_contexts_batch(issue_texts)
+                    for i, issue_text, relevant_context in zip(selected_issues, issue_texts, contexts):
+                        with st.expander(f"#{github_data['issues'][i]['number']} - {github_data['issues'][i]['title']}", expanded=True):
+                            st.write_stream(generate_user_story_stream(
+                                issue_text, relevant_context=relevant_context, force_regenerate=force_regenerate,
+                                on_queue=queue_notifier(st.empty())
+                            ))
+                    st.success(f"✅ Đã tạo {len(issue_texts)} user stories từ GitHub Enterprise!")
 
 with tab2:
     st.header("📊 Dữ liệu GitHub Enterprise")
@@ -118,6 +172,9 @@ with tab2:
                     if "error" in github_data:
                         st.error(github_data["error"])
                     else:
+                        for part, err in github_data.get("errors", {}).items():
+                            st.warning(f"⚠️ Không lấy được {part}: {err}")
+                        
                         # Thông tin repository
                         repo_info = github_data["repository_info"]
                         st.subheader("ℹ️ Thông tin Repository")
@@ -173,6 +230,9 @@ with tab3:
             if "error" in rally_data:
                 st.error(rally_data["error"])
             else:
+                for part, err in rally_data.get("errors", {}).items():
+                    st.warning(f"⚠️ Không lấy được {part}: {err}")
+                
                 # User Stories
                 st.subheader("📝 User Stories")
                 stories = rally_data["user_stories"]
@@ -226,6 +286,43 @@ with tab4:
             format_func=lambda x: {"all": "Tất cả", "github": "GitHub", "rally": "Rally"}[x]
         )
     
+    # Bộ lọc metadata (lọc ngay trong index, không lọc sau khi tìm)
+    with st.expander("🎛️ Bộ lọc"):
+        col_repo, col_state, col_type = st.columns(3)
+        
+        with col_repo:
+            filter_repo = st.text_input("Repository GitHub:", placeholder="team/project")
+        with col_state:
+            filter_state = st.multiselect(
+                "Trạng thái:",
+                ["open", "closed", "Defined", "In-Progress", "Completed", "Accepted"]
+            )
+        with col_type:
+            filter_type = st.multiselect(
+                "Loại:",
+                ["issue", "repository", "user_story", "feature", "defect"]
+            )
+        
+        col_date, col_contains = st.columns(2)
+        
+        with col_date:
+            filter_by_date = st.checkbox("Lọc theo ngày cập nhật")
+            filter_dates = st.date_input("Khoảng ngày:", value=(), disabled=not filter_by_date)
+        with col_contains:
+            filter_contains = st.text_input("Nội dung chứa:", placeholder="OAuth2")
+    
+    search_filters = {
+        "repo": filter_repo.strip() or None,
+        "state": filter_state,
+        "doc_type": filter_type,
+        "contains": filter_contains.strip() or None
+    }
+    if filter_by_date and filter_dates:
+        search_filters["updated_after"] = filter_dates[0]
+        if len(filter_dates) > 1:
+            # Bao gồm cả ngày cuối
+            search_filters["updated_before"] = datetime.combine(filter_dates[1], datetime.max.time())
+    
     if st.button("🔍 Tìm kiếm", type="primary"):
         if search_query.strip():
             with st.spinner("Đang tìm kiếm..."):
@@ -233,7 +330,8 @@ with tab4:
                     results = vector_db.search_relevant_context(
                         search_query, 
                         context_type=search_type, 
-                        limit=10
+                        limit=10,
+                        **search_filters
                     )
                     
                     if results:
@@ -1,4 +1,4 @@
-import requests
+from core.http_session import get_session, GITHUB_BACKEND
 
 def fetch_github_issues(repo: str, token: str, state: str = "open", github_url: str = "https://ghe.coxautoinc.com") -> str:
     headers = {
@@ -8,7 +8,7 @@ def fetch_github_issues(repo: str, token: str, state: str = "open", github_url:
     # Sử dụng GitHub Enterprise URL
     url = f"{github_url}/api/v3/repos/{repo}/issues?state={state}"
     try:
-        response = requests.get(url, headers=headers)
+        response = get_session(GITHUB_BACKEND).get(url, headers=headers)
         response.raise_for_status()
         issues = response.json()
         if not issues:
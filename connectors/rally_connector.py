@@ -1,4 +1,4 @@
-import requests
+from core.http_session import get_session, RALLY_BACKEND
 
 def fetch_rally_data(query: str, api_key: str, workspace: str, project: str) -> str:
     headers = {
@@ -13,7 +13,7 @@ def fetch_rally_data(query: str, api_key: str, workspace: str, project: str) ->
 
     url = "https://rally1.rallydev.com/slm/webservice/v2.0/hierarchicalrequirement"
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = get_session(RALLY_BACKEND).get(url, headers=headers, params=params)
         response.raise_for_status()
         results = response.json().get("QueryResult", {}).get("Results", [])
         if not results:
@@ -0,0 +1,264 @@
+"""
+Async API cho generate user story
+Chạy song song với API sync trong llm_handler: fetch GitHub/Rally và retrieval từ vector DB
+được offload sang thread (dùng lại pooled sessions và collection Chroma), còn generation
+stream trực tiếp qua `astream` của Ollama client. Mỗi stage có giới hạn concurrency riêng
+để một process phục vụ được nhiều người dùng mà không làm quá tải Ollama hay API bên ngoài.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+
+from .data_connector import data_connector
+from .generation_queue import PRIORITY_INTERACTIVE, generation_queue
+from .llm_handler import (
+    RETRIEVAL_LIMIT, _candidate_models, _create_llm, _finish_generation, _generation_cache_hit, _semantic_cache_hit,
+    build_instruction, lookup_similar_story, prepare_prompt
+)
+from .ollama_registry import model_registry
+from .vector_db import get_vector_db
+
+
+FETCH_STAGE = "fetch"
+RETRIEVAL_STAGE = "retrieval"
+GENERATION_STAGE = "generation"
+
+
+class StageLimiter:
+    def __init__(self, limits=None):
+        """
+        Giới hạn số tác vụ đồng thời cho từng stage
+
+        Args:
+            limits: Dict {stage: số tác vụ tối đa}; mặc định đọc từ env
+                ASYNC_FETCH_CONCURRENCY, ASYNC_RETRIEVAL_CONCURRENCY, ASYNC_GENERATION_CONCURRENCY
+        """
+        self.limits = limits or {
+            FETCH_STAGE: int(os.getenv("ASYNC_FETCH_CONCURRENCY", "8")),
+            RETRIEVAL_STAGE: int(os.getenv("ASYNC_RETRIEVAL_CONCURRENCY", "4")),
+            GENERATION_STAGE: int(os.getenv("ASYNC_GENERATION_CONCURRENCY", "2"))
+        }
+        # asyncio.Semaphore gắn với một event loop (Streamlit có thể chạy nhiều loop ở nhiều thread)
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def semaphore(self, stage):
+        loop = asyncio.get_running_loop()
+        semaphores = self._semaphores.get(loop)
+        if semaphores is None:
+            semaphores = {name: asyncio.Semaphore(max(1, limit)) for name, limit in self.limits.items()}
+            self._semaphores[loop] = semaphores
+        return semaphores[stage]
+
+    async def run(self, stage, func, *args, **kwargs):
+        """Chạy hàm blocking trong thread, tối đa `limits[stage]` lời gọi cùng lúc"""
+        async with self.semaphore(stage):
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+
+# Limiter dùng chung toàn process
+stage_limiter = StageLimiter()
+
+
+class AsyncDataConnector:
+    def __init__(self, connector=None, limiter=None):
+        """
+        Bản async của DataConnector
+
+        Args:
+            connector: DataConnector (mặc định instance dùng chung)
+            limiter: StageLimiter (mặc định stage_limiter)
+        """
+        self.connector = connector or data_connector
+        self.limiter = limiter or stage_limiter
+
+    async def get_github_data(self, repo: str, include_prs: bool = False) -> dict:
+        return await self.limiter.run(FETCH_STAGE, self.connector.get_github_data, repo, include_prs)
+
+    async def get_rally_data(self, workspace: str = "", project: str = "") -> dict:
+        return await self.limiter.run(FETCH_STAGE, self.connector.get_rally_data, workspace, project)
+
+    async def get_context_data(self, github_repo: str = None, rally_workspace: str = None,
+                               rally_project: str = None, include_prs: bool = False) -> dict:
+        """
+        Lấy đồng thời dữ liệu GitHub và Rally, trả về context_data cho generate_user_story
+
+        Nguồn bị lỗi hoàn toàn sẽ bị bỏ qua (lỗi được in ra), không làm hỏng nguồn còn lại.
+        """
+        tasks = {}
+        if github_repo:
+            tasks["github"] = self.get_github_data(github_repo, include_prs)
+        if rally_workspace or rally_project:
+            tasks["rally"] = self.get_rally_data(rally_workspace or "", rally_project or "")
+
+        context_data = {}
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for key, data in zip(tasks, results):
+            if isinstance(data, Exception):
+                print(f"Loi khi lay du lieu {key}: {data}")
+                continue
+            if "error" in data:
+                print(data["error"])
+                continue
+            context_data[key] = data
+
+        if "github" in context_data and "/" in github_repo:
+            owner, name = github_repo.split("/", 1)
+            context_data["github"].setdefault("repo_owner", owner)
+            context_data["github"].setdefault("repo_name", name)
+
+        return context_data
+
+
+async_data_connector = AsyncDataConnector()
+
+
+def _search_relevant_context(prompt: str, limit: int, vector_db=None) -> list:
+    vector_db = vector_db or get_vector_db()
+    if not vector_db.is_initialized:
+        return []
+
+    return vector_db.search_relevant_context(prompt, limit=limit)
+
+
+async def asearch_relevant_context(prompt: str, limit: int = RETRIEVAL_LIMIT, vector_db=None) -> list:
+    """Retrieval từ vector DB, offload sang thread (giới hạn theo ASYNC_RETRIEVAL_CONCURRENCY)"""
+    try:
+        return await stage_limiter.run(RETRIEVAL_STAGE, _search_relevant_context, prompt, limit, vector_db)
+    except Exception as e:
+        print(f"Loi khi tim kiem context: {e}")
+        return []
+
+
+async def alookup_similar_story(prompt: str, threshold: float = None, vector_db=None):
+    return await stage_limiter.run(RETRIEVAL_STAGE, lookup_similar_story, prompt, threshold, vector_db)
+
+
+async def agenerate_user_story(prompt: str, context_data: dict = None, relevant_context: list = None,
+                               github_repo: str = None, rally_workspace: str = None, rally_project: str = None,
+                               force_regenerate: bool = False, semantic_cache: bool = True,
+                               fallback: bool = True, priority: int = PRIORITY_INTERACTIVE,
+                               on_queue=None, vector_db=None) -> str:
+    """Bản async của generate_user_story"""
+    chunks = []
+    async for chunk in agenerate_user_story_stream(
+        prompt, context_data, relevant_context, github_repo, rally_workspace, rally_project,
+        force_regenerate, semantic_cache, fallback, priority, on_queue, vector_db
+    ):
+        chunks.append(chunk)
+    return "".join(chunks)
+
+
+async def agenerate_user_story_stream(prompt: str, context_data: dict = None, relevant_context: list = None,
+                                      github_repo: str = None, rally_workspace: str = None,
+                                      rally_project: str = None, force_regenerate: bool = False,
+                                      semantic_cache: bool = True, fallback: bool = True,
+                                      priority: int = PRIORITY_INTERACTIVE, on_queue=None,
+                                      vector_db=None):
+    """
+    Bản async của generate_user_story_stream
+
+    Nếu truyền github_repo/rally_workspace/rally_project, dữ liệu được fetch song song
+    với retrieval từ vector DB trước khi ghép prompt; generation chờ slot theo
+    ASYNC_GENERATION_CONCURRENCY, rồi xếp hàng trong generation_queue (dùng chung với
+    API sync) trước khi stream từng token.
+    """
+    has_sources = bool(github_repo or rally_workspace or rally_project)
+    # Khởi tạo (nếu cần) trong thread để không chặn event loop
+    vector_db = vector_db or await asyncio.to_thread(get_vector_db)
+
+    # Semantic cache: chỉ áp dụng khi không có context từ API (giống bản sync)
+    cached_story = await stage_limiter.run(
+        RETRIEVAL_STAGE, _semantic_cache_hit, prompt, context_data or has_sources, force_regenerate,
+        semantic_cache, vector_db
+    )
+    if cached_story is not None:
+        yield cached_story
+        return
+
+    # Fetch dữ liệu và retrieval chạy song song
+    pending = {}
+    if has_sources:
+        pending["context_data"] = async_data_connector.get_context_data(github_repo, rally_workspace, rally_project)
+    if relevant_context is None:
+        pending["relevant_context"] = asearch_relevant_context(prompt, vector_db=vector_db)
+
+    results = dict(zip(pending, await asyncio.gather(*pending.values())))
+    if "context_data" in results:
+        context_data = {**(context_data or {}), **results["context_data"]}
+    relevant_context = results.get("relevant_context", relevant_context)
+
+    # relevant_context đã có nên prepare_prompt không retrieval lại, chỉ ghép prompt và lưu context
+    enhanced_prompt = await stage_limiter.run(
+        RETRIEVAL_STAGE, prepare_prompt, prompt, context_data, relevant_context, vector_db
+    )
+
+    models = await asyncio.to_thread(_candidate_models)
+    cached_story = await asyncio.to_thread(_generation_cache_hit, enhanced_prompt, force_regenerate, models)
+    if cached_story is not None:
+        yield cached_story
+        return
+
+    chunks = []
+    completed_model = None
+    async with stage_limiter.semaphore(GENERATION_STAGE):
+        ticket = await _acquire_generation_slot(priority, on_queue) if models else None
+        try:
+            for model in models:
+                try:
+                    print(f"Dang thu model: {model}")
+                    llm = await asyncio.to_thread(_create_llm, model)
+                    async for chunk in llm.astream(build_instruction(enhanced_prompt)):
+                        chunks.append(chunk)
+                        yield chunk
+                    print(f"Thanh cong voi model: {model}")
+                    completed_model = model
+                    break
+                except Exception as e:
+                    print(f"Model {model} loi: {str(e)}")
+                    model_registry.invalidate()
+                    # Da stream mot phan cho nguoi dung thi khong doi model giua chung
+                    if chunks:
+                        break
+                    continue
+        finally:
+            if ticket is not None:
+                generation_queue.release(ticket)
+
+    setup_guide = await asyncio.to_thread(
+        _finish_generation, prompt, enhanced_prompt, context_data, chunks, completed_model, fallback, vector_db
+    )
+    if setup_guide:
+        yield setup_guide
+
+
+async def _acquire_generation_slot(priority, on_queue):
+    """
+    Chờ slot trong generation_queue từ thread, hủy được
+
+    Nếu coroutine bị hủy khi đang chờ (client ngắt kết nối, timeout), request rời hàng đợi;
+    nếu thread đã kịp nhận slot thì slot được trả lại ngay.
+    """
+    cancel_event = threading.Event()
+    future = asyncio.ensure_future(asyncio.to_thread(
+        generation_queue.acquire, priority, on_queue, None, cancel_event
+    ))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        generation_queue.cancel(cancel_event)
+
+        def release_if_admitted(done):
+            if not done.cancelled() and done.exception() is None:
+                generation_queue.release(done.result())
+
+        future.add_done_callback(release_if_admitted)
+        raise
+
+
+async def agenerate_user_stories(prompts: list, context_data: dict = None, **kwargs) -> list:
+    """Tạo nhiều user story đồng thời (mỗi stage vẫn bị giới hạn bởi stage_limiter)"""
+    return await asyncio.gather(*(
+        agenerate_user_story(prompt, context_data, **kwargs) for prompt in prompts
+    ))
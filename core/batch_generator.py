@@ -0,0 +1,216 @@
+"""
+Batch user story generation
+Nhận list hoặc JSONL prompts, retrieval theo batch, gọi Ollama qua worker pool giới hạn,
+ghi kết quả ra JSONL ngay khi xong (kèm lưu vào user_stories) và resume được khi bị ngắt.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from .generation_queue import PRIORITY_BATCH
+from .llm_handler import generate_user_story, search_contexts_batch
+
+
+def prompt_id(prompt):
+    """ID ổn định cho prompt không có id riêng"""
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def read_prompts(source):
+    """
+    Đọc prompts từ list hoặc file JSONL
+
+    Mỗi phần tử có thể là chuỗi, hoặc dict {"id": ..., "prompt": ...}.
+    Trong JSONL, mỗi dòng là một dict như trên hoặc một chuỗi JSON.
+
+    Yields:
+        Dict {"id", "prompt"}
+    """
+    if isinstance(source, (str, Path)):
+        def records():
+            with open(source, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        items = records()
+    else:
+        items = source
+
+    for item in items:
+        if isinstance(item, str):
+            item = {"prompt": item}
+        prompt = item.get("prompt") or item.get("text") or ""
+        if prompt.strip():
+            yield {"id": str(item.get("id") or prompt_id(prompt)), "prompt": prompt}
+
+
+def prompts_from_rally_features(connector, workspace="", project=""):
+    """Tạo prompts từ backlog Features của Rally"""
+    for feature in connector.iter_rally_features(workspace, project):
+        yield {
+            "id": feature.get("formatted_id"),
+            "prompt": f"Feature {feature.get('formatted_id')}: {feature.get('name')}\n{feature.get('description') or ''}"
+        }
+
+
+class BatchStats:
+    def __init__(self):
+        """Thống kê throughput và thời gian từng stage"""
+        self.started_at = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.stage_seconds = {"retrieval": 0.0, "generation": 0.0, "write": 0.0}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+
+    def as_dict(self):
+        elapsed = time.time() - self.started_at
+        done = self.completed + self.failed
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_seconds": round(elapsed, 2),
+            "stories_per_minute": round(self.completed / elapsed * 60, 2) if elapsed else 0.0,
+            "stage_seconds": {k: round(v, 2) for k, v in self.stage_seconds.items()},
+            "avg_generation_seconds": round(self.stage_seconds["generation"] / done, 2) if done else 0.0
+        }
+
+
+class BatchStoryGenerator:
+    def __init__(self, output_path, workers=None, retrieval_batch_size=16, semantic_cache=True):
+        """
+        Khởi tạo batch generator
+
+        Args:
+            output_path: File JSONL kết quả (cũng dùng để resume)
+            workers: Số generation chạy đồng thời (mặc định BATCH_WORKERS hoặc 1)
+            retrieval_batch_size: Số prompts mỗi lần batch retrieval
+            semantic_cache: Cho phép dùng lại story của prompt gần giống
+        """
+        self.output_path = Path(output_path)
+        self.workers = workers or int(os.getenv("BATCH_WORKERS", "1"))
+        self.retrieval_batch_size = retrieval_batch_size
+        self.semantic_cache = semantic_cache
+        self.stats = BatchStats()
+        self._write_lock = threading.Lock()
+
+    def completed_ids(self):
+        """IDs đã generate thành công trong các lần chạy trước"""
+        done = set()
+        if not self.output_path.exists():
+            return done
+
+        with open(self.output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Dòng cuối có thể bị cắt dở khi tiến trình bị kill
+                    continue
+                if record.get("status") == "ok":
+                    done.add(record.get("id"))
+        return done
+
+    def run(self, prompts, progress=None):
+        """
+        Chạy batch generation
+
+        Args:
+            prompts: List/generator prompts hoặc đường dẫn JSONL (xem read_prompts)
+            progress: Callback(stats_dict) gọi sau mỗi story hoàn thành
+
+        Returns:
+            Dict thống kê (throughput, thời gian từng stage)
+        """
+        done = self.completed_ids()
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        pending = set()
+        items = read_prompts(prompts)
+
+        with open(self.output_path, "a", encoding="utf-8") as output, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="story-worker") as executor:
+
+            exhausted = False
+            while not exhausted:
+                # Gom một batch prompts chưa làm để retrieval cùng lúc
+                batch = []
+                while len(batch) < self.retrieval_batch_size:
+                    item = next(items, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    if item["id"] in done:
+                        self.stats.skipped += 1
+                        continue
+                    done.add(item["id"])
+                    batch.append(item)
+
+                if not batch:
+                    continue
+
+                start = time.perf_counter()
+                contexts = search_contexts_batch([item["prompt"] for item in batch])
+                self.stats.add_stage("retrieval", time.perf_counter() - start)
+
+                for item, relevant_context in zip(batch, contexts):
+                    # Giới hạn số task chờ để không giữ cả backlog trong RAM
+                    while len(pending) >= self.workers * 2:
+                        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        pending -= finished
+                        self._drain(finished, output, progress)
+
+                    pending.add(executor.submit(self._generate, item, relevant_context))
+
+            finished, _ = wait(pending)
+            self._drain(finished, output, progress)
+
+        return self.stats.as_dict()
+
+    def _generate(self, item, relevant_context):
+        start = time.perf_counter()
+        record = {"id": item["id"], "prompt": item["prompt"]}
+        try:
+            record["story"] = generate_user_story(
+                item["prompt"], relevant_context=relevant_context,
+                semantic_cache=self.semantic_cache, fallback=False,
+                # Nhường Ollama cho người dùng tương tác
+                priority=PRIORITY_BATCH
+            )
+            record["status"] = "ok"
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+
+        duration = time.perf_counter() - start
+        record["generation_seconds"] = round(duration, 3)
+        self.stats.add_stage("generation", duration)
+        return record
+
+    def _drain(self, futures, output, progress):
+        for future in futures:
+            record = future.result()
+
+            start = time.perf_counter()
+            with self._write_lock:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+            self.stats.add_stage("write", time.perf_counter() - start)
+
+            if record["status"] == "ok":
+                self.stats.completed += 1
+            else:
+                self.stats.failed += 1
+
+            if progress:
+                progress(self.stats.as_dict())
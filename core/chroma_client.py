@@ -0,0 +1,75 @@
+"""
+Tạo ChromaDB client theo cấu hình trong .env
+Chế độ `embedded` (mặc định) mở thẳng thư mục ChromaDB trong process; chế độ `http` kết nối tới
+một ChromaDB server (khởi động bằng `python scripts/start_vector_db.py --serve`) để nhiều
+Streamlit worker dùng chung một bộ SQLite/HNSW thay vì mỗi process tự mở và load vào RAM.
+"""
+
+import os
+from pathlib import Path
+
+import chromadb
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+MODE_EMBEDDED = "embedded"
+MODE_HTTP = "http"
+
+
+def server_settings() -> dict:
+    """
+    Cấu hình kết nối đọc từ env
+
+    Cấu hình qua env:
+        VECTOR_DB_MODE: "embedded" (mặc định) hoặc "http"
+        CHROMA_HOST / CHROMA_PORT: Địa chỉ ChromaDB server (mặc định localhost:8000)
+        CHROMA_SSL: "1" để kết nối qua HTTPS
+        CHROMA_AUTH_TOKEN: Token gửi kèm header Authorization (nếu server bật auth)
+    """
+    mode = os.getenv("VECTOR_DB_MODE", MODE_EMBEDDED).strip().lower()
+    if mode not in (MODE_EMBEDDED, MODE_HTTP):
+        print(f"VECTOR_DB_MODE khong hop le: {mode}, dung {MODE_EMBEDDED}")
+        mode = MODE_EMBEDDED
+
+    return {
+        "mode": mode,
+        "host": os.getenv("CHROMA_HOST", "localhost"),
+        "port": int(os.getenv("CHROMA_PORT", "8000")),
+        "ssl": os.getenv("CHROMA_SSL", "0") in ("1", "true", "True"),
+        "auth_token": os.getenv("CHROMA_AUTH_TOKEN", "")
+    }
+
+
+def create_chroma_client(db_path="./chroma_db", settings=None):
+    """
+    Tạo ChromaDB client
+
+    Args:
+        db_path: Thư mục ChromaDB (chỉ dùng ở chế độ embedded)
+        settings: Ghi đè cấu hình của server_settings()
+
+    Returns:
+        chromadb.PersistentClient hoặc chromadb.HttpClient
+    """
+    settings = settings or server_settings()
+    if settings["mode"] != MODE_HTTP:
+        Path(db_path).mkdir(parents=True, exist_ok=True)
+        return chromadb.PersistentClient(path=db_path)
+
+    headers = {"Authorization": f"Bearer {settings['auth_token']}"} if settings["auth_token"] else None
+    client = chromadb.HttpClient(
+        host=settings["host"], port=settings["port"], ssl=settings["ssl"], headers=headers
+    )
+    # Báo lỗi ngay khi server chưa chạy thay vì ở lần query đầu tiên
+    client.heartbeat()
+    return client
+
+
+def describe(db_path="./chroma_db", settings=None) -> str:
+    settings = settings or server_settings()
+    if settings["mode"] != MODE_HTTP:
+        return db_path
+    scheme = "https" if settings["ssl"] else "http"
+    return f"{scheme}://{settings['host']}:{settings['port']}"
@@ -0,0 +1,258 @@
+"""
+Chia document dài (README, issue body, Rally description) thành các chunk trước khi embed
+Chunk theo heading Markdown và đoạn văn, có overlap giữa các chunk liền kề; HTML từ Rally
+được chuyển về text trước. Mỗi chunk mang `parent_id` để kết quả tìm kiếm gom lại theo document gốc.
+"""
+
+import html
+import os
+import re
+import textwrap
+
+
+_HTML_TAG_RE = re.compile(r"<[a-zA-Z/!][^>]*>")
+_HTML_BLOCK_RE = re.compile(r"<\s*(br|/p|/div|/li|/tr|/h[1-6]|/ul|/ol|/table)\s*/?>", re.IGNORECASE)
+_HTML_ITEM_RE = re.compile(r"<\s*li[^>]*>", re.IGNORECASE)
+_HEADING_RE = re.compile(r"^#{1,6}\s+\S")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+# Dòng tiêu đề của document tạo ở core/documents.py: "Issue #12: ...", "User Story US34: ..."
+_TITLE_RE = re.compile(r"^(Issue #\d+|(User Story|Story|Feature|Defect)\b[^:]*):")
+
+
+def html_to_text(text: str) -> str:
+    """Bỏ thẻ HTML, giữ xuống dòng giữa các block và gạch đầu dòng cho list"""
+    if not text or not _HTML_TAG_RE.search(text):
+        return text or ""
+
+    text = _HTML_ITEM_RE.sub("\n- ", text)
+    text = _HTML_BLOCK_RE.sub("\n", text)
+    text = _HTML_TAG_RE.sub("", text)
+    return html.unescape(text)
+
+
+def _shorten(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def chunk_id(parent_id: str, index: int) -> str:
+    return f"{parent_id}#chunk{index}"
+
+
+class Chunker:
+    def __init__(self, size=None, overlap=None, enabled=None):
+        """
+        Khởi tạo chunker
+
+        Args:
+            size: Số ký tự tối đa mỗi chunk (CHUNK_SIZE, mặc định 1000 ~ giới hạn input của model embedding)
+            overlap: Số ký tự lặp lại từ cuối chunk trước (CHUNK_OVERLAP, mặc định 150)
+            enabled: Bật/tắt chunking (CHUNKING, mặc định bật)
+        """
+        if enabled is None:
+            enabled = os.getenv("CHUNKING", "1") not in ("0", "false", "False")
+        self.enabled = enabled
+        self.size = max(200, size or int(os.getenv("CHUNK_SIZE", "1000")))
+        self.overlap = min(self.size // 2, overlap if overlap is not None else int(os.getenv("CHUNK_OVERLAP", "150")))
+
+    def split(self, text: str) -> list:
+        """
+        Chia text thành các chunk
+
+        Text ngắn hơn `size` được trả về nguyên vẹn (một chunk) để ID và content hash không đổi.
+        """
+        if not self.enabled or len(text or "") <= self.size:
+            return [text or ""]
+
+        text = textwrap.dedent(html_to_text(text)).strip()
+        lines = [line.rstrip() for line in text.splitlines()]
+
+        # Dòng đầu ngắn hoặc là tiêu đề document (vd: "Issue #12: ...") được lặp lại ở mỗi chunk để
+        # giữ ngữ cảnh; dòng đầu dài (đoạn văn không có tiêu đề) vẫn là nội dung
+        limit = self.size // 4
+        start = next((i for i, line in enumerate(lines) if line.strip()), 0)
+        first = lines[start].strip() if lines else ""
+        title = ""
+        if _HEADING_RE.match(first):
+            title = first
+        elif len(first) <= limit:
+            title = first
+            lines = lines[start + 1:]
+        elif _TITLE_RE.match(first):
+            title = _shorten(first, limit)
+
+        chunks = []
+        for heading, paragraphs in self._sections(lines):
+            prefix = title if not heading or heading == title else "\n".join(filter(None, (title, heading)))
+            if len(prefix) > limit:
+                # Prefix bị cắt ngắn: giữ nguyên văn heading ở đầu section
+                if heading:
+                    paragraphs = [heading] + paragraphs
+                prefix = _shorten(prefix, limit)
+            chunks.extend(self._pack(paragraphs, prefix))
+
+        return [chunk for chunk in chunks if chunk.strip()] or [text]
+
+    def _sections(self, lines):
+        """Tách theo heading Markdown (bỏ qua heading nằm trong code block)"""
+        heading = ""
+        paragraphs = []
+        current = []
+        in_code = False
+
+        for line in lines:
+            if line.lstrip().startswith("```"):
+                in_code = not in_code
+
+            if not in_code and _HEADING_RE.match(line.lstrip()):
+                if current:
+                    paragraphs.append("\n".join(current))
+                    current = []
+                if paragraphs:
+                    yield heading, paragraphs
+                heading, paragraphs = line.strip(), []
+                continue
+
+            if not in_code and not line.strip():
+                if current:
+                    paragraphs.append("\n".join(current))
+                    current = []
+                continue
+
+            # Bỏ thụt lề của template document, giữ nguyên trong code block
+            current.append(line if in_code else line.strip())
+
+        if current:
+            paragraphs.append("\n".join(current))
+        if paragraphs:
+            yield heading, paragraphs
+
+    def _pack(self, paragraphs, prefix):
+        """Gom các đoạn văn liền kề thành chunk <= size, có overlap"""
+        budget = self.size - len(prefix) - 1 if prefix else self.size
+        # Phần của đoạn văn dài chừa chỗ cho overlap, để chunk liền kề luôn có phần lặp lại
+        piece_budget = max(budget // 2, budget - self.overlap - 2)
+
+        pieces = []
+        for paragraph in paragraphs:
+            if len(paragraph) <= budget:
+                pieces.append(paragraph)
+            else:
+                pieces.extend(self._split_long(paragraph, piece_budget))
+
+        chunks = []
+        current = ""
+        for piece in pieces:
+            candidate = f"{current}\n\n{piece}" if current else piece
+            if len(candidate) <= budget:
+                current = candidate
+                continue
+
+            if current:
+                chunks.append(current)
+                tail = self._tail(current)
+                current = f"{tail}\n\n{piece}" if tail and len(tail) + len(piece) + 2 <= budget else piece
+            else:
+                current = piece
+
+        if current:
+            chunks.append(current)
+
+        return [f"{prefix}\n{chunk}" if prefix else chunk for chunk in chunks]
+
+    def _split_long(self, paragraph, budget):
+        """Chia đoạn văn quá dài theo câu, rồi theo từ nếu câu vẫn quá dài"""
+        units = []
+        for sentence in _SENTENCE_RE.split(paragraph):
+            if len(sentence) <= budget:
+                units.append(sentence)
+                continue
+            # Từ dài hơn budget (URL, base64, ...) bị cắt cứng thành nhiều phần, không bỏ mất text
+            words = [word[i:i + budget] for word in sentence.split(" ") for i in range(0, len(word) or 1, budget)]
+            current = ""
+            for word in words:
+                if current and len(current) + len(word) + 1 > budget:
+                    units.append(current)
+                    current = word
+                else:
+                    current = f"{current} {word}" if current else word
+            if current:
+                units.append(current)
+
+        pieces = []
+        current = ""
+        for unit in units:
+            if current and len(current) + len(unit) + 1 > budget:
+                pieces.append(current)
+                current = unit
+            else:
+                current = f"{current} {unit}" if current else unit
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def _tail(self, text):
+        """Phần cuối chunk trước (cắt ở ranh giới từ) dùng làm overlap"""
+        if not self.overlap:
+            return ""
+        tail = text[-self.overlap:]
+        return tail.split(" ", 1)[1] if " " in tail and len(text) > self.overlap else tail
+
+    def chunk_documents(self, ids, documents, metadatas):
+        """
+        Chia danh sách document thành chunks
+
+        Document chỉ có một chunk giữ nguyên ID; document nhiều chunk có ID `<parent>#chunk<i>`.
+        Metadata của mọi chunk có parent_id, chunk_index, chunk_count.
+
+        Returns:
+            Tuple (ids, documents, metadatas) của các chunk
+        """
+        chunk_ids, chunk_docs, chunk_meta = [], [], []
+        for doc_id, doc_text, metadata in zip(ids, documents, metadatas):
+            pieces = self.split(doc_text)
+            for index, piece in enumerate(pieces):
+                chunk_ids.append(doc_id if len(pieces) == 1 else chunk_id(doc_id, index))
+                chunk_docs.append(piece)
+                chunk_meta.append(dict(metadata or {}, parent_id=doc_id, chunk_index=index, chunk_count=len(pieces)))
+        return chunk_ids, chunk_docs, chunk_meta
+
+
+def parent_of(doc_id: str, metadata: dict) -> str:
+    """ID document gốc của một chunk (document cũ chưa chunk thì là chính nó)"""
+    return (metadata or {}).get("parent_id") or doc_id
+
+
+def collapse_chunks(results: list) -> list:
+    """
+    Gom kết quả tìm kiếm theo document gốc
+
+    Mỗi document giữ similarity cao nhất trong các chunk khớp; text là các chunk khớp
+    ghép theo thứ tự trong document.
+
+    Args:
+        results: List {"id", "text", "metadata", "similarity", "source"}
+
+    Returns:
+        List kết quả mỗi document một phần tử, thêm "chunks" = số chunk khớp và "chunk_ids"
+    """
+    grouped = {}
+    for result in results:
+        key = (result["source"], parent_of(result.get("id"), result.get("metadata")))
+        grouped.setdefault(key, []).append(result)
+
+    collapsed = []
+    for (_, parent_id), hits in grouped.items():
+        best = max(hits, key=lambda hit: hit["similarity"])
+        ordered = sorted(hits, key=lambda hit: (hit.get("metadata") or {}).get("chunk_index", 0))
+        collapsed.append({
+            **best,
+            "id": parent_id,
+            "text": "\n...\n".join(hit["text"] for hit in ordered),
+            "chunks": len(hits),
+            "chunk_ids": [hit.get("id") for hit in ordered]
+        })
+    return collapsed
+
+
+# Chunker dùng chung cho ingest
+default_chunker = Chunker()
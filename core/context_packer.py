@@ -0,0 +1,176 @@
+"""
+Đóng gói context vào prompt theo ngân sách token
+Ước lượng token của từng snippet (vector hits, repo, issues, stories, features), bỏ các snippet
+trùng lặp và giữ những snippet liên quan nhất sao cho prompt vừa `num_ctx` của model.
+Prompt ngắn và đặc hơn cũng giúp giảm thời gian prompt-eval trên CPU.
+"""
+
+import math
+import os
+import re
+
+from .ollama_pool import get_generation_options
+
+
+SECTION_DATABASE = "database"
+SECTION_GITHUB = "github"
+SECTION_RALLY = "rally"
+
+SECTION_TITLES = {
+    SECTION_DATABASE: "DU LIEU LIEN QUAN TU DATABASE:",
+    SECTION_GITHUB: "DU LIEU HIEN TAI TU GITHUB:",
+    SECTION_RALLY: "DU LIEU TU RALLY:"
+}
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Ước lượng số token (không cần tokenizer của model)
+
+    Tiếng Việt có dấu tốn nhiều token hơn tiếng Anh, nên mặc định dùng 3.5 ký tự/token
+    (CONTEXT_CHARS_PER_TOKEN) để ước lượng hơi dư thay vì thiếu.
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / _env_float("CONTEXT_CHARS_PER_TOKEN", 3.5))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cắt text cho vừa max_tokens, ưu tiên cắt ở ranh giới từ"""
+    max_chars = int(max_tokens * _env_float("CONTEXT_CHARS_PER_TOKEN", 3.5))
+    if len(text) <= max_chars:
+        return text
+
+    cut = text[:max_chars].rsplit(" ", 1)[0] if " " in text[:max_chars] else text[:max_chars]
+    return cut.rstrip() + "..."
+
+
+def token_budget(fixed_text: str = "", num_ctx: int = None, reserve: int = None) -> int:
+    """
+    Số token còn lại cho context
+
+    Args:
+        fixed_text: Phần prompt luôn có (instruction, yêu cầu chính)
+        num_ctx: Context window của model (mặc định theo OLLAMA_NUM_CTX)
+        reserve: Token dành cho output (CONTEXT_RESERVE_TOKENS, mặc định 768)
+    """
+    if num_ctx is None:
+        num_ctx = get_generation_options()["num_ctx"]
+    if reserve is None:
+        reserve = int(_env_float("CONTEXT_RESERVE_TOKENS", 768))
+    return max(0, num_ctx - reserve - estimate_tokens(fixed_text))
+
+
+def extract_terms(text: str) -> set:
+    return {word for word in _WORD_RE.findall(text.lower()) if len(word) > 2}
+
+
+def lexical_relevance(prompt_terms: set, text: str) -> float:
+    """Tỉ lệ từ khóa của prompt xuất hiện trong snippet (0..1)"""
+    if not prompt_terms:
+        return 0.0
+    return len(prompt_terms & extract_terms(text)) / len(prompt_terms)
+
+
+def _is_duplicate(terms: set, kept_terms: list, threshold: float) -> bool:
+    # Trùng nếu phần lớn từ của snippet ngắn hơn đã nằm trong một snippet đã giữ
+    for other in kept_terms:
+        smaller = min(len(terms), len(other))
+        if smaller and len(terms & other) / smaller >= threshold:
+            return True
+    return False
+
+
+def snippet(section: str, text: str, score: float, label: str = "", pinned: bool = False) -> dict:
+    """
+    Tạo snippet ứng viên
+
+    Args:
+        section: SECTION_DATABASE / SECTION_GITHUB / SECTION_RALLY
+        text: Nội dung (có thể bị cắt khi đóng gói)
+        score: Độ liên quan, snippet điểm cao được giữ trước
+        label: Phần đầu dòng luôn giữ nguyên (vd: "#12: Login bug")
+        pinned: Luôn giữ (vd: thông tin repository)
+    """
+    return {"section": section, "text": text, "score": score, "label": label, "pinned": pinned}
+
+
+def pack_snippets(snippets: list, budget: int, max_snippet_tokens: int = None,
+                  dedupe_threshold: float = None, min_score: float = None) -> list:
+    """
+    Chọn snippets theo độ liên quan cho vừa ngân sách token
+
+    Snippet trùng lặp với snippet đã chọn hoặc có độ liên quan dưới min_score
+    (CONTEXT_MIN_RELEVANCE, mặc định 0.05) bị bỏ; snippet dài được cắt bớt
+    (tối đa max_snippet_tokens, CONTEXT_MAX_SNIPPET_TOKENS, mặc định 256).
+
+    Returns:
+        List snippets đã chọn (giữ thứ tự ban đầu), text đã được cắt nếu cần
+    """
+    if max_snippet_tokens is None:
+        max_snippet_tokens = int(_env_float("CONTEXT_MAX_SNIPPET_TOKENS", 256))
+    if dedupe_threshold is None:
+        dedupe_threshold = _env_float("CONTEXT_DEDUPE_THRESHOLD", 0.8)
+    if min_score is None:
+        min_score = _env_float("CONTEXT_MIN_RELEVANCE", 0.05)
+    min_tokens = 24
+
+    ranked = sorted(enumerate(snippets), key=lambda item: (not item[1]["pinned"], -item[1]["score"], item[0]))
+
+    selected = []
+    kept_terms = []
+    remaining = budget
+    for index, item in ranked:
+        if remaining < min_tokens:
+            break
+        if not item["pinned"] and item["score"] < min_score:
+            continue
+
+        terms = extract_terms(f"{item['label']} {item['text']}")
+        if _is_duplicate(terms, kept_terms, dedupe_threshold):
+            continue
+
+        label_tokens = estimate_tokens(item["label"]) + 4
+        text_tokens = min(max_snippet_tokens, remaining - label_tokens)
+        text = " ".join((item["text"] or "").split())
+        if estimate_tokens(text) > text_tokens:
+            # Chỉ cắt khi phần còn lại đủ dài để có ý nghĩa
+            if text_tokens < min_tokens:
+                continue
+            text = truncate_to_tokens(text, text_tokens)
+
+        cost = label_tokens + estimate_tokens(text)
+        if cost > remaining:
+            continue
+
+        selected.append((index, {**item, "text": text}))
+        kept_terms.append(terms)
+        remaining -= cost
+
+    return [item for _, item in sorted(selected, key=lambda pair: pair[0])]
+
+
+def render_sections(snippets: list) -> str:
+    """Ghép snippets đã chọn thành các mục context trong prompt"""
+    rendered = ""
+    for section, title in SECTION_TITLES.items():
+        items = [item for item in snippets if item["section"] == section]
+        if not items:
+            continue
+
+        rendered += f"{title}\n"
+        for i, item in enumerate(items, 1):
+            rendered += f"  {i}. {item['label']}\n"
+            if item["text"]:
+                rendered += f"     {item['text']}\n"
+        rendered += "\n"
+    return rendered
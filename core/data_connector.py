@@ -1,94 +1,126 @@
 import os
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from dotenv import load_dotenv
 from connectors.github_connector import fetch_github_issues
 from connectors.rally_connector import fetch_rally_data
+from core.http_session import get_session, GITHUB_BACKEND, RALLY_BACKEND
+from core.pagination import iter_github_pages, iter_rally_pages
 
 # Load environment variables
 load_dotenv()
 
+# Cac field Rally can lay (mac dinh WSAPI chi tra ve _ref)
+RALLY_STORY_FIELDS = "FormattedID,Name,ScheduleState,Description,PlanEstimate,Owner,Iteration,LastUpdateDate"
+RALLY_FEATURE_FIELDS = "FormattedID,Name,State,Description,LastUpdateDate"
+RALLY_DEFECT_FIELDS = "FormattedID,Name,State,Severity,Description,LastUpdateDate"
+
 class DataConnector:
-    def __init__(self):
+    def __init__(self, concurrent: bool = None, max_workers: int = None, max_items: int = None):
         self.github_token = os.getenv("GITHUB_TOKEN")
         self.rally_api_key = os.getenv("RALLY_API_KEY")
         self.slack_token = os.getenv("SLACK_TOKEN")
         # GitHub Enterprise URL
         self.github_base_url = os.getenv("GITHUB_URL", "https://ghe.coxautoinc.com")
         self.github_api_url = f"{self.github_base_url}/api/v3"
+        
+        # Session dung chung (connection pool keep-alive) va headers tao mot lan
+        self.github_session = get_session(GITHUB_BACKEND)
+        self.rally_session = get_session(RALLY_BACKEND)
+        self.github_headers = {
+            "Authorization": f"Bearer {self.github_token}",
+            "Accept": "application/vnd.github+json"
+        }
+        self.rally_headers = {
+            "ZSESSIONID": self.rally_api_key,
+            "Content-Type": "application/json"
+        }
+        
+        # Che do fan-out: cac request doc lap chay song song tren thread pool.
+        # So request dong thoi toi moi host van bi gioi han boi session pool.
+        if concurrent is None:
+            concurrent = os.getenv("DATA_CONCURRENT", "1") not in ("0", "false", "False")
+        self.concurrent = concurrent
+        self.max_workers = max_workers or int(os.getenv("DATA_MAX_WORKERS", "4"))
+        
+        # get_*_data (UI, async API) chi lay toi da DATA_MAX_ITEMS record moi loai (mac dinh 100, 0 = lay het);
+        # sync engine va batch dung iter_* nen van duyet het lich su
+        self.max_items = max_items if max_items is not None else int(os.getenv("DATA_MAX_ITEMS", "100"))
+        self.rally_pagesize = int(os.getenv("RALLY_PAGESIZE", "200"))
+        self.prefetch_pages = int(os.getenv("DATA_PREFETCH_PAGES", "0"))
     
     def get_github_data(self, repo: str, include_prs: bool = False) -> dict:
         """Lay du lieu tu GitHub repository"""
         if not self.github_token:
             return {"error": "GITHUB_TOKEN khong duoc cau hinh"}
         
+        tasks = {
+            "repository_info": lambda: self._get_repo_info(repo),
+            "issues": lambda: self._get_github_issues(repo),
+            "files": lambda: self._get_repo_files(repo)
+        }
+        # Lay pull requests neu can
+        if include_prs:
+            tasks["pull_requests"] = lambda: self._get_github_pull_requests(repo)
+        
         result = {
             "issues": [],
             "pull_requests": [],
             "repository_info": {},
             "files": []
         }
-        
-        try:
-            # Lay thong tin repository
-            repo_info = self._get_repo_info(repo)
-            result["repository_info"] = repo_info
-            
-            # Lay issues
-            issues = self._get_github_issues(repo)
-            result["issues"] = issues
-            
-            # Lay pull requests neu can
-            if include_prs:
-                prs = self._get_github_pull_requests(repo)
-                result["pull_requests"] = prs
-            
-            # Lay cau truc file du an
-            files = self._get_repo_files(repo)
-            result["files"] = files
-            
-        except Exception as e:
-            result["error"] = f"Loi khi lay du lieu GitHub: {str(e)}"
-        
-        return result
+        return self._collect(result, tasks, "Loi khi lay du lieu GitHub")
     
     def get_rally_data(self, workspace: str = "", project: str = "") -> dict:
         """Lay du lieu tu Rally"""
         if not self.rally_api_key:
             return {"error": "RALLY_API_KEY khong duoc cau hinh"}
         
+        tasks = {
+            "user_stories": lambda: self._get_rally_stories(workspace, project),
+            "features": lambda: self._get_rally_features(workspace, project),
+            "defects": lambda: self._get_rally_defects(workspace, project)
+        }
+        
         result = {
             "user_stories": [],
             "features": [],
             "defects": []
         }
+        return self._collect(result, tasks, "Loi khi lay du lieu Rally")
+    
+    def _collect(self, result: dict, tasks: dict, error_prefix: str) -> dict:
+        """Chay cac request doc lap (song song neu bat concurrent), loi cua tung phan duoc giu rieng"""
+        errors = {}
+        
+        if self.concurrent and len(tasks) > 1:
+            workers = min(self.max_workers, len(tasks))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="data-connector") as executor:
+                futures = {key: executor.submit(task) for key, task in tasks.items()}
+                for key, future in futures.items():
+                    try:
+                        result[key] = future.result()
+                    except Exception as e:
+                        errors[key] = str(e)
+        else:
+            for key, task in tasks.items():
+                try:
+                    result[key] = task()
+                except Exception as e:
+                    errors[key] = str(e)
         
-        try:
-            # Lay User Stories
-            stories = self._get_rally_stories(workspace, project)
-            result["user_stories"] = stories
-            
-            # Lay Features
-            features = self._get_rally_features(workspace, project)
-            result["features"] = features
-            
-            # Lay Defects
-            defects = self._get_rally_defects(workspace, project)
-            result["defects"] = defects
-            
-        except Exception as e:
-            result["error"] = f"Loi khi lay du lieu Rally: {str(e)}"
+        if errors:
+            result["errors"] = errors
+            # Chi bao loi tong khi tat ca cac phan deu that bai
+            if len(errors) == len(tasks):
+                result["error"] = f"{error_prefix}: {next(iter(errors.values()))}"
         
         return result
     
     def _get_repo_info(self, repo: str) -> dict:
         """Lay thong tin co ban ve repository"""
-        headers = {
-            "Authorization": f"Bearer {self.github_token}",
-            "Accept": "application/vnd.github+json"
-        }
-        
         url = f"{self.github_api_url}/repos/{repo}"
-        response = requests.get(url, headers=headers)
+        response = self.github_session.get(url, headers=self.github_headers)
         response.raise_for_status()
         
         data = response.json()
@@ -101,60 +133,18 @@ class DataConnector:
             "open_issues": data.get("open_issues_count")
         }
     
-    def _get_github_issues(self, repo: str) -> list:
+    def _get_github_issues(self, repo: str, limit: int = None) -> list:
         """Lay danh sach issues"""
-        headers = {
-            "Authorization": f"Bearer {self.github_token}",
-            "Accept": "application/vnd.github+json"
-        }
-        
-        url = f"{self.github_api_url}/repos/{repo}/issues?state=all&per_page=50"
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        issues = response.json()
-        return [
-            {
-                "number": issue.get("number"),
-                "title": issue.get("title"),
-                "state": issue.get("state"),
-                "labels": [label.get("name") for label in issue.get("labels", [])],
-                "body": issue.get("body", "")[:500]  # Gioi han do dai
-            }
-            for issue in issues if "pull_request" not in issue
-        ]
+        return self._take(self.iter_github_issues(repo), limit)
     
-    def _get_github_pull_requests(self, repo: str) -> list:
+    def _get_github_pull_requests(self, repo: str, limit: int = None) -> list:
         """Lay danh sach pull requests"""
-        headers = {
-            "Authorization": f"Bearer {self.github_token}",
-            "Accept": "application/vnd.github+json"
-        }
-        
-        url = f"{self.github_api_url}/repos/{repo}/pulls?state=all&per_page=30"
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        prs = response.json()
-        return [
-            {
-                "number": pr.get("number"),
-                "title": pr.get("title"),
-                "state": pr.get("state"),
-                "body": pr.get("body", "")[:500]
-            }
-            for pr in prs
-        ]
+        return self._take(self.iter_github_pull_requests(repo), limit)
     
     def _get_repo_files(self, repo: str, path: str = "") -> list:
         """Lay cau truc file repository"""
-        headers = {
-            "Authorization": f"Bearer {self.github_token}",
-            "Accept": "application/vnd.github+json"
-        }
-        
         url = f"{self.github_api_url}/repos/{repo}/contents/{path}"
-        response = requests.get(url, headers=headers)
+        response = self.github_session.get(url, headers=self.github_headers)
         response.raise_for_status()
         
         files = response.json()
@@ -170,112 +160,170 @@ class DataConnector:
         
         return result
     
-    def _get_rally_stories(self, workspace: str, project: str) -> list:
+    def _get_rally_stories(self, workspace: str, project: str, limit: int = None) -> list:
         """Lay User Stories tu Rally"""
-        headers = {
-            "ZSESSIONID": self.rally_api_key,
-            "Content-Type": "application/json"
-        }
+        return self._take(self.iter_rally_stories(workspace, project), limit)
+    
+    def _get_rally_features(self, workspace: str, project: str, limit: int = None) -> list:
+        """Lay Features tu Rally"""
+        return self._take(self.iter_rally_features(workspace, project), limit)
+    
+    def _get_rally_defects(self, workspace: str, project: str, limit: int = None) -> list:
+        """Lay Defects tu Rally"""
+        return self._take(self.iter_rally_defects(workspace, project), limit)
+    
+    def _take(self, records, limit: int = None) -> list:
+        """Gom records tu generator, dung lai khi du limit (0/None = lay het)"""
+        limit = self.max_items if limit is None else limit
+        if not limit:
+            return list(records)
+        return list(islice(records, limit))
+    
+    # ---- Streaming generators: yield tung record, tai API theo tung trang ----
+    
+    def iter_github_issues(self, repo: str, state: str = "all", since: str = None, prefetch: int = None):
+        """Duyet toan bo issues cua repository (bo qua pull requests), since = chi lay issue cap nhat tu thoi diem nay"""
+        url = f"{self.github_api_url}/repos/{repo}/issues"
+        params = {"state": state}
+        if since:
+            params.update({"since": since, "sort": "updated", "direction": "asc"})
         
+        for page in self._github_pages(url, params, prefetch):
+            for issue in page:
+                if "pull_request" not in issue:
+                    yield self._normalize_issue(issue)
+    
+    def iter_github_pull_requests(self, repo: str, state: str = "all", prefetch: int = None):
+        """Duyet toan bo pull requests cua repository"""
+        url = f"{self.github_api_url}/repos/{repo}/pulls"
+        for page in self._github_pages(url, {"state": state}, prefetch):
+            for pr in page:
+                yield self._normalize_pull_request(pr)
+    
+    def iter_rally_stories(self, workspace: str = "", project: str = "", since: str = None,
+                           fetch: str = RALLY_STORY_FIELDS, prefetch: int = None):
+        """Duyet toan bo User Stories tu Rally"""
         url = "https://rally1.rallydev.com/slm/webservice/v2.0/hierarchicalrequirement"
-        params = {
-            "pagesize": 50,
-            "order": "LastUpdateDate DESC"
-        }
+        params = self._rally_params(since, fetch)
         
         if workspace:
             params["workspace"] = f"/workspace/{workspace}"
         if project:
             params["project"] = f"/project/{project}"
         
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
-        results = data.get("QueryResult", {}).get("Results", [])
-        
-        return [
-            {
-                "formatted_id": story.get("FormattedID"),
-                "name": story.get("Name"),
-                "state": story.get("ScheduleState"),
-                "description": story.get("Description", "")[:500],
-                "plan_estimate": story.get("PlanEstimate"),
-                "owner": story.get("Owner", {}).get("_refObjectName") if story.get("Owner") else None
-            }
-            for story in results
-        ]
+        for page in self._rally_pages(url, params, prefetch):
+            for story in page:
+                yield self._normalize_rally_story(story)
     
-    def _get_rally_features(self, workspace: str, project: str) -> list:
-        """Lay Features tu Rally"""
-        print(f"🔍 DEBUG: Starting _get_rally_features with workspace='{workspace}', project='{project}'")
-        headers = {
-            "ZSESSIONID": self.rally_api_key,
-            "Content-Type": "application/json"
-        }
-        
-        url = "https://rally1.rallydev.com/slm/webservice/v2.0/project/424702908912ud"
-        params = {
-            "pagesize": 30,
-            "order": "LastUpdateDate DESC"
-        }
+    def iter_rally_features(self, workspace: str = "", project: str = "", since: str = None,
+                            fetch: str = RALLY_FEATURE_FIELDS, prefetch: int = None):
+        """Duyet toan bo Features tu Rally"""
+        url = "https://rally1.rallydev.com/slm/webservice/v2.0/portfolioitem/feature"
+        params = self._rally_params(since, fetch)
         
         if workspace:
-            params["workspace"] = f"/{workspace}"
+            params["workspace"] = f"/workspace/{workspace}"
         if project:
-            params["project"] = f"/{project}"
-        
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
-        print(f"🔍 DEBUG: Response _get_rally_features with project='{data}'")
-        results = data.get("QueryResult", {}).get("Results", [])
+            params["project"] = f"/project/{project}"
         
-        return [
-            {
-                "formatted_id": feature.get("FormattedID"),
-                "name": feature.get("Name"),
-                "state": feature.get("State"),
-                "description": feature.get("Description", "")[:500]
-            }
-            for feature in results
-        ]
+        for page in self._rally_pages(url, params, prefetch):
+            for feature in page:
+                yield self._normalize_rally_feature(feature)
     
-    def _get_rally_defects(self, workspace: str, project: str) -> list:
-        """Lay Defects tu Rally"""
-        headers = {
-            "ZSESSIONID": self.rally_api_key,
-            "Content-Type": "application/json"
-        }
-        
+    def iter_rally_defects(self, workspace: str = "", project: str = "", since: str = None,
+                           fetch: str = RALLY_DEFECT_FIELDS, prefetch: int = None):
+        """Duyet toan bo Defects tu Rally"""
         url = "https://rally1.rallydev.com/slm/webservice/v2.0/defect"
-        params = {
-            "pagesize": 30,
-            "order": "LastUpdateDate DESC"
-        }
+        params = self._rally_params(since, fetch)
         
         if workspace:
             params["workspace"] = f"/workspace/{workspace}"
         if project:
             params["project"] = f"/project/{project}"
         
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
-        results = data.get("QueryResult", {}).get("Results", [])
-        
-        return [
-            {
-                "formatted_id": defect.get("FormattedID"),
-                "name": defect.get("Name"),
-                "state": defect.get("State"),
-                "severity": defect.get("Severity"),
-                "description": defect.get("Description", "")[:300]
-            }
-            for defect in results
-        ]
+        for page in self._rally_pages(url, params, prefetch):
+            for defect in page:
+                yield self._normalize_rally_defect(defect)
+    
+    @staticmethod
+    def _rally_params(since: str = None, fetch: str = None) -> dict:
+        """Params chung cho Rally query: chi lay cac field can dung, loc theo LastUpdateDate neu co since"""
+        params = {"order": "LastUpdateDate DESC"}
+        if fetch:
+            params["fetch"] = fetch
+        if since:
+            params["query"] = f'(LastUpdateDate > "{since}")'
+            params["order"] = "LastUpdateDate ASC"
+        return params
+    
+    def _github_pages(self, url: str, params: dict, prefetch: int = None):
+        prefetch = self.prefetch_pages if prefetch is None else prefetch
+        return iter_github_pages(self.github_session, url, self.github_headers, params, prefetch=prefetch)
+    
+    def _rally_pages(self, url: str, params: dict, prefetch: int = None):
+        prefetch = self.prefetch_pages if prefetch is None else prefetch
+        return iter_rally_pages(self.rally_session, url, self.rally_headers, params,
+                                pagesize=self.rally_pagesize, prefetch=prefetch)
+    
+    # ---- Chuan hoa record tu API ----
+    
+    @staticmethod
+    def _normalize_issue(issue: dict) -> dict:
+        return {
+            "number": issue.get("number"),
+            "title": issue.get("title"),
+            "state": issue.get("state"),
+            "labels": [label.get("name") for label in issue.get("labels", [])],
+            "body": issue.get("body") or "",
+            "created_at": issue.get("created_at"),
+            "updated_at": issue.get("updated_at")
+        }
+    
+    @staticmethod
+    def _normalize_pull_request(pr: dict) -> dict:
+        return {
+            "number": pr.get("number"),
+            "title": pr.get("title"),
+            "state": pr.get("state"),
+            "body": pr.get("body") or "",
+            "created_at": pr.get("created_at"),
+            "updated_at": pr.get("updated_at")
+        }
+    
+    @staticmethod
+    def _normalize_rally_story(story: dict) -> dict:
+        return {
+            "formatted_id": story.get("FormattedID"),
+            "name": story.get("Name"),
+            "state": story.get("ScheduleState"),
+            "description": story.get("Description") or "",
+            "plan_estimate": story.get("PlanEstimate"),
+            "owner": story.get("Owner", {}).get("_refObjectName") if story.get("Owner") else None,
+            "iteration": story.get("Iteration", {}).get("_refObjectName") if story.get("Iteration") else None,
+            "updated_at": story.get("LastUpdateDate")
+        }
+    
+    @staticmethod
+    def _normalize_rally_feature(feature: dict) -> dict:
+        return {
+            "formatted_id": feature.get("FormattedID"),
+            "name": feature.get("Name"),
+            # State cua portfolio item la object (tham chieu toi State), khong phai string
+            "state": feature.get("State", {}).get("_refObjectName") if feature.get("State") else None,
+            "description": feature.get("Description") or "",
+            "updated_at": feature.get("LastUpdateDate")
+        }
+    
+    @staticmethod
+    def _normalize_rally_defect(defect: dict) -> dict:
+        return {
+            "formatted_id": defect.get("FormattedID"),
+            "name": defect.get("Name"),
+            "state": defect.get("State"),
+            "severity": defect.get("Severity"),
+            "description": defect.get("Description") or "",
+            "updated_at": defect.get("LastUpdateDate")
+        }
 
 # Khoi tao connector
 data_connector = DataConnector()
@@ -0,0 +1,199 @@
+"""
+Chuyển record GitHub / Rally (đã chuẩn hóa bởi DataConnector) thành document cho vector DB
+Dùng chung cho VectorDBConnector, VectorDBManager và SyncEngine để ID và nội dung thống nhất.
+"""
+
+import re
+from datetime import date, datetime, time, timezone
+
+
+# Tiền tố ID và type metadata cho từng loại artifact Rally
+RALLY_KINDS = {
+    "stories": {"prefix": "story", "type": "user_story"},
+    "features": {"prefix": "feature", "type": "feature"},
+    "defects": {"prefix": "defect", "type": "defect"},
+}
+
+
+# FormattedID của Rally (US123, F45, DE7, TA9) và tham chiếu issue GitHub (#456)
+FORMATTED_ID_RE = re.compile(r"\b(?:US|DE|TA|F)\d+\b")
+ISSUE_REF_RE = re.compile(r"(?<![\w&])#(\d+)\b")
+
+# Query chỉ gồm một định danh
+EXACT_ID_RE = re.compile(r"^\s*(#\d+|[A-Za-z]{1,3}\d+)\s*$")
+
+
+def mentioned_identifiers(text):
+    """
+    Các định danh được nhắc tới trong text
+
+    Returns:
+        Tuple (formatted_ids, issue_numbers), giữ thứ tự xuất hiện, không trùng
+    """
+    formatted_ids = list(dict.fromkeys(FORMATTED_ID_RE.findall(text or "")))
+    issue_numbers = list(dict.fromkeys(int(number) for number in ISSUE_REF_RE.findall(text or "")))
+    return formatted_ids, issue_numbers
+
+
+def exact_identifier(query):
+    """
+    Định danh nếu query chỉ là một ID
+
+    Returns:
+        ("formatted_id", "US123") / ("number", 123) hoặc None
+    """
+    match = EXACT_ID_RE.match(query or "")
+    if not match:
+        return None
+    token = match.group(1)
+    if token.startswith("#"):
+        return "number", int(token[1:])
+    return "formatted_id", token.upper()
+
+
+def to_epoch(value):
+    """
+    Chuyển thời gian (ISO string của GitHub/Rally, datetime, date hoặc số) thành epoch giây
+
+    Metadata ngày tháng lưu dạng số để ChromaDB lọc được theo khoảng ($gte / $lte).
+    Returns None nếu không parse được.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, date):
+        moment = datetime.combine(value, time.min)
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def search_filters(repo=None, state=None, doc_type=None, updated_after=None, updated_before=None, contains=None):
+    """
+    Tạo mệnh đề lọc cho ChromaDB từ các điều kiện có cấu trúc
+
+    Args:
+        repo: "owner/name" (chỉ document GitHub có repository này)
+        state: Trạng thái hoặc list trạng thái (open, closed, Defined, Accepted, ...)
+        doc_type: Loại hoặc list loại document (issue, repository, user_story, feature, defect)
+        updated_after / updated_before: Khoảng thời gian cập nhật (ISO string, datetime, date hoặc epoch)
+        contains: Chuỗi bắt buộc xuất hiện trong nội dung document
+
+    Returns:
+        Tuple (where, where_document); phần nào không có điều kiện là None
+    """
+    conditions = []
+
+    if repo:
+        owner, _, name = repo.partition("/")
+        conditions.append({"repo_owner": owner})
+        if name:
+            conditions.append({"repo_name": name})
+
+    for field, value in (("state", state), ("type", doc_type)):
+        if isinstance(value, (list, tuple, set)):
+            if value:
+                conditions.append({field: {"$in": list(value)}})
+        elif value:
+            conditions.append({field: value})
+
+    after = to_epoch(updated_after)
+    if after is not None:
+        conditions.append({"updated_ts": {"$gte": after}})
+    before = to_epoch(updated_before)
+    if before is not None:
+        conditions.append({"updated_ts": {"$lte": before}})
+
+    if not conditions:
+        where = None
+    elif len(conditions) == 1:
+        where = conditions[0]
+    else:
+        where = {"$and": conditions}
+
+    where_document = {"$contains": contains} if contains else None
+    return where, where_document
+
+
+def _label_names(labels):
+    """Labels có thể là list tên (DataConnector) hoặc list dict (GitHub API thô)"""
+    return [label.get("name", "") if isinstance(label, dict) else str(label) for label in labels or []]
+
+
+def github_issue_id(repo_owner, repo_name, number):
+    return f"issue_{repo_owner}_{repo_name}_{number}"
+
+
+def rally_item_id(kind, formatted_id):
+    return f"{RALLY_KINDS[kind]['prefix']}_{formatted_id}"
+
+
+def github_issue_document(repo_owner, repo_name, issue):
+    """
+    Tạo document cho một GitHub issue
+
+    Returns:
+        Tuple (id, text, metadata)
+    """
+    doc_text = f"""
+    Issue #{issue.get('number', '')}: {issue.get('title', '')}
+    State: {issue.get('state', '')}
+    Body: {issue.get('body') or ''}
+    Labels: {', '.join(_label_names(issue.get('labels')))}
+    """
+
+    metadata = {
+        "type": "issue",
+        "repo_owner": repo_owner,
+        "repo_name": repo_name,
+        "number": issue.get("number") or 0,
+        "state": issue.get("state") or "",
+        "updated_at": issue.get("updated_at") or datetime.now().isoformat()
+    }
+    metadata["updated_ts"] = to_epoch(metadata["updated_at"]) or datetime.now().timestamp()
+
+    return github_issue_id(repo_owner, repo_name, issue.get("number")), doc_text, metadata
+
+
+def rally_item_document(kind, item, scope=""):
+    """
+    Tạo document cho một Rally story / feature / defect
+
+    Args:
+        kind: "stories", "features" hoặc "defects"
+        item: Record đã chuẩn hóa từ DataConnector
+        scope: "workspace/project" dùng để đối soát xóa theo phạm vi sync
+
+    Returns:
+        Tuple (id, text, metadata)
+    """
+    formatted_id = item.get("formatted_id") or ""
+
+    doc_text = f"""
+    {RALLY_KINDS[kind]['type'].replace('_', ' ').title()} {formatted_id}: {item.get('name') or ''}
+    State: {item.get('state') or ''}
+    Description: {item.get('description') or ''}
+    """
+    if item.get("iteration"):
+        doc_text += f"Iteration: {item['iteration']}\n"
+    if item.get("severity"):
+        doc_text += f"Severity: {item['severity']}\n"
+
+    metadata = {
+        "type": RALLY_KINDS[kind]["type"],
+        "formatted_id": formatted_id,
+        "state": item.get("state") or "",
+        "rally_scope": scope,
+        "updated_at": item.get("updated_at") or datetime.now().isoformat()
+    }
+    metadata["updated_ts"] = to_epoch(metadata["updated_at"]) or datetime.now().timestamp()
+
+    return rally_item_id(kind, formatted_id), doc_text, metadata
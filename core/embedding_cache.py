@@ -0,0 +1,96 @@
+"""
+Persistent embedding cache cho ChromaDB collections
+Bọc embedding function của ChromaDB, cache vector theo (model, hash nội dung)
+trong SQLite để ingest/query lặp lại không phải chạy lại embedding model.
+"""
+
+import hashlib
+import os
+import threading
+from array import array
+
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils import embedding_functions
+
+from .sqlite_cache import SQLiteLRUCache
+
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    def __init__(self, base_function=None, model_name=DEFAULT_MODEL_NAME, cache=None):
+        """
+        Embedding function có cache
+
+        Args:
+            base_function: Embedding function thật (mặc định DefaultEmbeddingFunction của ChromaDB)
+            model_name: Tên model, là một phần của cache key
+            cache: SQLiteLRUCache lưu vector; None = không cache
+        """
+        self.base_function = base_function or embedding_functions.DefaultEmbeddingFunction()
+        self.model_name = model_name
+        self.cache = cache
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        texts = list(input)
+        if self.cache is None:
+            return self.base_function(texts)
+
+        keys = [self._key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Chỉ embed các text chưa có trong cache (mỗi text khác nhau một lần)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        computed = {}
+        if missing:
+            vectors = self.base_function(list(missing.values()))
+            for key, vector in zip(missing, vectors):
+                computed[key] = [float(x) for x in vector]
+            self.cache.set_many({key: array("f", vector).tobytes() for key, vector in computed.items()})
+
+        embeddings = []
+        for key in keys:
+            if key in computed:
+                embeddings.append(computed[key])
+            else:
+                vector = array("f")
+                vector.frombytes(cached[key])
+                embeddings.append(vector.tolist())
+        return embeddings
+
+
+_functions = {}
+_functions_lock = threading.Lock()
+
+
+def get_embedding_function(db_path="./chroma_db"):
+    """
+    Lấy embedding function dùng chung toàn process cho một thư mục ChromaDB
+
+    Cấu hình qua env:
+        EMBEDDING_CACHE: "0" để tắt cache
+        EMBEDDING_CACHE_PATH: File SQLite (mặc định <db_path>/embedding_cache.sqlite3)
+        EMBEDDING_CACHE_MAX_MB: Dung lượng tối đa (mặc định 512MB)
+    """
+    enabled = os.getenv("EMBEDDING_CACHE", "1") not in ("0", "false", "False")
+    cache_path = os.getenv("EMBEDDING_CACHE_PATH") or os.path.join(db_path, "embedding_cache.sqlite3")
+    key = (cache_path if enabled else None, DEFAULT_MODEL_NAME)
+
+    with _functions_lock:
+        function = _functions.get(key)
+        if function is None:
+            cache = None
+            if enabled:
+                max_mb = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+                cache = SQLiteLRUCache(cache_path, table="embeddings", max_bytes=int(max_mb * 1024 * 1024))
+            function = CachedEmbeddingFunction(model_name=DEFAULT_MODEL_NAME, cache=cache)
+            _functions[key] = function
+        return function
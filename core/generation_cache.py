@@ -0,0 +1,81 @@
+"""
+Cache kết quả generate user story
+Key là hash của prompt cuối cùng (đã ghép context), model và sampling options;
+lưu trên SQLite với TTL + LRU để dùng lại giữa các session và process.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from .sqlite_cache import SQLiteLRUCache
+
+
+class GenerationCache:
+    def __init__(self, path=None, ttl=None, max_mb=None, enabled=None):
+        """
+        Khởi tạo generation cache (file SQLite chỉ được mở ở lần dùng đầu tiên)
+
+        Args:
+            path: File SQLite (mặc định GENERATION_CACHE_PATH hoặc <VECTOR_DB_PATH>/generation_cache.sqlite3)
+            ttl: Thời gian sống của mỗi story (giây)
+            max_mb: Dung lượng tối đa, vượt quá sẽ xóa story ít dùng nhất
+            enabled: Bật/tắt cache
+        """
+        if enabled is None:
+            enabled = os.getenv("GENERATION_CACHE", "1") not in ("0", "false", "False")
+        self.enabled = enabled
+        self.path = path
+        self.ttl = ttl
+        self.max_mb = max_mb
+        self._cache = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    path = self.path or os.getenv("GENERATION_CACHE_PATH") or os.path.join(
+                        os.getenv("VECTOR_DB_PATH", "./chroma_db"), "generation_cache.sqlite3"
+                    )
+                    ttl = self.ttl if self.ttl is not None else float(os.getenv("GENERATION_CACHE_TTL", "86400"))
+                    max_mb = self.max_mb if self.max_mb is not None else float(os.getenv("GENERATION_CACHE_MAX_MB", "64"))
+                    self._cache = SQLiteLRUCache(
+                        path, table="generations", max_bytes=int(max_mb * 1024 * 1024), ttl=ttl
+                    )
+        return self._cache
+
+    @staticmethod
+    def make_key(prompt, model, options):
+        payload = json.dumps({"prompt": prompt, "model": model, "options": options}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, models, options):
+        """
+        Tìm story đã cache cho prompt, ưu tiên theo thứ tự models
+
+        Returns:
+            Tuple (model, story) hoặc None
+        """
+        if not self.enabled:
+            return None
+
+        keys = {model: self.make_key(prompt, model, options) for model in models}
+        found = self.cache.get_many(list(keys.values()))
+        for model, key in keys.items():
+            if key in found:
+                return model, found[key].decode("utf-8")
+        return None
+
+    def store(self, prompt, model, options, story):
+        if self.enabled and story:
+            self.cache.set(self.make_key(prompt, model, options), story.encode("utf-8"))
+
+    def stats(self):
+        return self.cache.stats() if self.enabled else {}
+
+
+# Cache dùng chung toàn process
+generation_cache = GenerationCache()
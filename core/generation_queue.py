@@ -0,0 +1,215 @@
+"""
+Admission control cho Ollama local
+Giới hạn số generation chạy cùng lúc (trên host CPU-only chạy song song còn chậm hơn chạy lần lượt),
+các request còn lại xếp hàng theo priority rồi FIFO. Người chờ được báo vị trí trong hàng,
+và queue ghi lại thời gian chờ / thời gian phục vụ để ước lượng phần cứng.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+# Số nhỏ hơn được phục vụ trước
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+
+class GenerationQueueTimeout(Exception):
+    """Chờ quá lâu trong hàng đợi generation"""
+
+
+class GenerationQueueFull(Exception):
+    """Hàng đợi generation đã đầy"""
+
+
+class GenerationQueueCancelled(Exception):
+    """Request bị hủy khi đang chờ trong hàng đợi"""
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "enqueued_at", "admitted_at")
+
+    def __init__(self, priority, seq):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.perf_counter()
+        self.admitted_at = None
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class GenerationQueue:
+    def __init__(self, max_in_flight=None, max_queue=None, timeout=None, history=1000):
+        """
+        Khởi tạo hàng đợi
+
+        Args:
+            max_in_flight: Số generation tối đa chạy cùng lúc (OLLAMA_MAX_IN_FLIGHT, mặc định 1)
+            max_queue: Số request tối đa được xếp hàng, 0 = không giới hạn (OLLAMA_MAX_QUEUE)
+            timeout: Thời gian chờ tối đa (giây), 0 = chờ mãi (OLLAMA_QUEUE_TIMEOUT)
+            history: Số mẫu thời gian giữ lại để tính metrics
+        """
+        self.max_in_flight = max(1, max_in_flight or int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "1")))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("OLLAMA_MAX_QUEUE", "0"))
+        self.timeout = timeout if timeout is not None else float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "0"))
+
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+
+        self._wait_times = deque(maxlen=history)
+        self._service_times = deque(maxlen=history)
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, on_wait=None, timeout=None, cancel_event=None):
+        """
+        Chờ tới lượt chạy generation
+
+        Args:
+            priority: Độ ưu tiên (PRIORITY_INTERACTIVE, PRIORITY_BATCH, ...)
+            on_wait: Callback(position) khi vị trí trong hàng thay đổi; position = 0 khi tới lượt.
+                Được gọi ngoài lock; nếu callback raise, request rời hàng (hoặc trả slot) rồi raise tiếp
+            timeout: Ghi đè thời gian chờ tối đa
+            cancel_event: threading.Event; khi được set qua cancel() thì request rời hàng
+
+        Returns:
+            Ticket, truyền lại cho release()
+
+        Raises:
+            GenerationQueueFull, GenerationQueueTimeout, GenerationQueueCancelled
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout if timeout else None
+
+        with self._cond:
+            if self.max_queue and len(self._waiting) >= self.max_queue:
+                self._rejected += 1
+                raise GenerationQueueFull(f"Hang doi generation da day ({self.max_queue} request)")
+
+            ticket = _Ticket(priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+
+        last_position = None
+        try:
+            while True:
+                with self._cond:
+                    position = self._wait_turn(ticket, deadline, timeout, cancel_event, last_position, on_wait)
+                if not position:
+                    break
+                # Báo vị trí ngoài lock: callback chậm hoặc lỗi không chặn cả hàng đợi
+                last_position = position
+                on_wait(position)
+        except BaseException:
+            self._leave(ticket)
+            raise
+
+        if on_wait and last_position is not None:
+            try:
+                on_wait(0)
+            except BaseException:
+                self.release(ticket)
+                raise
+        return ticket
+
+    def _wait_turn(self, ticket, deadline, timeout, cancel_event, last_position, on_wait):
+        """
+        Chờ (đang giữ lock) tới khi được vào hoặc vị trí thay đổi
+
+        Returns:
+            0 khi đã được vào (ticket đã rời hàng), ngược lại là vị trí mới cần báo cho on_wait
+        """
+        while not (self._in_flight < self.max_in_flight and self._waiting[0] is ticket):
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationQueueCancelled("Request da bi huy khi dang cho trong hang doi generation")
+
+            position = self._position(ticket)
+            if on_wait and position != last_position:
+                return position
+
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                self._timed_out += 1
+                raise GenerationQueueTimeout(f"Cho qua {timeout:.0f}s trong hang doi generation")
+            self._cond.wait(remaining)
+
+        heapq.heappop(self._waiting)
+        self._in_flight += 1
+        ticket.admitted_at = time.perf_counter()
+        self._wait_times.append(ticket.admitted_at - ticket.enqueued_at)
+        # Người kế tiếp có thể cũng được vào nếu còn slot
+        self._cond.notify_all()
+        return 0
+
+    def _leave(self, ticket):
+        """Bỏ ticket khỏi hàng (timeout, hủy, callback lỗi) để không chặn những người sau"""
+        with self._cond:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+    def cancel(self, cancel_event):
+        """Hủy các request đang chờ với cancel_event (an toàn khi gọi từ thread khác)"""
+        with self._cond:
+            cancel_event.set()
+            self._cond.notify_all()
+
+    def release(self, ticket):
+        with self._cond:
+            self._in_flight -= 1
+            self._completed += 1
+            self._service_times.append(time.perf_counter() - ticket.admitted_at)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_INTERACTIVE, on_wait=None, timeout=None):
+        """Giữ một slot generation trong khối with"""
+        ticket = self.acquire(priority, on_wait, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _position(self, ticket):
+        # Vị trí tính cả các request đang chạy: 1 = sẽ vào ngay khi có slot trống
+        return sum(1 for other in self._waiting if other < ticket) + 1
+
+    def stats(self):
+        """Metrics để sizing phần cứng: thời gian chờ / phục vụ (giây), số request"""
+        with self._cond:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                "queued": len(self._waiting),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "queue_wait": _summary(self._wait_times),
+                "service_time": _summary(self._service_times)
+            }
+
+
+def _summary(samples):
+    if not samples:
+        return {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+
+    ordered = sorted(samples)
+    return {
+        "avg": round(sum(ordered) / len(ordered), 3),
+        "p50": round(ordered[len(ordered) // 2], 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "max": round(ordered[-1], 3)
+    }
+
+
+# Hàng đợi dùng chung toàn process (mọi session Streamlit, batch và async API)
+generation_queue = GenerationQueue()
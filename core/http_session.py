@@ -0,0 +1,140 @@
+"""
+HTTP session pool dùng chung cho GitHub Enterprise và Rally
+Mỗi backend có một requests.Session riêng với connection pool keep-alive,
+nên các request liên tiếp tái sử dụng kết nối TCP/TLS thay vì handshake lại.
+"""
+
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+GITHUB_BACKEND = "github"
+RALLY_BACKEND = "rally"
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class PooledSession(requests.Session):
+    """requests.Session có timeout mặc định và giới hạn request đồng thời mỗi host"""
+
+    def __init__(self, timeout=None, max_in_flight=None):
+        super().__init__()
+        self.default_timeout = timeout
+        self.max_in_flight = max_in_flight
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            with self._host_lock:
+                semaphore = self._host_limits.setdefault(
+                    host, threading.BoundedSemaphore(self.max_in_flight)
+                )
+        return semaphore
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.default_timeout
+        if not self.max_in_flight:
+            return super().request(method, url, **kwargs)
+
+        with self._host_semaphore(url):
+            return super().request(method, url, **kwargs)
+
+
+class HTTPSessionPool:
+    def __init__(self, pool_size=None, timeout=None, max_retries=None, keep_alive=None,
+                 max_in_flight=None):
+        """
+        Quản lý các session dùng chung theo backend
+
+        Args:
+            pool_size: Số kết nối tối đa giữ lại cho mỗi host
+            timeout: Timeout mặc định (giây) cho mỗi request
+            max_retries: Số lần retry cho lỗi kết nối / 5xx
+            keep_alive: Giữ kết nối mở giữa các request
+            max_in_flight: Số request đồng thời tối đa tới mỗi host (0 = không giới hạn)
+        """
+        self.pool_size = pool_size or _env_int("HTTP_POOL_SIZE", 10)
+        self.timeout = timeout or _env_float("HTTP_TIMEOUT", 30.0)
+        self.max_retries = max_retries if max_retries is not None else _env_int("HTTP_MAX_RETRIES", 2)
+        if keep_alive is None:
+            keep_alive = os.getenv("HTTP_KEEP_ALIVE", "1") not in ("0", "false", "False")
+        self.keep_alive = keep_alive
+        if max_in_flight is None:
+            max_in_flight = _env_int("HTTP_MAX_IN_FLIGHT_PER_HOST", 4)
+        self.max_in_flight = max_in_flight
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get_session(self, backend):
+        """Lấy (hoặc tạo) session cho backend, an toàn khi gọi từ nhiều thread"""
+        session = self._sessions.get(backend)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(backend)
+            if session is None:
+                session = self._create_session()
+                self._sessions[backend] = session
+            return session
+
+    def _create_session(self):
+        session = PooledSession(timeout=self.timeout, max_in_flight=self.max_in_flight)
+
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=0.3,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+
+        return session
+
+    def close(self):
+        """Đóng toàn bộ session và giải phóng kết nối"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+# Pool dùng chung toàn process
+session_pool = HTTPSessionPool()
+
+
+def get_session(backend):
+    """Lấy session dùng chung cho backend ("github" hoặc "rally")"""
+    return session_pool.get_session(backend)
@@ -0,0 +1,137 @@
+"""
+Ingest helpers cho vector database
+Chia document dài thành chunk, lưu content hash trong metadata của mỗi chunk và chỉ gửi
+các chunk mới / thay đổi đi embedding, chunk không đổi được bỏ qua.
+"""
+
+import hashlib
+
+from .chunking import default_chunker
+
+
+def content_hash(text):
+    """SHA-256 của nội dung document"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class IngestStats:
+    def __init__(self):
+        """Đếm số document được embed (miss) và bỏ qua nhờ hash (hit)"""
+        self.hits = 0
+        self.misses = 0
+        self.new = 0
+        self.changed = 0
+
+    def add(self, other):
+        self.hits += other.hits
+        self.misses += other.misses
+        self.new += other.new
+        self.changed += other.changed
+        return self
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "new": self.new,
+            "changed": self.changed,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+    def __str__(self):
+        return (f"embedding cache: {self.hits} hit / {self.misses} miss "
+                f"({self.new} mới, {self.changed} thay đổi)")
+
+
+def upsert_changed(collection, ids, documents, metadatas, chunker=None, keyword_index=None):
+    """
+    Upsert chỉ những chunk có content hash khác với bản đã lưu
+
+    Args:
+        collection: ChromaDB collection đích
+        ids: List document IDs
+        documents: List nội dung document
+        metadatas: List metadata tương ứng
+        chunker: Chunker chia document dài (mặc định default_chunker)
+        keyword_index: KeywordIndex cập nhật cùng lúc (không cần embedding nên index mọi chunk)
+
+    Returns:
+        IngestStats cho batch này (đếm theo chunk)
+    """
+    stats = IngestStats()
+    if not ids:
+        return stats
+
+    # Document trùng ID trong cùng batch: giữ bản cuối
+    parents = {}
+    for doc_id, doc_text, metadata in zip(ids, documents, metadatas):
+        parents[doc_id] = (doc_text, metadata)
+
+    chunker = chunker or default_chunker
+    ids, documents, metadatas = chunker.chunk_documents(
+        list(parents), [doc for doc, _ in parents.values()], [meta for _, meta in parents.values()]
+    )
+
+    latest = {}
+    for doc_id, doc_text, metadata in zip(ids, documents, metadatas):
+        latest[doc_id] = (doc_text, dict(metadata or {}, content_hash=content_hash(doc_text)))
+
+    _delete_stale_chunks(collection, list(parents), set(latest), keyword_index)
+
+    if keyword_index is not None:
+        keyword_index.upsert(
+            collection.name, list(latest),
+            [doc for doc, _ in latest.values()], [meta for _, meta in latest.values()]
+        )
+
+    existing = collection.get(ids=list(latest), include=["metadatas"])
+    stored_hashes = {
+        doc_id: (metadata or {}).get("content_hash")
+        for doc_id, metadata in zip(existing["ids"], existing["metadatas"] or [])
+    }
+
+    changed_ids, changed_docs, changed_meta = [], [], []
+    unchanged_ids, unchanged_meta = [], []
+
+    for doc_id, (doc_text, metadata) in latest.items():
+        if doc_id in stored_hashes and stored_hashes[doc_id] == metadata["content_hash"]:
+            stats.hits += 1
+            unchanged_ids.append(doc_id)
+            unchanged_meta.append(metadata)
+            continue
+
+        stats.misses += 1
+        if doc_id in stored_hashes:
+            stats.changed += 1
+        else:
+            stats.new += 1
+        changed_ids.append(doc_id)
+        changed_docs.append(doc_text)
+        changed_meta.append(metadata)
+
+    if changed_ids:
+        collection.upsert(ids=changed_ids, documents=changed_docs, metadatas=changed_meta)
+
+    # Nội dung không đổi: chỉ cập nhật metadata, không embed lại
+    if unchanged_ids:
+        collection.update(ids=unchanged_ids, metadatas=unchanged_meta)
+
+    return stats
+
+
+def _delete_stale_chunks(collection, parent_ids, current_ids, keyword_index=None):
+    """
+    Xóa chunk cũ của các document vừa ingest không còn trong lần chia hiện tại
+
+    Vd: document rút ngắn từ 5 xuống 3 chunk, hoặc document trước đây lưu nguyên khối nay được chia chunk.
+    """
+    stored = set(collection.get(where={"parent_id": {"$in": parent_ids}}, include=[])["ids"])
+    stored.update(collection.get(ids=parent_ids, include=[])["ids"])
+
+    stale_ids = sorted(stored - current_ids)
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+        if keyword_index is not None:
+            keyword_index.delete(collection.name, stale_ids)
+    return len(stale_ids)
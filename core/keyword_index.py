@@ -0,0 +1,252 @@
+"""
+Keyword index (BM25) cho các document trong vector database
+Dùng SQLite FTS5 lưu cạnh thư mục ChromaDB, cập nhật incremental khi ingest.
+Bổ sung cho vector search ở các query chứa từ khóa chính xác ("US1234", "#123", "OAuth2")
+mà embedding similarity xếp hạng kém.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def query_terms(query: str, max_terms: int = 32) -> list:
+    """Các từ của query (chữ thường, không trùng), dùng cho FTS5 MATCH"""
+    return list(dict.fromkeys(term.lower() for term in _TERM_RE.findall(query or "")))[:max_terms]
+
+
+class KeywordIndex:
+    def __init__(self, path):
+        """
+        Khởi tạo keyword index
+
+        Args:
+            path: File SQLite (thường là <db_path>/keyword_index.sqlite3)
+        """
+        self.path = str(path)
+        self._local = threading.local()
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connection()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                rowid INTEGER PRIMARY KEY,
+                collection TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                metadata TEXT,
+                text TEXT,
+                UNIQUE(collection, doc_id)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+                text, content='docs', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+                INSERT INTO docs_fts(rowid, text) VALUES (new.rowid, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+                INSERT INTO docs_fts(docs_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS docs_au AFTER UPDATE ON docs BEGIN
+                INSERT INTO docs_fts(docs_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+                INSERT INTO docs_fts(rowid, text) VALUES (new.rowid, new.text);
+            END;
+        """)
+
+    def _connection(self):
+        # Mỗi thread một connection; sqlite3 connection không chia sẻ được giữa các thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, collection, ids, documents, metadatas):
+        """Thêm / cập nhật document (chunk) của collection"""
+        rows = [
+            (collection, doc_id, json.dumps(metadata or {}, ensure_ascii=False), text or "")
+            for doc_id, text, metadata in zip(ids, documents, metadatas)
+        ]
+        if not rows:
+            return
+
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO docs (collection, doc_id, metadata, text) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(collection, doc_id) DO UPDATE SET metadata = excluded.metadata, text = excluded.text",
+                rows
+            )
+
+    def delete(self, collection, ids):
+        ids = list(ids)
+        if not ids:
+            return
+
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "DELETE FROM docs WHERE collection = ? AND doc_id = ?",
+                [(collection, doc_id) for doc_id in ids]
+            )
+
+    def clear(self, collection):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM docs WHERE collection = ?", (collection,))
+
+    def count(self, collection):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM docs WHERE collection = ?", (collection,)
+        ).fetchone()[0]
+
+    def rebuild(self, collection, batch_size=500):
+        """Index lại toàn bộ một ChromaDB collection (vd: dữ liệu có từ trước khi có keyword index)"""
+        self.clear(collection.name)
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            result = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            self.upsert(collection.name, result["ids"], result["documents"], result["metadatas"])
+        return total
+
+    def search(self, query, collections, limit=10, where=None, where_document=None):
+        """
+        Tìm document theo BM25
+
+        Args:
+            query: Câu query
+            collections: Tên các collection cần tìm
+            limit: Số kết quả tối đa
+            where: Metadata filter cùng cú pháp ChromaDB ($and, $or, $eq, $in, $gte, ...)
+            where_document: {"$contains": "..."} như ChromaDB
+
+        Returns:
+            List {"id", "text", "metadata", "score", "source"} theo thứ tự BM25 (score càng cao càng khớp)
+        """
+        terms = query_terms(query)
+        if not terms or not collections:
+            return []
+
+        match = " OR ".join(f'"{term}"' for term in terms)
+        placeholders = ",".join("?" * len(collections))
+        clauses = [f"docs_fts MATCH ? AND d.collection IN ({placeholders})"]
+        params = [match, *collections]
+
+        # Lọc ngay trong câu SQL thay vì lọc sau khi lấy kết quả
+        if where:
+            sql, where_params = _where_sql(where)
+            clauses.append(sql)
+            params.extend(where_params)
+        if where_document and where_document.get("$contains"):
+            clauses.append("instr(d.text, ?) > 0")
+            params.append(where_document["$contains"])
+
+        try:
+            rows = self._connection().execute(
+                "SELECT d.collection, d.doc_id, d.metadata, d.text, bm25(docs_fts) AS rank "
+                "FROM docs_fts JOIN docs d ON d.rowid = docs_fts.rowid "
+                f"WHERE {' AND '.join(clauses)} "
+                "ORDER BY rank LIMIT ?",
+                [*params, limit]
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"Keyword search error: {e}")
+            return []
+
+        # bm25() của FTS5 trả về số âm, càng nhỏ càng khớp
+        return [
+            {"id": doc_id, "text": text, "metadata": json.loads(metadata or "{}"), "score": -rank, "source": source}
+            for source, doc_id, metadata, text, rank in rows
+        ]
+
+
+_SQL_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+_FIELD_RE = re.compile(r"^\w+$")
+
+
+def _where_sql(where):
+    """Chuyển metadata filter kiểu ChromaDB thành điều kiện SQL trên cột metadata (JSON)"""
+    parts, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            subs = [_where_sql(sub) for sub in condition]
+            joiner = " AND " if key == "$and" else " OR "
+            parts.append("(" + joiner.join(sql for sql, _ in subs) + ")")
+            for _, sub_params in subs:
+                params.extend(sub_params)
+            continue
+
+        if not _FIELD_RE.match(key):
+            raise ValueError(f"Ten field khong hop le: {key}")
+        column = f"json_extract(d.metadata, '$.{key}')"
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        for operator, value in condition.items():
+            if operator in ("$in", "$nin"):
+                values = list(value)
+                negate = "NOT " if operator == "$nin" else ""
+                parts.append(f"{column} {negate}IN ({','.join('?' * len(values))})" if values else
+                             ("1" if negate else "0"))
+                params.extend(values)
+            elif operator in _SQL_OPERATORS:
+                parts.append(f"{column} {_SQL_OPERATORS[operator]} ?")
+                params.append(value)
+            else:
+                raise ValueError(f"Toan tu khong ho tro: {operator}")
+
+    return "(" + " AND ".join(parts or ["1"]) + ")", params
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Gộp nhiều danh sách kết quả đã xếp hạng bằng reciprocal-rank fusion
+
+    Args:
+        rankings: List các list kết quả (mỗi kết quả có "source" và "id")
+        k: Hằng số RRF (càng lớn càng giảm ảnh hưởng của hạng đầu)
+
+    Returns:
+        List kết quả (bản đầu tiên gặp của mỗi document) kèm "rrf_score", sắp xếp giảm dần
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, 1):
+            key = (result["source"], result["id"])
+            entry = fused.setdefault(key, {**result, "rrf_score": 0.0})
+            entry["rrf_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda result: result["rrf_score"], reverse=True)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_keyword_index(db_path="./chroma_db"):
+    """
+    Keyword index dùng chung toàn process cho một thư mục ChromaDB
+
+    Cấu hình qua env:
+        HYBRID_SEARCH: "0" để tắt keyword index (trả về None)
+        KEYWORD_INDEX_PATH: File SQLite (mặc định <db_path>/keyword_index.sqlite3)
+    """
+    if os.getenv("HYBRID_SEARCH", "1") in ("0", "false", "False"):
+        return None
+
+    path = os.getenv("KEYWORD_INDEX_PATH") or os.path.join(db_path, "keyword_index.sqlite3")
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = KeywordIndex(path)
+            _indexes[path] = index
+        return index
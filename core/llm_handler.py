@@ -1,23 +1,199 @@
-from langchain_community.llms import Ollama
 import os
-import requests
 import time
-from .vector_db import VectorDBConnector
+from contextlib import nullcontext
+from .context_packer import (
+    SECTION_DATABASE, SECTION_GITHUB, SECTION_RALLY, extract_terms, lexical_relevance, pack_snippets,
+    render_sections, snippet, token_budget
+)
+from .generation_cache import generation_cache
+from .generation_queue import PRIORITY_INTERACTIVE, generation_queue
+from .ollama_pool import get_generation_options, get_llm
+from .ollama_registry import OllamaUnavailableError, model_registry
+from .vector_db import get_vector_db
 
-# Khởi tạo Vector DB connector
-vector_db = VectorDBConnector()
+# Nguong cosine similarity giua hai prompt de dung lai story da generate
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
 
-def generate_user_story(prompt: str, context_data: dict = None) -> str:
+# So ung vien lay tu vector DB; context packing chi giu nhung gi vua ngan sach token
+RETRIEVAL_LIMIT = int(os.getenv("CONTEXT_RETRIEVAL_LIMIT", "6"))
+
+# Thu cac model nhe theo thu tu uu tien
+MODELS_TO_TRY = [
+    "llama3.2:1b",     # Nhe nhat (1.3GB)
+    "llama3.2:3b",     # Trung binh (2GB) 
+    "qwen2:1.5b",      # Nhe, hieu qua (0.9GB)
+    "gemma2:2b",       # Google, nhe (1.6GB)
+    "phi3:mini"        # Microsoft, rat nhe (2.3GB)
+]
+
+def generate_user_story(prompt: str, context_data: dict = None, relevant_context: list = None,
+                        force_regenerate: bool = False, semantic_cache: bool = True,
+                        fallback: bool = True, priority: int = PRIORITY_INTERACTIVE,
+                        on_queue=None, vector_db=None) -> str:
     """Tao user story voi Ollama local - bao mat tuyet doi"""
+    return "".join(generate_user_story_stream(
+        prompt, context_data, relevant_context, force_regenerate, semantic_cache, fallback,
+        priority, on_queue, vector_db
+    ))
+
+def generate_user_story_stream(prompt: str, context_data: dict = None, relevant_context: list = None,
+                               force_regenerate: bool = False, semantic_cache: bool = True,
+                               fallback: bool = True, priority: int = PRIORITY_INTERACTIVE,
+                               on_queue=None, vector_db=None):
+    """
+    Tao user story dang stream: yield tung token ngay khi Ollama sinh ra
+    
+    force_regenerate=True bo qua generation cache va semantic cache, luon goi Ollama
+    (ket qua moi van duoc cache lai). semantic_cache=False chi tat tra cuu prompt gan giong.
+    fallback=False raise OllamaUnavailableError thay vi tra ve huong dan cai dat khi khong model nao chay duoc.
+    Generation xep hang trong generation_queue theo priority; on_queue(position) duoc goi khi
+    vi tri trong hang thay doi (position = 0 khi toi luot).
+    vector_db: VectorDBConnector dung cho retrieval/cache (mac dinh get_vector_db(), dung chung toan process).
+    """
+    vector_db = vector_db or get_vector_db()
+    
+    # Semantic cache: prompt gan giong mot prompt da generate -> dung lai story cu
+    cached_story = _semantic_cache_hit(prompt, context_data, force_regenerate, semantic_cache, vector_db)
+    if cached_story is not None:
+        yield cached_story
+        return
+    
+    enhanced_prompt = prepare_prompt(prompt, context_data, relevant_context, vector_db)
+    
+    # Cache hit: tra ve ngay, khong can goi Ollama
+    models = _candidate_models()
+    cached_story = _generation_cache_hit(enhanced_prompt, force_regenerate, models)
+    if cached_story is not None:
+        yield cached_story
+        return
+    
+    chunks = []
+    completed_model = None
+    # Chi chiem slot khi thuc su goi Ollama; slot duoc tra khi stream xong hoac bi huy
+    with generation_queue.slot(priority, on_queue) if models else nullcontext():
+        for model in models:
+            try:
+                print(f"Dang thu model: {model}")
+                for chunk in generate_with_ollama_stream(enhanced_prompt, model):
+                    chunks.append(chunk)
+                    yield chunk
+                print(f"Thanh cong voi model: {model}")
+                completed_model = model
+                break
+            except Exception as e:
+                print(f"Model {model} loi: {str(e)}")
+                model_registry.invalidate()
+                # Da stream mot phan cho nguoi dung thi khong doi model giua chung
+                if chunks:
+                    break
+                continue
+    
+    setup_guide = _finish_generation(
+        prompt, enhanced_prompt, context_data, chunks, completed_model, fallback, vector_db
+    )
+    if setup_guide:
+        yield setup_guide
+
+def _semantic_cache_hit(prompt: str, context_data: dict, force_regenerate: bool, semantic_cache: bool,
+                        vector_db=None):
+    """Story da luu cho prompt gan giong (None neu khong dung/khong co)"""
+    if not semantic_cache or force_regenerate or context_data:
+        return None
+    
+    similar = lookup_similar_story(prompt, vector_db=vector_db)
+    if not similar:
+        return None
+    
+    print(f"Semantic cache hit ({similar['similarity']:.3f}): {similar['prompt'][:80]}")
+    return similar["story"]
+
+def _generation_cache_hit(enhanced_prompt: str, force_regenerate: bool, models: list):
+    """
+    Story da cache cho dung prompt/model/options (None neu khong co)
+    
+    Chi tra cuu theo model se duoc chay (models[0] cua _candidate_models()), de cache hit giong
+    ket qua cua mot lan generate moi; model da go hoac xep sau khong duoc dung.
+    """
+    if force_regenerate or not models:
+        return None
+    
+    cached = generation_cache.lookup(enhanced_prompt, models[:1], _cache_options())
+    if not cached:
+        return None
+    
+    print(f"Generation cache hit (model: {cached[0]})")
+    return cached[1]
+
+def _candidate_models() -> list:
+    """Chon model tu cache /api/tags, fail fast neu Ollama khong chay"""
+    try:
+        return model_registry.available_models(MODELS_TO_TRY)
+    except OllamaUnavailableError as e:
+        print(str(e))
+        return []
+
+def _finish_generation(prompt: str, enhanced_prompt: str, context_data: dict, chunks: list,
+                       completed_model: str, fallback: bool, vector_db=None):
+    """
+    Cache va luu story sau khi generate; tra ve huong dan cai dat neu khong model nao chay duoc
+    """
+    # Chi cache story sinh tron ven boi model (khong cache fallback)
+    if completed_model:
+        generation_cache.store(enhanced_prompt, completed_model, _cache_options(), "".join(chunks))
+    
+    # Fallback: Huong dan cai dat
+    setup_guide = None
+    if not chunks:
+        if not fallback:
+            raise OllamaUnavailableError("Khong model Ollama nao tao duoc user story")
+        setup_guide = generate_setup_guide(enhanced_prompt)
     
-    # Khởi tạo vector DB nếu chưa
+    # Lưu generated story vào vector DB
+    generated_story = "".join(chunks) or setup_guide
+    vector_db = vector_db or get_vector_db()
+    if generated_story and vector_db.is_initialized:
+        vector_db.store_generated_story(generated_story, {
+            "prompt": prompt,
+            "has_context": bool(context_data),
+            # Chi story model sinh tron ven moi duoc semantic cache dung lai (giong generation cache)
+            "complete": bool(completed_model)
+        })
+    
+    return setup_guide
+
+def _cache_options() -> dict:
+    """Sampling options anh huong den output (keep_alive khong lam thay doi ket qua)"""
+    options = get_generation_options()
+    options.pop("keep_alive", None)
+    return options
+
+def lookup_similar_story(prompt: str, threshold: float = None, vector_db=None):
+    """Tim story da generate cho prompt gan giong trong user_stories (None neu khong co)"""
+    if threshold is None:
+        threshold = SEMANTIC_CACHE_THRESHOLD
+    
+    vector_db = vector_db or get_vector_db()
     if not vector_db.is_initialized:
-        vector_db.initialize()
+        return None
+    
+    return vector_db.find_similar_story(prompt, threshold)
+
+def prepare_prompt(prompt: str, context_data: dict = None, relevant_context: list = None,
+                   vector_db=None) -> str:
+    """Retrieval tu vector DB va ghep context vao prompt"""
+    
+    # Vector DB dùng chung toàn process (khởi tạo lazy)
+    vector_db = vector_db or get_vector_db()
     
-    # Tìm kiếm context liên quan từ vector DB
-    relevant_context = []
+    # Tìm kiếm context liên quan từ vector DB (bỏ qua nếu đã truyền sẵn từ batch retrieval)
+    if relevant_context is None:
+        relevant_context = []
+        if vector_db.is_initialized:
+            relevant_context = vector_db.search_relevant_context(prompt, limit=RETRIEVAL_LIMIT)
+    
+    # Item được nhắc trực tiếp trong prompt (US123, #456): lấy đúng item theo ID, đặt lên đầu
     if vector_db.is_initialized:
-        relevant_context = vector_db.search_relevant_context(prompt, limit=3)
+        relevant_context = merge_mentioned_context(vector_db.lookup_mentioned(prompt), relevant_context)
     
     # Kết hợp context data từ API và vector DB
     if context_data or relevant_context:
@@ -27,44 +203,38 @@ def generate_user_story(prompt: str, context_data: dict = None) -> str:
     
     # Lưu context vào vector DB nếu có
     if context_data and vector_db.is_initialized:
-        store_context_to_vector_db(context_data)
-    
-    # Thu cac model nhe theo thu tu uu tien
-    models_to_try = [
-        "llama3.2:1b",     # Nhe nhat (1.3GB)
-        "llama3.2:3b",     # Trung binh (2GB) 
-        "qwen2:1.5b",      # Nhe, hieu qua (0.9GB)
-        "gemma2:2b",       # Google, nhe (1.6GB)
-        "phi3:mini"        # Microsoft, rat nhe (2.3GB)
-    ]
+        store_context_to_vector_db(context_data, vector_db)
     
-    generated_story = None
-    for model in models_to_try:
-        try:
-            print(f"Dang thu model: {model}")
-            result = generate_with_ollama(enhanced_prompt, model)
-            print(f"Thanh cong voi model: {model}")
-            generated_story = result
-            break
-        except Exception as e:
-            print(f"Model {model} loi: {str(e)}")
-            continue
+    return enhanced_prompt
+
+def merge_mentioned_context(mentioned: list, relevant_context: list) -> list:
+    """Ghep item tra theo ID voi ket qua retrieval, bo trung lap"""
+    seen = {(ctx.get("source"), ctx.get("id")) for ctx in mentioned}
+    return mentioned + [ctx for ctx in relevant_context or [] if (ctx.get("source"), ctx.get("id")) not in seen]
+
+def search_contexts_batch(prompts: list, vector_db=None) -> list:
+    """Retrieval cho nhieu prompts trong mot lan batch query"""
     
-    # Fallback: Huong dan cai dat
-    if not generated_story:
-        generated_story = generate_setup_guide(enhanced_prompt)
+    vector_db = vector_db or get_vector_db()
+    if not vector_db.is_initialized:
+        return [[] for _ in prompts]
     
-    # Lưu generated story vào vector DB
-    if generated_story and vector_db.is_initialized:
-        vector_db.store_generated_story(generated_story, {
-            "prompt": prompt,
-            "has_context": bool(context_data)
-        })
+    return vector_db.search_relevant_context_batch(prompts, limit=RETRIEVAL_LIMIT)
+
+def generate_user_stories(prompts: list, context_data: dict = None, vector_db=None) -> list:
+    """Tao nhieu user story, retrieval cho tat ca prompts trong mot lan batch query"""
+    
+    vector_db = vector_db or get_vector_db()
+    contexts = search_contexts_batch(prompts, vector_db)
     
-    return generated_story
+    return [
+        generate_user_story(prompt, context_data, relevant_context, vector_db=vector_db)
+        for prompt, relevant_context in zip(prompts, contexts)
+    ]
 
-def store_context_to_vector_db(context_data):
+def store_context_to_vector_db(context_data, vector_db=None):
     """Lưu context data vào vector database"""
+    vector_db = vector_db or get_vector_db()
     try:
         if "github" in context_data:
             github_data = context_data["github"]
@@ -85,63 +255,81 @@ def store_context_to_vector_db(context_data):
     except Exception as e:
         print(f"Error storing context to vector DB: {e}")
 
-def enhance_prompt_with_context(prompt: str, context_data: dict = None, relevant_context: list = None) -> str:
-    """Ket hop prompt voi du lieu tu GitHub/Rally va vector DB"""
-    enhanced = f"YEU CAU CHINH: {prompt}\n\n"
-    
-    # Thêm context từ vector DB (dữ liệu lịch sử)
-    if relevant_context:
-        enhanced += "DU LIEU LIEN QUAN TU DATABASE:\n"
-        for i, ctx in enumerate(relevant_context[:3], 1):
-            source = ctx.get('source', 'unknown')
-            similarity = ctx.get('similarity', 0)
-            text_preview = ctx.get('text', '')[:200] + "..."
-            enhanced += f"  {i}. [{source}] (độ liên quan: {similarity:.2f})\n"
-            enhanced += f"     {text_preview}\n\n"
-    
-    # Thêm context data hiện tại
-    if context_data:
-        # Them du lieu GitHub neu co
-        if "github" in context_data:
-            github_data = context_data["github"]
-            enhanced += "DU LIEU HIEN TAI TU GITHUB:\n"
-            
-            if "repository_info" in github_data:
-                repo = github_data["repository_info"]
-                enhanced += f"- Repository: {repo.get('name')} ({repo.get('language')})\n"
-                enhanced += f"- Mo ta: {repo.get('description', 'Khong co')}\n"
+def enhance_prompt_with_context(prompt: str, context_data: dict = None, relevant_context: list = None,
+                                num_ctx: int = None) -> str:
+    """
+    Ket hop prompt voi du lieu tu GitHub/Rally va vector DB
+    
+    Context duoc dong goi theo ngan sach token cua model (num_ctx tru instruction va output),
+    uu tien snippet lien quan nhat va bo cac snippet trung lap.
+    """
+    header = f"YEU CAU CHINH: {prompt}\n\n"
+    footer = "TASK: Tao User Story chi tiet dua tren yeu cau chinh va du lieu context tren."
+    budget = token_budget(build_instruction(header + footer), num_ctx)
+    
+    prompt_terms = extract_terms(prompt)
+    snippets = []
+    
+    # Context tu vector DB (du lieu lich su), xep theo do lien quan
+    for ctx in relevant_context or []:
+        similarity = ctx.get('similarity', 0)
+        snippets.append(snippet(
+            SECTION_DATABASE, ctx.get('text', ''), similarity,
+            label=f"[{ctx.get('source', 'unknown')}] (độ liên quan: {similarity:.2f})"
+        ))
+    
+    context_data = context_data or {}
+    
+    # Du lieu GitHub hien tai
+    if "github" in context_data:
+        github_data = context_data["github"]
         
-        if "issues" in github_data and github_data["issues"]:
-            enhanced += f"- Co {len(github_data['issues'])} issues:\n"
-            for issue in github_data["issues"][:3]:  # Chi lay 3 issues dau
-                enhanced += f"  + #{issue['number']}: {issue['title']}\n"
+        repo = github_data.get("repository_info")
+        if repo:
+            snippets.append(snippet(
+                SECTION_GITHUB, f"Mo ta: {repo.get('description') or 'Khong co'}", 1.0,
+                label=f"Repository: {repo.get('name')} ({repo.get('language')})", pinned=True
+            ))
         
-        enhanced += "\n"
+        for issue in github_data.get("issues") or []:
+            text = f"{issue['title']} {issue.get('body') or ''}"
+            snippets.append(snippet(
+                SECTION_GITHUB, issue.get('body') or "", lexical_relevance(prompt_terms, text),
+                label=f"Issue #{issue['number']}: {issue['title']}"
+            ))
     
-    # Them du lieu Rally neu co
+    # Du lieu Rally
     if "rally" in context_data:
         rally_data = context_data["rally"]
-        enhanced += "DU LIEU TU RALLY:\n"
-        
-        if "user_stories" in rally_data and rally_data["user_stories"]:
-            enhanced += f"- Co {len(rally_data['user_stories'])} user stories:\n"
-            for story in rally_data["user_stories"][:3]:
-                enhanced += f"  + {story['formatted_id']}: {story['name']} ({story['state']})\n"
         
-        if "features" in rally_data and rally_data["features"]:
-            enhanced += f"- Co {len(rally_data['features'])} features:\n"
-            for feature in rally_data["features"][:2]:
-                enhanced += f"  + {feature['formatted_id']}: {feature['name']}\n"
+        for story in rally_data.get("user_stories") or []:
+            text = f"{story['name']} {story.get('description') or ''}"
+            snippets.append(snippet(
+                SECTION_RALLY, story.get('description') or "", lexical_relevance(prompt_terms, text),
+                label=f"{story['formatted_id']}: {story['name']} ({story['state']})"
+            ))
         
-        enhanced += "\n"
+        for feature in rally_data.get("features") or []:
+            text = f"{feature['name']} {feature.get('description') or ''}"
+            snippets.append(snippet(
+                SECTION_RALLY, feature.get('description') or "", lexical_relevance(prompt_terms, text),
+                label=f"{feature['formatted_id']}: {feature['name']}"
+            ))
     
-    enhanced += "TASK: Tao User Story chi tiet dua tren yeu cau chinh va du lieu context tren."
-    
-    return enhanced
+    packed = pack_snippets(snippets, budget)
+    return header + render_sections(packed) + footer
 
 def generate_with_ollama(prompt: str, model: str) -> str:
     """Ket noi voi Ollama local"""
-    
+    llm = _create_llm(model)
+    return llm.invoke(build_instruction(prompt))
+
+def generate_with_ollama_stream(prompt: str, model: str):
+    """Ket noi voi Ollama local, yield tung token"""
+    llm = _create_llm(model)
+    yield from llm.stream(build_instruction(prompt))
+
+def _create_llm(model: str):
     # Kiem tra Ollama service co chay khong
     if not check_ollama_running():
         raise Exception("Ollama service khong chay")
@@ -150,17 +338,12 @@ def generate_with_ollama(prompt: str, model: str) -> str:
     if not check_model_exists(model):
         raise Exception(f"Model {model} chua duoc tai")
     
-    llm = Ollama(
-        model=model, 
-        options={
-            "temperature": 0.3,
-            "top_p": 0.9,
-            "top_k": 40,
-            "num_ctx": 2048
-        }
-    )
-    
-    instruction = f"""Ban la chuyen gia Product Owner trong phat trien phan mem Agile.
+    # Client dung chung theo (model, options), keep_alive giu model trong RAM
+    return get_llm(model)
+
+def build_instruction(prompt: str) -> str:
+    """Instruction gui cho model"""
+    return f"""Ban la chuyen gia Product Owner trong phat trien phan mem Agile.
 Nhiem vu: Tao User Story chuyen nghiep tu yeu cau sau: "{prompt}"
 
 Format tra ve:
@@ -184,27 +367,14 @@ La [vai tro], toi muon [chuc nang] de [muc dich/loi ich].
 - Story Points: [1-13]
 - Priority: [High/Medium/Low]
 """
-    
-    return llm.invoke(instruction)
 
 def check_ollama_running() -> bool:
-    """Kiem tra Ollama service co dang chay khong"""
-    try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
-        return response.status_code == 200
-    except:
-        return False
+    """Kiem tra Ollama service co dang chay khong (dung cache cua model registry)"""
+    return model_registry.is_running()
 
 def check_model_exists(model: str) -> bool:
-    """Kiem tra model co ton tai trong Ollama khong"""
-    try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
-        if response.status_code == 200:
-            models = response.json().get('models', [])
-            return any(m['name'].startswith(model.split(':')[0]) for m in models)
-    except:
-        pass
-    return False
+    """Kiem tra model co ton tai trong Ollama khong (dung cache cua model registry)"""
+    return model_registry.has_model(model)
 
 def generate_setup_guide(prompt: str) -> str:
     """Tao user story chi tiet cho demo khi khong co AI model"""
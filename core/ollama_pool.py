@@ -0,0 +1,73 @@
+"""
+Pool các Ollama LLM client dùng chung toàn process
+Mỗi (model, options) chỉ tạo một client; `keep_alive` giữ model nằm trong RAM
+của Ollama giữa các request để tránh phải load lại sau thời gian nghỉ.
+"""
+
+import os
+import threading
+
+from langchain_community.llms import Ollama
+
+from .ollama_registry import model_registry
+
+
+def _env_number(name, default, cast=float):
+    try:
+        return cast(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_generation_options(**overrides):
+    """
+    Sampling options mặc định (cấu hình qua env), có thể ghi đè từng giá trị
+
+    Env: OLLAMA_TEMPERATURE, OLLAMA_TOP_P, OLLAMA_TOP_K, OLLAMA_NUM_CTX, OLLAMA_KEEP_ALIVE
+    """
+    options = {
+        "temperature": _env_number("OLLAMA_TEMPERATURE", 0.3),
+        "top_p": _env_number("OLLAMA_TOP_P", 0.9),
+        "top_k": _env_number("OLLAMA_TOP_K", 40, int),
+        "num_ctx": _env_number("OLLAMA_NUM_CTX", 2048, int),
+        "keep_alive": os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return options
+
+
+class OllamaClientPool:
+    def __init__(self):
+        """Cache client theo (base_url, model, options)"""
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, model, base_url=None, **overrides):
+        """Lấy client cho model; tạo mới nếu chưa có với bộ options này"""
+        options = get_generation_options(**overrides)
+        base_url = base_url or model_registry.base_url
+        key = (base_url, model, tuple(sorted(options.items())))
+
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = Ollama(model=model, base_url=base_url, **options)
+                self._clients[key] = client
+            return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+
+# Pool dùng chung toàn process
+client_pool = OllamaClientPool()
+
+
+def get_llm(model, **overrides):
+    """Client Ollama dùng chung cho model"""
+    return client_pool.get(model, **overrides)
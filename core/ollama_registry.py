@@ -0,0 +1,120 @@
+"""
+Model registry cho Ollama local
+Cache kết quả /api/tags với TTL ngắn, chọn model khả dụng đầu tiên theo thứ tự ưu tiên
+ngay trong bộ nhớ, và dùng circuit breaker để fail fast khi Ollama daemon không chạy.
+"""
+
+import os
+import threading
+import time
+
+import requests
+
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
+
+class OllamaUnavailableError(Exception):
+    """Ollama daemon không truy cập được (hoặc circuit breaker đang mở)"""
+
+
+class OllamaModelRegistry:
+    def __init__(self, base_url=None, ttl=None, timeout=None, failure_threshold=None, reset_timeout=None):
+        """
+        Khởi tạo registry
+
+        Args:
+            base_url: URL của Ollama daemon
+            ttl: Thời gian (giây) cache danh sách model
+            timeout: Timeout (giây) cho mỗi lần gọi /api/tags
+            failure_threshold: Số lần lỗi liên tiếp trước khi mở circuit
+            reset_timeout: Thời gian (giây) circuit mở trước khi thử lại
+        """
+        self.base_url = (base_url or OLLAMA_BASE_URL).rstrip("/")
+        self.ttl = ttl if ttl is not None else float(os.getenv("OLLAMA_TAGS_TTL", "30"))
+        self.timeout = timeout if timeout is not None else float(os.getenv("OLLAMA_PROBE_TIMEOUT", "2"))
+        self.failure_threshold = failure_threshold or int(os.getenv("OLLAMA_CIRCUIT_FAILURES", "1"))
+        self.reset_timeout = reset_timeout if reset_timeout is not None else float(
+            os.getenv("OLLAMA_CIRCUIT_RESET", "15")
+        )
+
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+        self._models = None
+        self._fetched_at = 0.0
+        self._failures = 0
+        self._opened_at = None
+
+    def list_models(self, force_refresh=False):
+        """
+        Danh sách tên model đã tải trong Ollama (cache theo TTL)
+
+        Raises:
+            OllamaUnavailableError: Daemon không chạy hoặc circuit đang mở
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force_refresh and self._models is not None and now - self._fetched_at < self.ttl:
+                return list(self._models)
+
+            # Circuit mở: fail fast, không gọi HTTP cho tới khi hết reset_timeout
+            if self._opened_at is not None and now - self._opened_at < self.reset_timeout:
+                raise OllamaUnavailableError("Ollama service khong chay (circuit open)")
+
+            try:
+                response = self._session.get(f"{self.base_url}/api/tags", timeout=self.timeout)
+                response.raise_for_status()
+                models = [m["name"] for m in response.json().get("models", [])]
+            except Exception as e:
+                self._failures += 1
+                self._models = None
+                if self._failures >= self.failure_threshold:
+                    self._opened_at = time.monotonic()
+                raise OllamaUnavailableError(f"Ollama service khong chay: {e}") from e
+
+            self._models = models
+            self._fetched_at = time.monotonic()
+            self._failures = 0
+            self._opened_at = None
+            return list(models)
+
+    def is_running(self):
+        try:
+            self.list_models()
+            return True
+        except OllamaUnavailableError:
+            return False
+
+    def has_model(self, model):
+        try:
+            return self._match(model, self.list_models()) is not None
+        except OllamaUnavailableError:
+            return False
+
+    def available_models(self, preferences):
+        """Các model trong danh sách ưu tiên đã có sẵn, giữ nguyên thứ tự"""
+        installed = self.list_models()
+        return [model for model in preferences if self._match(model, installed) is not None]
+
+    def resolve_model(self, preferences):
+        """Model khả dụng đầu tiên theo thứ tự ưu tiên, None nếu không có"""
+        available = self.available_models(preferences)
+        return available[0] if available else None
+
+    def invalidate(self):
+        """Xóa cache để lần sau gọi lại /api/tags (vd: sau khi model bị lỗi)"""
+        with self._lock:
+            self._models = None
+
+    @staticmethod
+    def _match(model, installed):
+        # "phi3" khớp "phi3:latest"; "llama3.2:1b" phải khớp đúng tag
+        candidates = {model, f"{model}:latest"} if ":" not in model else {model}
+        for name in installed:
+            if name in candidates:
+                return name
+        return None
+
+
+# Registry dùng chung toàn process
+model_registry = OllamaModelRegistry()
@@ -0,0 +1,126 @@
+"""
+Paginated fetchers cho GitHub Enterprise và Rally
+Trả về generator theo từng trang để downstream xử lý dạng stream,
+có tùy chọn prefetch song song các trang tiếp theo.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
+
+
+GITHUB_MAX_PER_PAGE = 100
+RALLY_MAX_PAGESIZE = 2000
+
+
+def _ordered_prefetch(fetch, args_list, prefetch):
+    """Gọi fetch(arg) cho từng arg, giữ tối đa `prefetch` request chạy trước, trả kết quả đúng thứ tự"""
+    if prefetch <= 0:
+        for arg in args_list:
+            yield fetch(arg)
+        return
+
+    with ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="prefetch") as executor:
+        pending = deque()
+        args_iter = iter(args_list)
+
+        for arg in args_iter:
+            pending.append(executor.submit(fetch, arg))
+            if len(pending) >= prefetch:
+                break
+
+        while pending:
+            future = pending.popleft()
+            for arg in args_iter:
+                pending.append(executor.submit(fetch, arg))
+                break
+            yield future.result()
+
+
+def _with_page(url, page):
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    query["page"] = [str(page)]
+    return urlunsplit(parts._replace(query=urlencode(query, doseq=True)))
+
+
+def iter_github_pages(session, url, headers, params=None, prefetch=0):
+    """
+    Duyệt toàn bộ các trang của một GitHub list endpoint theo header `Link`
+
+    Args:
+        session: requests.Session dùng để gọi API
+        url: URL endpoint (vd: .../repos/{repo}/issues)
+        headers: Headers xác thực
+        params: Query params cho trang đầu tiên
+        prefetch: Số trang tải trước song song (0 = tuần tự theo rel="next")
+
+    Yields:
+        List các record JSON của từng trang
+    """
+    params = dict(params or {})
+    params.setdefault("per_page", GITHUB_MAX_PER_PAGE)
+
+    response = session.get(url, headers=headers, params=params)
+    response.raise_for_status()
+    yield response.json()
+
+    links = response.links
+    last_url = links.get("last", {}).get("url")
+
+    # Biết trang cuối -> có thể tải trước các trang tiếp theo song song
+    if prefetch > 0 and last_url:
+        last_page = int(parse_qs(urlsplit(last_url).query).get("page", ["1"])[0])
+        page_urls = [_with_page(last_url, page) for page in range(2, last_page + 1)]
+
+        def fetch(page_url):
+            page_response = session.get(page_url, headers=headers)
+            page_response.raise_for_status()
+            return page_response.json()
+
+        yield from _ordered_prefetch(fetch, page_urls, prefetch)
+        return
+
+    next_url = links.get("next", {}).get("url")
+    while next_url:
+        response = session.get(next_url, headers=headers)
+        response.raise_for_status()
+        yield response.json()
+        next_url = response.links.get("next", {}).get("url")
+
+
+def iter_rally_pages(session, url, headers, params=None, pagesize=200, prefetch=0):
+    """
+    Duyệt toàn bộ kết quả Rally WSAPI theo `StartIndex` / `TotalResultCount`
+
+    Args:
+        session: requests.Session dùng để gọi API
+        url: URL endpoint WSAPI (vd: .../hierarchicalrequirement)
+        headers: Headers xác thực
+        params: Query params (query, order, workspace, project, fetch...)
+        pagesize: Số record mỗi trang (tối đa 2000)
+        prefetch: Số trang tải trước song song
+
+    Yields:
+        List `QueryResult.Results` của từng trang
+    """
+    pagesize = min(pagesize, RALLY_MAX_PAGESIZE)
+    base_params = dict(params or {})
+    base_params["pagesize"] = pagesize
+
+    def fetch(start):
+        page_params = dict(base_params, start=start)
+        response = session.get(url, headers=headers, params=page_params)
+        response.raise_for_status()
+        return response.json().get("QueryResult", {})
+
+    first = fetch(1)
+    yield first.get("Results", [])
+
+    total = first.get("TotalResultCount", 0) or 0
+    starts = range(1 + pagesize, total + 1, pagesize)
+    for page in _ordered_prefetch(fetch, starts, prefetch):
+        results = page.get("Results", [])
+        if not results:
+            break
+        yield results
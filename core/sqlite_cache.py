@@ -0,0 +1,182 @@
+"""
+Key-value cache trên SQLite với LRU eviction và giới hạn dung lượng
+Dùng chung được giữa nhiều thread và nhiều process (WAL + busy timeout).
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class SQLiteLRUCache:
+    def __init__(self, path, table="cache", max_bytes=512 * 1024 * 1024, ttl=None):
+        """
+        Khởi tạo cache
+
+        Args:
+            path: Đường dẫn file SQLite
+            table: Tên bảng (nhiều cache có thể dùng chung một file)
+            max_bytes: Dung lượng tối đa của giá trị; vượt quá sẽ xóa entry ít dùng nhất
+            ttl: Thời gian sống (giây) của mỗi entry, None = không hết hạn
+        """
+        self.path = str(path)
+        self.table = table
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_last_access ON {self.table}(last_access)"
+            )
+            # Tổng dung lượng giữ trong một dòng meta, cập nhật bằng trigger trong cùng transaction
+            # với thao tác ghi / xóa, để evict không phải SUM(size) cả bảng sau mỗi lần set
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table}_meta (id INTEGER PRIMARY KEY CHECK (id = 1), "
+                "total_bytes INTEGER NOT NULL)"
+            )
+            conn.execute(
+                f"INSERT OR IGNORE INTO {self.table}_meta (id, total_bytes) "
+                f"SELECT 1, COALESCE(SUM(size), 0) FROM {self.table}"
+            )
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_size_ai AFTER INSERT ON {self.table} BEGIN "
+                f"UPDATE {self.table}_meta SET total_bytes = total_bytes + new.size WHERE id = 1; END"
+            )
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_size_ad AFTER DELETE ON {self.table} BEGIN "
+                f"UPDATE {self.table}_meta SET total_bytes = total_bytes - old.size WHERE id = 1; END"
+            )
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_size_au AFTER UPDATE OF size ON {self.table} BEGIN "
+                f"UPDATE {self.table}_meta SET total_bytes = total_bytes + new.size - old.size WHERE id = 1; END"
+            )
+            conn.execute("COMMIT")
+
+    def _connection(self):
+        # Mỗi thread một connection; sqlite3 connection không chia sẻ được giữa các thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, hits, misses):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get(self, key):
+        """Lấy giá trị (bytes) theo key, None nếu không có hoặc đã hết hạn"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Lấy nhiều giá trị một lần, trả về dict {key: bytes} cho các key có trong cache"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        conn = self._connection()
+        now = time.time()
+        found = {}
+
+        # SQLite giới hạn số tham số mỗi câu lệnh
+        for offset in range(0, len(keys), 500):
+            chunk = keys[offset:offset + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, value, created_at FROM {self.table} WHERE key IN ({placeholders})",
+                chunk
+            ).fetchall()
+
+            expired = []
+            for key, value, created_at in rows:
+                if self.ttl is not None and now - created_at > self.ttl:
+                    expired.append(key)
+                else:
+                    found[key] = value
+
+            if expired:
+                conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(k,) for k in expired])
+
+        if found:
+            conn.executemany(
+                f"UPDATE {self.table} SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found]
+            )
+
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        """Ghi nhiều entry {key: bytes} và evict nếu vượt max_bytes"""
+        if not items:
+            return
+
+        now = time.time()
+        conn = self._connection()
+        # Upsert (không dùng REPLACE: REPLACE xóa dòng cũ mà không chạy trigger delete)
+        conn.executemany(
+            f"INSERT INTO {self.table} (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+            "created_at = excluded.created_at, last_access = excluded.last_access",
+            [(key, value, len(value), now, now) for key, value in items.items()]
+        )
+        self._evict(conn)
+
+    def delete(self, key):
+        self._connection().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def _evict(self, conn):
+        if not self.max_bytes:
+            return
+
+        total = self._total_bytes(conn)
+        if total <= self.max_bytes:
+            return
+
+        # Xóa entry ít được dùng nhất cho tới khi còn ~90% dung lượng cho phép
+        target = int(self.max_bytes * 0.9)
+        to_free = total - target
+        rows = conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_access ASC")
+        stale = []
+        for key, size in rows:
+            if to_free <= 0:
+                break
+            stale.append((key,))
+            to_free -= size
+        rows.close()
+        conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", stale)
+
+    def _total_bytes(self, conn):
+        return conn.execute(f"SELECT total_bytes FROM {self.table}_meta WHERE id = 1").fetchone()[0]
+
+    def clear(self):
+        self._connection().execute(f"DELETE FROM {self.table}")
+
+    def stats(self):
+        conn = self._connection()
+        entries = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": self._total_bytes(conn),
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,226 @@
+"""
+Incremental (delta) sync GitHub / Rally vào vector database
+Lưu high-water mark cho từng nguồn, mỗi lần chạy chỉ lấy các item thay đổi
+(GitHub `since=`, Rally `LastUpdateDate`) rồi upsert, có tùy chọn đối soát xóa.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from .data_connector import DataConnector
+from .chunking import parent_of
+from .documents import (
+    RALLY_KINDS,
+    github_issue_document,
+    github_issue_id,
+    rally_item_document,
+    rally_item_id,
+)
+from .ingest import IngestStats, upsert_changed
+
+
+class SyncState:
+    def __init__(self, path):
+        """
+        Lưu trạng thái sync (high-water mark) ra file JSON
+
+        Args:
+            path: Đường dẫn file trạng thái, vd: ./chroma_db/sync_state.json
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def get(self, source_key):
+        with self._lock:
+            return dict(self._state.get(source_key, {}))
+
+    def update(self, source_key, **values):
+        with self._lock:
+            self._state.setdefault(source_key, {}).update(values)
+            self._save()
+
+    def reset(self, source_key):
+        with self._lock:
+            if self._state.pop(source_key, None) is not None:
+                self._save()
+
+    def _save(self):
+        """Ghi state ra file (gọi khi đang giữ lock)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Ghi ra file tạm rồi replace để không hỏng state khi bị ngắt giữa chừng
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class SyncEngine:
+    def __init__(self, state_path="./chroma_db/sync_state.json", connector=None, batch_size=100,
+                 keyword_index=None):
+        """
+        Khởi tạo Sync Engine
+
+        Args:
+            state_path: File lưu high-water mark của từng nguồn
+            connector: DataConnector dùng để gọi API (mặc định tạo mới)
+            batch_size: Số document mỗi lần upsert
+            keyword_index: KeywordIndex cập nhật cùng collection (tùy chọn)
+        """
+        self.state = SyncState(state_path)
+        self.connector = connector or DataConnector()
+        self.batch_size = batch_size
+        self.keyword_index = keyword_index
+
+    def sync_github(self, collection, repo_owner, repo_name, full=False, reconcile=False):
+        """
+        Đồng bộ issues của một repository vào collection
+
+        Args:
+            collection: ChromaDB collection đích
+            repo_owner: Owner của repository
+            repo_name: Tên repository
+            full: Bỏ qua high-water mark, đồng bộ lại toàn bộ
+            reconcile: Xóa các issue không còn tồn tại trên GitHub
+
+        Returns:
+            Dict báo cáo (fetched, upserted, deleted, embedding hit/miss, watermark, duration)
+        """
+        source_key = f"github:{repo_owner}/{repo_name}"
+        repo = f"{repo_owner}/{repo_name}"
+        since = None if full else self.state.get(source_key).get("watermark")
+
+        def documents():
+            for issue in self.connector.iter_github_issues(repo, since=since):
+                yield issue.get("updated_at"), github_issue_document(repo_owner, repo_name, issue)
+
+        report = self._run(source_key, collection, documents(), since)
+
+        if reconcile:
+            remote_ids = {
+                github_issue_id(repo_owner, repo_name, issue.get("number"))
+                for issue in self.connector.iter_github_issues(repo)
+            }
+            where = {"$and": [{"repo_owner": repo_owner}, {"repo_name": repo_name}, {"type": "issue"}]}
+            report["deleted"] = self._reconcile(collection, where, remote_ids)
+
+        return report
+
+    def sync_rally(self, collection, workspace="", project="", kinds=("stories", "defects"),
+                   full=False, reconcile=False):
+        """
+        Đồng bộ các artifact Rally vào collection
+
+        Args:
+            collection: ChromaDB collection đích, hoặc dict {kind: collection}
+            workspace: Workspace ID (tùy chọn)
+            project: Project ID (tùy chọn)
+            kinds: Các loại artifact cần sync ("stories", "features", "defects")
+            full: Bỏ qua high-water mark, đồng bộ lại toàn bộ
+            reconcile: Xóa các artifact không còn tồn tại trên Rally
+
+        Returns:
+            Dict {kind: báo cáo}
+        """
+        scope = f"{workspace}/{project}"
+        reports = {}
+
+        for kind in kinds:
+            target = collection.get(kind) if isinstance(collection, dict) else collection
+            if target is None:
+                continue
+
+            source_key = f"rally:{kind}:{scope}"
+            since = None if full else self.state.get(source_key).get("watermark")
+            fetch_items = getattr(self.connector, f"iter_rally_{kind}")
+
+            def documents(fetch_items=fetch_items, kind=kind, since=since):
+                for item in fetch_items(workspace, project, since=since):
+                    yield item.get("updated_at"), rally_item_document(kind, item, scope)
+
+            report = self._run(source_key, target, documents(), since)
+
+            if reconcile:
+                remote_ids = {
+                    rally_item_id(kind, item.get("formatted_id"))
+                    for item in fetch_items(workspace, project, fetch="FormattedID")
+                }
+                where = {"$and": [{"type": RALLY_KINDS[kind]["type"]}, {"rally_scope": scope}]}
+                report["deleted"] = self._reconcile(target, where, remote_ids)
+
+            reports[kind] = report
+
+        return reports
+
+    def reset(self, source_key):
+        """Xóa high-water mark để lần sync sau lấy lại toàn bộ"""
+        self.state.reset(source_key)
+
+    def _run(self, source_key, collection, documents, since):
+        """Upsert các document thay đổi theo batch và cập nhật high-water mark khi thành công"""
+        start = time.time()
+        watermark = since
+        fetched = 0
+        stats = IngestStats()
+        batch = []
+
+        for updated_at, document in documents:
+            fetched += 1
+            if updated_at and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                stats.add(self._upsert(collection, batch))
+                batch = []
+
+        if batch:
+            stats.add(self._upsert(collection, batch))
+
+        # Chỉ tiến high-water mark khi toàn bộ lần chạy thành công
+        self.state.update(
+            source_key,
+            watermark=watermark,
+            last_sync=datetime.now().isoformat()
+        )
+
+        return {
+            "source": source_key,
+            "fetched": fetched,
+            "upserted": stats.misses,
+            "deleted": 0,
+            "embedding": stats.as_dict(),
+            "watermark": watermark,
+            "duration": round(time.time() - start, 3)
+        }
+
+    def _upsert(self, collection, batch):
+        ids, documents, metadatas = zip(*batch)
+        return upsert_changed(
+            collection, list(ids), list(documents), list(metadatas), keyword_index=self.keyword_index
+        )
+
+    def _reconcile(self, collection, where, remote_ids):
+        """Xóa các document (kèm mọi chunk) trong phạm vi `where` không còn trong remote_ids"""
+        local = collection.get(where=where, include=["metadatas"])
+        stale_ids = sorted(
+            doc_id for doc_id, metadata in zip(local["ids"], local["metadatas"] or [])
+            if parent_of(doc_id, metadata) not in remote_ids
+        )
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+            if self.keyword_index is not None:
+                self.keyword_index.delete(collection.name, stale_ids)
+        return len(stale_ids)
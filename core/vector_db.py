@@ -3,13 +3,45 @@ Vector Database Integration cho BrainStory AI Agent
 Sử dụng ChromaDB để lưu trữ và tìm kiếm dữ liệu từ GitHub và Rally
 """
 
-import chromadb
+import heapq
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from .chroma_client import create_chroma_client
+from .chunking import collapse_chunks
 from .data_connector import DataConnector
+from .documents import (
+    RALLY_KINDS,
+    exact_identifier,
+    github_issue_document,
+    github_issue_id,
+    mentioned_identifiers,
+    rally_item_document,
+    rally_item_id,
+    search_filters,
+    to_epoch,
+)
+from .embedding_cache import get_embedding_function
+from .ingest import IngestStats, upsert_changed
+from .keyword_index import get_keyword_index, reciprocal_rank_fusion
+from .sync_engine import SyncEngine
+from .vector_store import BACKEND_CHROMA, create_vector_store, vector_store_backend
 
 
+# Lấy thêm kết quả khi query để sau khi gom chunk vẫn đủ `limit` document
+CHUNK_OVERFETCH = int(os.getenv("CHUNK_SEARCH_OVERFETCH", "3"))
+
+# Hằng số k của reciprocal-rank fusion giữa vector search và keyword search
+RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+# Các collection được tìm bởi search_relevant_context (cần có trong keyword index)
+SEARCHABLE_COLLECTIONS = ("github_data", "rally_data")
+
+# Khóa trong sync state đánh dấu collection đã được thêm updated_ts
+UPDATED_TS_BACKFILL_KEY = "updated_ts_backfill"
+
 class VectorDBConnector:
     def __init__(self, db_path="./chroma_db"):
         """
@@ -20,61 +52,116 @@ class VectorDBConnector:
         """
         self.db_path = db_path
         self.client = None
+        self.backend = None
         self.collections = {}
+        self.embedding_function = None
         self.is_initialized = False
+        self._query_executor = None
+        self._sync_engine = None
+        self.keyword_index = None
+        self.ingest_stats = IngestStats()
+        self._init_lock = threading.Lock()
         
     def initialize(self):
-        """Khởi tạo ChromaDB và các collections"""
-        try:
-            # Tạo thư mục nếu chưa tồn tại
-            Path(self.db_path).mkdir(parents=True, exist_ok=True)
-            
-            # Khởi tạo ChromaDB client
-            self.client = chromadb.PersistentClient(path=self.db_path)
-            
-            # Tạo collections
-            self._setup_collections()
-            
-            self.is_initialized = True
-            return True
+        """Khởi tạo ChromaDB và các collections (an toàn khi nhiều thread gọi cùng lúc)"""
+        with self._init_lock:
+            if self.is_initialized:
+                return True
             
-        except Exception as e:
-            print(f"Vector DB initialization error: {e}")
-            return False
+            try:
+                # Thư mục local vẫn cần cho embedding cache, keyword index và sync state
+                Path(self.db_path).mkdir(parents=True, exist_ok=True)
+                
+                # ChromaDB client: embedded hoặc HTTP server (VECTOR_DB_MODE); flat index không cần client
+                self.backend = vector_store_backend()
+                if self.backend == BACKEND_CHROMA:
+                    self.client = create_chroma_client(self.db_path)
+                
+                # Embedding function có cache trên đĩa, dùng chung cho mọi collection
+                self.embedding_function = get_embedding_function(self.db_path)
+                
+                # Tạo collections
+                self._setup_collections()
+                
+                # Keyword index (BM25) cạnh ChromaDB cho hybrid search
+                self.keyword_index = get_keyword_index(self.db_path)
+                self._backfill_keyword_index()
+                self._backfill_updated_ts()
+                
+                self.is_initialized = True
+                return True
+                
+            except Exception as e:
+                print(f"Vector DB initialization error: {e}")
+                return False
     
     def _setup_collections(self):
-        """Setup các collections cần thiết"""
-        collections_config = {
-            "github_data": {
-                "name": "github_data",
-                "metadata": {"hnsw:space": "cosine"}
-            },
-            "rally_data": {
-                "name": "rally_data", 
-                "metadata": {"hnsw:space": "cosine"}
-            },
-            "user_stories": {
-                "name": "user_stories",
-                "metadata": {"hnsw:space": "cosine"}
-            }
-        }
+        """Setup các collections cần thiết (ChromaDB hoặc flat index theo VECTOR_STORE)"""
+        directory = os.path.join(self.db_path, "flat_index")
+        for name in ("github_data", "rally_data", "user_stories"):
+            try:
+                self.collections[name] = create_vector_store(
+                    name, self.embedding_function, client=self.client, directory=directory,
+                    backend=self.backend, metadata={"hnsw:space": "cosine"}
+                )
+            except Exception as e:
+                print(f"Error setting up collection {name}: {e}")
+    
+    def _backfill_keyword_index(self):
+        """Index lại collection có dữ liệu chưa nằm trong keyword index (vd: tạo trước khi có hybrid search)"""
+        if self.keyword_index is None:
+            return
         
-        for key, config in collections_config.items():
+        for name in SEARCHABLE_COLLECTIONS:
+            collection = self.collections.get(name)
+            if collection is None:
+                continue
             try:
-                # Kiểm tra collection đã tồn tại chưa
-                try:
-                    collection = self.client.get_collection(config["name"])
-                except:
-                    # Tạo collection mới
-                    collection = self.client.create_collection(
-                        name=config["name"],
-                        metadata=config["metadata"]
-                    )
-                
-                self.collections[key] = collection
-                
+                if self.keyword_index.count(name) != collection.count():
+                    total = self.keyword_index.rebuild(collection)
+                    print(f"🔤 Đã index {total} documents của '{name}' vào keyword index")
             except Exception as e:
-                print(f"Error setting up collection {config['name']}: {e}")
+                print(f"Error building keyword index for {name}: {e}")
+    
+    def _backfill_updated_ts(self, batch_size=500):
+        """
+        Thêm updated_ts (epoch) từ updated_at cho document ingest trước khi có bộ lọc theo ngày
+
+        Không có updated_ts thì document bị loại khỏi mọi tìm kiếm có updated_after / updated_before.
+        Chạy một lần cho mỗi collection (đánh dấu trong sync state), chỉ cập nhật metadata, không embed lại.
+        """
+        done = self.sync_engine.state.get(UPDATED_TS_BACKFILL_KEY)
+        for name in SEARCHABLE_COLLECTIONS:
+            collection = self.collections.get(name)
+            if collection is None or done.get(name):
+                continue
+            try:
+                total = 0
+                offset = 0
+                while True:
+                    result = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+                    if not result["ids"]:
+                        break
+                    ids, documents, metadatas = [], [], []
+                    for doc_id, document, metadata in zip(result["ids"], result["documents"], result["metadatas"]):
+                        metadata = metadata or {}
+                        updated_ts = to_epoch(metadata.get("updated_at"))
+                        if "updated_ts" in metadata or updated_ts is None:
+                            continue
+                        ids.append(doc_id)
+                        documents.append(document)
+                        metadatas.append(dict(metadata, updated_ts=updated_ts))
+                    if ids:
+                        collection.update(ids=ids, metadatas=metadatas)
+                        if self.keyword_index is not None:
+                            self.keyword_index.upsert(name, ids, documents, metadatas)
+                        total += len(ids)
+                    offset += len(result["ids"])
+                self.sync_engine.state.update(UPDATED_TS_BACKFILL_KEY, **{name: True})
+                if total:
+                    print(f"🕒 Đã thêm updated_ts cho {total} documents của '{name}'")
+            except Exception as e:
+                print(f"Error backfilling updated_ts for {name}: {e}")
     
     def add_github_context(self, repo_owner, repo_name, context_data):
         """
@@ -102,7 +189,7 @@ class VectorDBConnector:
                 Repository: {repo_owner}/{repo_name}
                 Description: {repo_info.get('description', '')}
                 Language: {repo_info.get('language', '')}
-                README: {repo_info.get('readme', '')[:1000]}...
+                README: {repo_info.get('readme', '')}
                 """
                 
                 documents.append(doc_text)
@@ -111,37 +198,25 @@ class VectorDBConnector:
                     "type": "repository",
                     "owner": repo_owner,
                     "name": repo_name,
-                    "updated_at": datetime.now().isoformat()
+                    "repo_owner": repo_owner,
+                    "repo_name": repo_name,
+                    "updated_at": datetime.now().isoformat(),
+                    "updated_ts": datetime.now().timestamp()
                 })
             
             # Thêm issues/PRs
             if context_data.get('issues'):
-                for i, issue in enumerate(context_data['issues'][:10]):  # Giới hạn 10 issues
-                    doc_text = f"""
-                    Issue #{issue.get('number', '')}: {issue.get('title', '')}
-                    State: {issue.get('state', '')}
-                    Body: {issue.get('body', '')[:500]}...
-                    Labels: {', '.join([label.get('name', '') for label in issue.get('labels', [])])}
-                    """
-                    
+                for issue in context_data['issues'][:10]:  # Giới hạn 10 issues
+                    doc_id, doc_text, metadata = github_issue_document(repo_owner, repo_name, issue)
                     documents.append(doc_text)
-                    ids.append(f"issue_{repo_owner}_{repo_name}_{issue.get('number', i)}")
-                    metadatas.append({
-                        "type": "issue",
-                        "repo_owner": repo_owner,
-                        "repo_name": repo_name,
-                        "number": issue.get('number', i),
-                        "state": issue.get('state', ''),
-                        "updated_at": datetime.now().isoformat()
-                    })
-            
-            # Thêm vào collection
+                    ids.append(doc_id)
+                    metadatas.append(metadata)
+            
+            # Thêm vào collection (bỏ qua document không đổi nội dung)
             if documents:
-                collection.add(
-                    documents=documents,
-                    ids=ids,
-                    metadatas=metadatas
-                )
+                stats = upsert_changed(collection, ids, documents, metadatas, keyword_index=self.keyword_index)
+                self.ingest_stats.add(stats)
+                print(f"📦 {collection.name}: {stats}")
                 
                 return True
                 
@@ -170,29 +245,16 @@ class VectorDBConnector:
             # Thêm stories
             if context_data.get('stories'):
                 for story in context_data['stories'][:10]:  # Giới hạn 10 stories
-                    doc_text = f"""
-                    Story {story.get('FormattedID', '')}: {story.get('Name', '')}
-                    State: {story.get('ScheduleState', '')}
-                    Description: {story.get('Description', '')[:500]}...
-                    Iteration: {story.get('Iteration', {}).get('Name', '') if story.get('Iteration') else ''}
-                    """
-                    
+                    doc_id, doc_text, metadata = rally_item_document("stories", story)
                     documents.append(doc_text)
-                    ids.append(f"story_{story.get('FormattedID', '')}")
-                    metadatas.append({
-                        "type": "user_story",
-                        "formatted_id": story.get('FormattedID', ''),
-                        "state": story.get('ScheduleState', ''),
-                        "updated_at": datetime.now().isoformat()
-                    })
-            
-            # Thêm vào collection
+                    ids.append(doc_id)
+                    metadatas.append(metadata)
+            
+            # Thêm vào collection (bỏ qua document không đổi nội dung)
             if documents:
-                collection.add(
-                    documents=documents,
-                    ids=ids,
-                    metadatas=metadatas
-                )
+                stats = upsert_changed(collection, ids, documents, metadatas, keyword_index=self.keyword_index)
+                self.ingest_stats.add(stats)
+                print(f"📦 {collection.name}: {stats}")
                 
                 return True
                 
@@ -201,14 +263,158 @@ class VectorDBConnector:
             
         return False
     
-    def search_relevant_context(self, query, context_type="all", limit=5):
+    @property
+    def sync_engine(self):
+        """SyncEngine lưu high-water mark cạnh thư mục ChromaDB"""
+        if self._sync_engine is None:
+            self._sync_engine = SyncEngine(
+                state_path=os.path.join(self.db_path, "sync_state.json"), keyword_index=self.keyword_index
+            )
+        return self._sync_engine
+    
+    def sync_github(self, repo_owner, repo_name, full=False, reconcile=False):
+        """
+        Đồng bộ incremental issues của repository vào github_data
+        
+        Args:
+            repo_owner: Owner của repository
+            repo_name: Tên repository
+            full: Đồng bộ lại toàn bộ thay vì chỉ phần thay đổi
+            reconcile: Xóa các issue không còn trên GitHub
+            
+        Returns:
+            Dict báo cáo sync hoặc None nếu chưa khởi tạo
+        """
+        if not self.is_initialized or "github_data" not in self.collections:
+            return None
+            
+        return self.sync_engine.sync_github(
+            self.collections["github_data"], repo_owner, repo_name,
+            full=full, reconcile=reconcile
+        )
+    
+    def sync_rally(self, workspace="", project="", kinds=("stories", "defects"), full=False, reconcile=False):
+        """
+        Đồng bộ incremental artifacts Rally vào rally_data
+        
+        Returns:
+            Dict {kind: báo cáo sync} hoặc None nếu chưa khởi tạo
+        """
+        if not self.is_initialized or "rally_data" not in self.collections:
+            return None
+            
+        return self.sync_engine.sync_rally(
+            self.collections["rally_data"], workspace, project,
+            kinds=kinds, full=full, reconcile=reconcile
+        )
+    
+    def get_documents(self, collection_name, ids=None, where=None):
+        """
+        Lấy document theo ID gốc (hoặc metadata filter), gom các chunk về document gốc
+        
+        Args:
+            collection_name: Tên collection
+            ids: List ID document gốc (vd: story_US123); tra cứu trực tiếp theo primary key
+            where: Metadata filter của ChromaDB (dùng khi không có ids)
+            
+        Returns:
+            List {"id", "text", "metadata", "similarity": 1.0, "source"} mỗi document một phần tử
+        """
+        collection = self.collections.get(collection_name)
+        if not self.is_initialized or collection is None or not (ids or where):
+            return []
+        
+        include = ["documents", "metadatas"]
+        if ids:
+            ids = list(ids)
+            # Document một chunk giữ nguyên ID; document nhiều chunk tra qua parent_id
+            batches = [
+                collection.get(ids=ids, include=include),
+                collection.get(where={"parent_id": {"$in": ids}}, include=include)
+            ]
+        else:
+            batches = [collection.get(where=where, include=include)]
+        
+        hits = {}
+        for batch in batches:
+            for doc_id, doc, metadata in zip(batch["ids"], batch["documents"] or [], batch["metadatas"] or []):
+                hits[doc_id] = {
+                    "id": doc_id,
+                    "text": doc,
+                    "metadata": metadata or {},
+                    "similarity": 1.0,
+                    "source": collection_name
+                }
+        
+        results = collapse_chunks(list(hits.values()))
+        if ids:
+            order = {doc_id: i for i, doc_id in enumerate(ids)}
+            results.sort(key=lambda result: order.get(result["id"], len(order)))
+        return results
+    
+    def lookup_formatted_ids(self, formatted_ids):
+        """Rally stories / features / defects theo FormattedID (US123, F45, DE7)"""
+        ids = [rally_item_id(kind, formatted_id) for formatted_id in formatted_ids for kind in RALLY_KINDS]
+        return self.get_documents("rally_data", ids)
+    
+    def lookup_issue(self, number, repo=None):
+        """
+        GitHub issue theo số
+        
+        Args:
+            number: Số issue
+            repo: "owner/name"; không truyền thì tìm trong mọi repository đã lưu
+        """
+        if repo and "/" in repo:
+            owner, name = repo.split("/", 1)
+            return self.get_documents("github_data", [github_issue_id(owner, name, number)])
+        
+        return self.get_documents("github_data", where={"$and": [{"type": "issue"}, {"number": int(number)}]})
+    
+    def lookup_repo(self, repo):
+        """Repository và toàn bộ issues đã lưu của repository ("owner/name")"""
+        owner, name = repo.split("/", 1)
+        return self.get_documents("github_data", where={"$or": [
+            {"$and": [{"owner": owner}, {"name": name}]},
+            {"$and": [{"repo_owner": owner}, {"repo_name": name}]}
+        ]})
+    
+    def lookup_mentioned(self, text, repo=None, limit=5):
+        """
+        Các item được nhắc tới trong text (vd: prompt chứa "US123" hoặc "#456")
+        
+        Args:
+            text: Prompt hoặc câu query
+            repo: Giới hạn issue trong repository ("owner/name")
+            limit: Số item tối đa
+        """
+        if not self.is_initialized:
+            return []
+        
+        formatted_ids, issue_numbers = mentioned_identifiers(text)
+        results = []
+        try:
+            if formatted_ids:
+                results.extend(self.lookup_formatted_ids(formatted_ids[:limit]))
+            for number in issue_numbers[:limit]:
+                results.extend(self.lookup_issue(number, repo))
+        except Exception as e:
+            print(f"Error looking up mentioned items: {e}")
+        return results[:limit]
+    
+    def search_relevant_context(self, query, context_type="all", limit=5, **filters):
         """
         Tìm kiếm context liên quan dựa trên query
         
+        Kết hợp vector search và keyword search (BM25) bằng reciprocal-rank fusion.
+        Query chỉ là một định danh (US123, #456) được tra theo ID, không cần embedding.
+        
         Args:
             query: Câu query tìm kiếm
             context_type: Loại context ("github", "rally", "all")
             limit: Số lượng kết quả tối đa
+            **filters: repo, state, doc_type, updated_after, updated_before, contains
+                (xem documents.search_filters); lọc ngay trong index
             
         Returns:
             List các context liên quan
@@ -216,56 +422,209 @@ class VectorDBConnector:
         if not self.is_initialized:
             return []
             
-        results = []
-        
         try:
-            collections_to_search = []
-            
-            if context_type == "all":
-                collections_to_search = ["github_data", "rally_data"]
-            elif context_type == "github":
-                collections_to_search = ["github_data"]
-            elif context_type == "rally":
-                collections_to_search = ["rally_data"]
-            
-            for collection_name in collections_to_search:
-                if collection_name in self.collections:
-                    collection = self.collections[collection_name]
-                    
-                    search_results = collection.query(
-                        query_texts=[query],
-                        n_results=limit
-                    )
-                    
-                    # Format results
-                    if search_results.get('documents') and search_results['documents'][0]:
-                        for i, doc in enumerate(search_results['documents'][0]):
-                            metadata = search_results['metadatas'][0][i] if search_results.get('metadatas') else {}
-                            distance = search_results['distances'][0][i] if search_results.get('distances') else 1.0
-                            
-                            results.append({
-                                'text': doc,
-                                'metadata': metadata,
-                                'similarity': 1 - distance,  # Convert distance to similarity
-                                'source': collection_name
-                            })
-            
-            # Sort by similarity
-            results = sorted(results, key=lambda x: x['similarity'], reverse=True)
-            
-            return results[:limit]
+            collections_to_search = self._collections_for(context_type)
+            if not collections_to_search:
+                return []
+            
+            where, where_document = search_filters(**filters)
+            
+            if not (where or where_document):
+                exact = self._lookup_exact(query, collections_to_search, limit)
+                if exact:
+                    return exact
+            
+            # Embed query một lần, dùng chung cho mọi collection
+            query_embedding = self.embedding_function([query])
+            
+            # Query các collection song song, gom chunk theo document gốc
+            per_collection = self._query_collections(
+                collections_to_search, query_embedding, limit * CHUNK_OVERFETCH, where, where_document
+            )
+            vector_results = collapse_chunks([result for results in per_collection for result in results[0]])
+            
+            return self._fuse(
+                query, vector_results, collections_to_search, query_embedding[0], limit, where, where_document
+            )
             
         except Exception as e:
             print(f"Error searching context: {e}")
             return []
     
+    def search_relevant_context_batch(self, queries, context_type="all", limit=5, **filters):
+        """
+        Tìm kiếm context cho nhiều query cùng lúc
+        
+        Embed toàn bộ queries trong một lần gọi và gửi một multi-query
+        collection.query cho mỗi collection.
+        
+        Args:
+            queries: List câu query
+            context_type: Loại context ("github", "rally", "all")
+            limit: Số lượng kết quả tối đa cho mỗi query
+            **filters: Bộ lọc áp dụng cho mọi query (như search_relevant_context)
+            
+        Returns:
+            List (cùng thứ tự với queries) các list context liên quan
+        """
+        queries = list(queries)
+        if not self.is_initialized or not queries:
+            return [[] for _ in queries]
+            
+        try:
+            collections_to_search = self._collections_for(context_type)
+            if not collections_to_search:
+                return [[] for _ in queries]
+            
+            where, where_document = search_filters(**filters)
+            query_embeddings = self.embedding_function(queries)
+            per_collection = self._query_collections(
+                collections_to_search, query_embeddings, limit * CHUNK_OVERFETCH, where, where_document
+            )
+            
+            return [
+                self._fuse(
+                    query,
+                    collapse_chunks([result for results in per_collection for result in results[q]]),
+                    collections_to_search, query_embeddings[q], limit, where, where_document
+                )
+                for q, query in enumerate(queries)
+            ]
+            
+        except Exception as e:
+            print(f"Error searching context batch: {e}")
+            return [[] for _ in queries]
+    
+    def _lookup_exact(self, query, collection_names, limit):
+        """Kết quả khớp đúng định danh qua lookup theo ID (rỗng nếu query không phải ID)"""
+        identifier = exact_identifier(query)
+        if identifier is None:
+            return []
+        
+        field, value = identifier
+        if field == "formatted_id":
+            results = self.lookup_formatted_ids([value]) if "rally_data" in collection_names else []
+        else:
+            results = self.lookup_issue(value) if "github_data" in collection_names else []
+        return results[:limit]
+    
+    def _fuse(self, query, vector_results, collection_names, query_embedding, limit, where=None, where_document=None):
+        """Gộp kết quả vector và keyword bằng reciprocal-rank fusion, lấy top-k"""
+        if self.keyword_index is None:
+            return heapq.nlargest(limit, vector_results, key=lambda x: x['similarity'])
+        
+        hits = self.keyword_index.search(
+            query, collection_names, limit * CHUNK_OVERFETCH, where=where, where_document=where_document
+        )
+        # Gom chunk theo document, xếp theo điểm BM25 tốt nhất
+        keyword_results = sorted(
+            collapse_chunks([{**hit, "similarity": hit["score"]} for hit in hits]),
+            key=lambda x: x['similarity'], reverse=True
+        )
+        
+        vector_ranking = sorted(vector_results, key=lambda x: x['similarity'], reverse=True)
+        vector_keys = {(result['source'], result['id']) for result in vector_ranking}
+        
+        fused = reciprocal_rank_fusion([vector_ranking, keyword_results], k=RRF_K)[:limit]
+        
+        # Document chỉ tìm thấy bằng keyword: tính similarity từ embedding đã lưu trong ChromaDB
+        keyword_only = [result for result in fused if (result['source'], result['id']) not in vector_keys]
+        if keyword_only:
+            self._fill_similarity(keyword_only, query_embedding)
+        
+        return fused
+    
+    def _fill_similarity(self, results, query_embedding):
+        """Cosine similarity giữa query và chunk tốt nhất của mỗi kết quả (không cần embed lại)"""
+        by_source = {}
+        for result in results:
+            by_source.setdefault(result['source'], []).append(result)
+        
+        for source, items in by_source.items():
+            chunk_ids = [chunk_id for item in items for chunk_id in item.get('chunk_ids') or [item['id']]]
+            stored = self.collections[source].get(ids=chunk_ids, include=["embeddings"])
+            embeddings = dict(zip(stored['ids'], stored['embeddings'] if stored.get('embeddings') is not None else []))
+            
+            for item in items:
+                scores = [
+                    _cosine(query_embedding, embeddings[chunk_id])
+                    for chunk_id in item.get('chunk_ids') or [item['id']]
+                    if chunk_id in embeddings
+                ]
+                item['similarity'] = max(scores) if scores else 0.0
+    
+    def _collections_for(self, context_type):
+        """Tên các collection cần tìm theo context_type"""
+        if context_type == "all":
+            names = ["github_data", "rally_data"]
+        elif context_type == "github":
+            names = ["github_data"]
+        elif context_type == "rally":
+            names = ["rally_data"]
+        else:
+            names = []
+        return [name for name in names if name in self.collections]
+    
+    def _query_collections(self, collection_names, query_embeddings, limit, where=None, where_document=None):
+        """
+        Query nhiều collection đồng thời với embeddings đã tính sẵn
+        
+        Returns:
+            List (theo thứ tự collection_names) các list kết quả theo từng query
+        """
+        if len(collection_names) == 1:
+            return [self._query_collection(collection_names[0], query_embeddings, limit, where, where_document)]
+        
+        if self._query_executor is None:
+            self._query_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vector-query")
+        
+        futures = [
+            self._query_executor.submit(self._query_collection, name, query_embeddings, limit, where, where_document)
+            for name in collection_names
+        ]
+        return [future.result() for future in futures]
+    
+    def _query_collection(self, collection_name, query_embeddings, limit, where=None, where_document=None):
+        """Query một collection, trả về list kết quả đã format cho từng query embedding"""
+        collection = self.collections[collection_name]
+        
+        search_results = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=limit,
+            where=where,
+            where_document=where_document
+        )
+        
+        # Format results
+        formatted = []
+        for q, docs in enumerate(search_results.get('documents') or []):
+            results = []
+            for i, doc in enumerate(docs or []):
+                metadata = search_results['metadatas'][q][i] if search_results.get('metadatas') else {}
+                distance = search_results['distances'][q][i] if search_results.get('distances') else 1.0
+                
+                results.append({
+                    'id': search_results['ids'][q][i],
+                    'text': doc,
+                    'metadata': metadata,
+                    'similarity': 1 - distance,  # Convert distance to similarity
+                    'source': collection_name
+                })
+            formatted.append(results)
+        
+        # Collection rỗng có thể không trả về list cho từng query
+        while len(formatted) < len(query_embeddings):
+            formatted.append([])
+        
+        return formatted
+    
     def store_generated_story(self, story_content, metadata=None):
         """
         Lưu trữ user story đã được tạo
         
         Args:
             story_content: Nội dung user story
-            metadata: Metadata bổ sung
+            metadata: Metadata bổ sung ("complete": True để semantic cache được dùng lại story này)
         """
         if not self.is_initialized or "user_stories" not in self.collections:
             return False
@@ -273,20 +632,30 @@ class VectorDBConnector:
         try:
             collection = self.collections["user_stories"]
             
-            story_id = f"story_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            story_id = f"story_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
             
             story_metadata = {
                 "created_at": datetime.now().isoformat(),
+                "created_ts": datetime.now().timestamp(),
                 "type": "generated_story"
             }
             
             if metadata:
                 story_metadata.update(metadata)
             
+            # Embed theo prompt (không phải nội dung story) để semantic cache
+            # so khớp prompt mới với các prompt đã từng generate; chỉ với story model sinh trọn vẹn
+            # (không dùng lại hướng dẫn cài đặt hay output bị ngắt giữa chừng)
+            embeddings = None
+            if story_metadata.get("prompt") and story_metadata.get("complete"):
+                embeddings = self.embedding_function([story_metadata["prompt"]])
+                story_metadata["embedding_source"] = "prompt"
+            
             collection.add(
                 documents=[story_content],
                 ids=[story_id],
-                metadatas=[story_metadata]
+                metadatas=[story_metadata],
+                embeddings=embeddings
             )
             
             return True
@@ -295,6 +664,47 @@ class VectorDBConnector:
             print(f"Error storing generated story: {e}")
             return False
     
+    def find_similar_story(self, prompt, threshold=0.92):
+        """
+        Tìm story đã generate cho một prompt gần giống (semantic cache)
+        
+        Args:
+            prompt: Prompt người dùng
+            threshold: Độ tương đồng tối thiểu (cosine similarity) giữa hai prompt
+            
+        Returns:
+            Dict {id, story, prompt, similarity, metadata} hoặc None
+        """
+        if not self.is_initialized or "user_stories" not in self.collections:
+            return None
+            
+        try:
+            results = self.collections["user_stories"].query(
+                query_embeddings=self.embedding_function([prompt]),
+                n_results=1,
+                where={"$and": [{"embedding_source": "prompt"}, {"complete": True}]}
+            )
+            
+            if not results.get('ids') or not results['ids'][0]:
+                return None
+            
+            similarity = 1 - results['distances'][0][0]
+            if similarity < threshold:
+                return None
+            
+            metadata = results['metadatas'][0][0] or {}
+            return {
+                'id': results['ids'][0][0],
+                'story': results['documents'][0][0],
+                'prompt': metadata.get('prompt', ''),
+                'similarity': similarity,
+                'metadata': metadata
+            }
+            
+        except Exception as e:
+            print(f"Error searching similar story: {e}")
+            return None
+    
     def get_stats(self):
         """Lấy thống kê về vector database"""
         if not self.is_initialized:
@@ -315,6 +725,9 @@ class VectorDBConnector:
             if collection_name in self.collections:
                 collection = self.collections[collection_name]
                 
+                if self.keyword_index is not None:
+                    self.keyword_index.clear(collection_name)
+                
                 # Lấy tất cả IDs trong collection
                 result = collection.get()
                 if result['ids']:
@@ -329,3 +742,37 @@ class VectorDBConnector:
         except Exception as e:
             print(f"❌ Lỗi xóa collection: {e}")
             return False
+
+
+_connectors = {}
+_connectors_lock = threading.Lock()
+
+
+def get_vector_db(db_path=None):
+    """
+    VectorDBConnector dùng chung toàn process cho một thư mục ChromaDB
+    
+    Mọi caller (Streamlit app, llm_handler, batch, async API) dùng chung một client
+    và một bộ HNSW index đã load. Khởi tạo lazy ở lần gọi đầu; nếu lần trước lỗi thì thử lại.
+    
+    Args:
+        db_path: Thư mục ChromaDB (mặc định VECTOR_DB_PATH hoặc ./chroma_db)
+    """
+    db_path = db_path or os.getenv("VECTOR_DB_PATH", "./chroma_db")
+    key = os.path.abspath(db_path)
+    
+    with _connectors_lock:
+        connector = _connectors.get(key)
+        if connector is None:
+            connector = VectorDBConnector(db_path)
+            _connectors[key] = connector
+    
+    if not connector.is_initialized:
+        connector.initialize()
+    return connector
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5)
+    return dot / norm if norm else 0.0
@@ -0,0 +1,742 @@
+"""
+Lớp lưu trữ vector cho VectorDBConnector
+`VectorStore` là tập thao tác (add / upsert / update / get / query / delete / count) mà connector,
+ingest và sync engine dùng, cùng kiểu dữ liệu trả về với ChromaDB Collection. Các backend:
+ChromaDB (mặc định) và flat index in-process trên ma trận float32 NumPy liên tục, query bằng
+cosine top-k vectorized và snapshot ra file `.npy` được memory-map khi load lại. Với corpus
+nhỏ / vừa, flat index bỏ được round trip và chi phí persistence của ChromaDB; với corpus lớn,
+bản nén int8 (QuantizedVectorStore) giữ RAM thấp và xếp hạng lại bằng vector float32.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+
+BACKEND_CHROMA = "chroma"
+BACKEND_FLAT = "flat"
+BACKEND_INT8 = "int8"
+
+_DEFAULT_GET_INCLUDE = ("documents", "metadatas")
+_DEFAULT_QUERY_INCLUDE = ("documents", "metadatas", "distances")
+# Số hàng đọc / ghi mỗi lần khi chép hoặc quét ma trận theo block
+_BLOCK_ROWS = 4096
+
+
+class VectorStore(ABC):
+    """Giao diện chung của một collection vector (tham số và kết quả giống ChromaDB Collection)"""
+
+    name = ""
+
+    @abstractmethod
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        """Thêm document mới, bỏ qua ID đã tồn tại"""
+
+    @abstractmethod
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        """Thêm hoặc ghi đè document"""
+
+    @abstractmethod
+    def update(self, ids, documents=None, metadatas=None, embeddings=None):
+        """Cập nhật document đã có, bỏ qua ID chưa tồn tại"""
+
+    @abstractmethod
+    def get(self, ids=None, where=None, where_document=None, include=None, limit=None, offset=None):
+        """Lấy document theo ids / where / where_document"""
+
+    @abstractmethod
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None, where_document=None,
+              include=None):
+        """Top-k document gần nhất cho từng query (distance = 1 - cosine)"""
+
+    @abstractmethod
+    def delete(self, ids=None, where=None):
+        """Xóa document theo ids / where"""
+
+    @abstractmethod
+    def count(self):
+        """Số document trong collection"""
+
+    def flush(self):
+        """Ghi dữ liệu còn trong bộ nhớ xuống đĩa (backend tự persist thì không cần làm gì)"""
+
+
+def _given(**kwargs):
+    # ChromaDB dùng giá trị mặc định riêng cho include/limit..., chỉ truyền tham số được chỉ định
+    return {key: value for key, value in kwargs.items() if value is not None}
+
+
+class ChromaVectorStore(VectorStore):
+    def __init__(self, collection):
+        """
+        VectorStore trên một ChromaDB Collection (embedded hoặc HTTP client)
+
+        Args:
+            collection: chromadb Collection đã gắn embedding function
+        """
+        self.collection = collection
+        self.name = collection.name
+
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        self.collection.add(**_given(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings))
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        self.collection.upsert(**_given(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings))
+
+    def update(self, ids, documents=None, metadatas=None, embeddings=None):
+        self.collection.update(**_given(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings))
+
+    def get(self, ids=None, where=None, where_document=None, include=None, limit=None, offset=None):
+        return self.collection.get(**_given(
+            ids=ids, where=where, where_document=where_document, include=include, limit=limit, offset=offset
+        ))
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None, where_document=None,
+              include=None):
+        return self.collection.query(**_given(
+            query_embeddings=query_embeddings, query_texts=query_texts, n_results=n_results,
+            where=where, where_document=where_document, include=include
+        ))
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(**_given(ids=ids, where=where))
+
+    def count(self):
+        return self.collection.count()
+
+
+_COMPARATORS = {
+    "$eq": lambda value, target: value == target,
+    "$ne": lambda value, target: value != target,
+    "$gt": lambda value, target: value is not None and value > target,
+    "$gte": lambda value, target: value is not None and value >= target,
+    "$lt": lambda value, target: value is not None and value < target,
+    "$lte": lambda value, target: value is not None and value <= target,
+    "$in": lambda value, target: value in target,
+    "$nin": lambda value, target: value not in target,
+}
+
+
+def matches_where(metadata, where):
+    """Metadata có thỏa filter kiểu ChromaDB ($and, $or, $eq, $in, $gte, ...) không"""
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_where(metadata, sub) for sub in condition):
+                return False
+            continue
+
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        value = metadata.get(key)
+        for operator, target in condition.items():
+            compare = _COMPARATORS.get(operator)
+            if compare is None:
+                raise ValueError(f"Toan tu khong ho tro: {operator}")
+            try:
+                if not compare(value, target):
+                    return False
+            except TypeError:
+                return False
+    return True
+
+
+def matches_document(text, where_document):
+    """Document có thỏa filter {"$contains": ...} / {"$not_contains": ...} không"""
+    text = text or ""
+    for operator, target in where_document.items():
+        if operator == "$contains" and target not in text:
+            return False
+        if operator == "$not_contains" and target in text:
+            return False
+        if operator == "$and" and not all(matches_document(text, sub) for sub in target):
+            return False
+        if operator == "$or" and not any(matches_document(text, sub) for sub in target):
+            return False
+    return True
+
+
+def normalize_rows(vectors):
+    """Chuẩn hóa L2 từng hàng (float32) để cosine similarity chỉ còn là tích vô hướng"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores, k):
+    """Chỉ số k phần tử lớn nhất theo từng cột của scores (n x m), sắp xếp giảm dần"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty((0, scores.shape[1]), dtype=np.int64)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1, axis=0)[:k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[0])[:, None], scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=0), axis=0, kind="stable")
+    return np.take_along_axis(candidates, order, axis=0)
+
+
+class FlatVectorStore(VectorStore):
+    def __init__(self, name, embedding_function, directory=None, flush_interval=None):
+        """
+        Flat index in-process: ma trận float32 liên tục (đã chuẩn hóa), tìm kiếm brute-force
+
+        Snapshot được memory-map và không bị sửa giữa hai lần flush: hàng mới (và hàng đổi embedding)
+        được ghi vào bộ đệm `_tail` trong RAM, hàng bị xóa trong snapshot chỉ được đánh dấu; flush ghi
+        lại snapshot theo từng block. ids / documents / metadatas luôn nằm trong RAM và file `.json`
+        được ghi lại toàn bộ ở mỗi lần flush.
+
+        Args:
+            name: Tên collection
+            embedding_function: Hàm embed documents / query_texts khi không truyền embeddings
+            directory: Thư mục snapshot (<directory>/<name>.npy + <name>.json); None = chỉ trong RAM
+            flush_interval: Số giây tối thiểu giữa hai lần snapshot tự động (FLAT_INDEX_FLUSH_SECONDS,
+                mặc định 30); snapshot cuối cùng được ghi khi process thoát
+        """
+        self.name = name
+        self.embedding_function = embedding_function
+        self.directory = directory
+        self.flush_interval = flush_interval if flush_interval is not None else float(
+            os.getenv("FLAT_INDEX_FLUSH_SECONDS", "30")
+        )
+
+        self._lock = threading.RLock()
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._rows = {}
+        # Hàng [0, len(_vectors)) nằm trong snapshot, hàng [len(_vectors), _size) nằm trong _tail
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._tail = np.zeros((0, 0), dtype=np.float32)
+        self._deleted = set()
+        self._size = 0
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+        if directory:
+            self._load()
+            atexit.register(self.flush)
+
+    # --- Persistence ---
+
+    def _paths(self):
+        base = Path(self.directory) / self.name
+        return base.with_suffix(".npy"), base.with_suffix(".json")
+
+    def _load(self):
+        vectors_path, records_path = self._paths()
+        if not vectors_path.exists() or not records_path.exists():
+            return
+
+        try:
+            with open(records_path, encoding="utf-8") as f:
+                records = json.load(f)
+            # Memory-map: chỉ những trang được query mới được đọc vào RAM
+            vectors = np.load(vectors_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"Khong doc duoc snapshot cua '{self.name}': {e}")
+            return
+
+        size = min(len(records["ids"]), vectors.shape[0])
+        if size != len(records["ids"]) or size != vectors.shape[0]:
+            print(f"Snapshot cua '{self.name}' khong khop ({len(records['ids'])} ids / {vectors.shape[0]} vectors), "
+                  f"giu {size} ban ghi")
+
+        self._ids = records["ids"][:size]
+        self._documents = records["documents"][:size]
+        self._metadatas = records["metadatas"][:size]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._vectors = vectors[:size]
+        self._tail = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        self._size = size
+
+    def flush(self):
+        """Ghi snapshot (.npy cho vectors, .json cho ids / documents / metadatas) nếu có thay đổi"""
+        if not self.directory:
+            return
+
+        with self._lock:
+            if not self._dirty:
+                return
+
+            vectors_path, records_path = self._paths()
+            vectors_path.parent.mkdir(parents=True, exist_ok=True)
+            live = self._select(None, None, None)
+            ids = [self._ids[row] for row in live]
+            documents = [self._documents[row] for row in live]
+            metadatas = [self._metadatas[row] for row in live]
+            try:
+                # Ghi file tạm rồi replace để process khác không đọc phải snapshot dở dang;
+                # chép theo block để không phải dựng cả ma trận float32 trong RAM
+                tmp_vectors = vectors_path.with_suffix(".tmp.npy")
+                vectors = np.lib.format.open_memmap(tmp_vectors, mode="w+", dtype=np.float32,
+                                                    shape=(len(live), self._dim()))
+                for start in range(0, len(live), _BLOCK_ROWS):
+                    vectors[start:start + _BLOCK_ROWS] = self._gather(live[start:start + _BLOCK_ROWS])
+                vectors.flush()
+                del vectors
+                tmp_records = records_path.with_suffix(".tmp.json")
+                with open(tmp_records, "w", encoding="utf-8") as f:
+                    json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f, ensure_ascii=False)
+                os.replace(tmp_vectors, vectors_path)
+                os.replace(tmp_records, records_path)
+            except OSError as e:
+                print(f"Khong ghi duoc snapshot cua '{self.name}': {e}")
+                return
+
+            # Snapshot mới thay cho snapshot cũ + _tail + các hàng đã đánh dấu xóa
+            self._ids, self._documents, self._metadatas = ids, documents, metadatas
+            self._rows = {doc_id: row for row, doc_id in enumerate(ids)}
+            self._vectors = np.load(vectors_path, mmap_mode="r")
+            self._tail = np.zeros((0, self._vectors.shape[1]), dtype=np.float32)
+            self._deleted = set()
+            self._size = len(ids)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def _changed(self):
+        self._dirty = True
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    # --- Lưu trữ ---
+
+    def _embed(self, documents, embeddings):
+        if embeddings is not None:
+            return normalize_rows(embeddings)
+        if documents is None:
+            raise ValueError("Can documents hoac embeddings")
+        return normalize_rows(self.embedding_function(list(documents)))
+
+    def _dim(self):
+        return self._tail.shape[1]
+
+    def _base_size(self):
+        """Số hàng nằm trong snapshot memory-mapped"""
+        return self._vectors.shape[0]
+
+    def _reserve(self, extra, dim):
+        """Đảm bảo _tail đủ chỗ cho thêm `extra` hàng (tăng gấp đôi khi đầy)"""
+        if not self._rows and self._dim() != dim:
+            # Collection rỗng (chỉ còn hàng đã đánh dấu xóa): đổi số chiều được
+            self._ids, self._documents, self._metadatas = [], [], []
+            self._vectors = np.zeros((0, dim), dtype=np.float32)
+            self._tail = np.zeros((0, dim), dtype=np.float32)
+            self._deleted = set()
+            self._size = 0
+        if self._dim() != dim:
+            raise ValueError(f"Embedding co {dim} chieu, collection '{self.name}' dang dung {self._dim()}")
+
+        used = self._size - self._base_size()
+        if used + extra <= self._tail.shape[0]:
+            return
+        tail = np.empty((max(used + extra, 2 * self._tail.shape[0], 64), dim), dtype=np.float32)
+        tail[:used] = self._tail[:used]
+        self._tail = tail
+
+    def _append(self, doc_id):
+        row = self._size
+        self._size += 1
+        self._rows[doc_id] = row
+        self._ids.append(doc_id)
+        self._documents.append(None)
+        self._metadatas.append(None)
+        return row
+
+    def _mark_deleted(self, row):
+        """Đánh dấu xóa một hàng trong snapshot (read-only), hàng được bỏ hẳn ở lần flush sau"""
+        self._ids[row] = None
+        self._documents[row] = None
+        self._metadatas[row] = None
+        self._deleted.add(row)
+
+    def _write(self, ids, documents, metadatas, embeddings, insert=True, overwrite=True):
+        ids = list(ids)
+        if not ids:
+            return
+
+        vectors = self._embed(documents, embeddings) if (documents is not None or embeddings is not None) else None
+        with self._lock:
+            if vectors is not None:
+                self._reserve(len(ids), vectors.shape[1])
+
+            for i, doc_id in enumerate(ids):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    if not insert:
+                        continue
+                    if vectors is None:
+                        raise ValueError("Can documents hoac embeddings de them document moi")
+                    row = self._append(doc_id)
+                elif not overwrite:
+                    continue
+                elif vectors is not None and row < self._base_size():
+                    # Hàng trong snapshot không sửa tại chỗ: đánh dấu xóa và ghi lại vào _tail
+                    old = row
+                    row = self._append(doc_id)
+                    self._documents[row] = self._documents[old]
+                    self._metadatas[row] = self._metadatas[old]
+                    self._mark_deleted(old)
+
+                if vectors is not None:
+                    self._tail[row - self._base_size()] = vectors[i]
+                if documents is not None:
+                    self._documents[row] = documents[i]
+                if metadatas is not None:
+                    self._metadatas[row] = metadatas[i]
+
+            self._changed()
+
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        # Giống ChromaDB: ID đã tồn tại thì bỏ qua
+        self._write(ids, documents, metadatas, embeddings, overwrite=False)
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        self._write(ids, documents, metadatas, embeddings)
+
+    def update(self, ids, documents=None, metadatas=None, embeddings=None):
+        self._write(ids, documents, metadatas, embeddings, insert=False)
+
+    def delete(self, ids=None, where=None):
+        # Không có ids / where thì không xóa gì (tránh xóa nhầm cả collection)
+        if ids is None and not where:
+            return
+
+        with self._lock:
+            rows = self._select(ids, where, None)
+            # Xóa từ hàng cuối lên, chuyển hàng cuối vào chỗ trống để _tail luôn liên tục
+            for row in sorted(rows, reverse=True):
+                self._remove(row)
+            if rows:
+                self._changed()
+
+    def _remove(self, row):
+        del self._rows[self._ids[row]]
+        base = self._base_size()
+        if row < base:
+            self._mark_deleted(row)
+            return
+
+        last = self._size - 1
+        if row != last:
+            self._tail[row - base] = self._tail[last - base]
+            self._ids[row] = self._ids[last]
+            self._documents[row] = self._documents[last]
+            self._metadatas[row] = self._metadatas[last]
+            self._rows[self._ids[row]] = row
+        self._ids.pop()
+        self._documents.pop()
+        self._metadatas.pop()
+        self._size -= 1
+
+    def count(self):
+        return len(self._rows)
+
+    # --- Đọc ---
+
+    def _select(self, ids, where, where_document):
+        """Các hàng thỏa ids / where / where_document (None = không lọc)"""
+        if ids is not None:
+            rows = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+        elif self._deleted:
+            rows = [row for row in range(self._size) if row not in self._deleted]
+        else:
+            rows = range(self._size)
+        if where:
+            rows = [row for row in rows if matches_where(self._metadatas[row], where)]
+        if where_document:
+            rows = [row for row in rows if matches_document(self._documents[row], where_document)]
+        return list(rows)
+
+    def _records(self, rows, include):
+        return {
+            "ids": [self._ids[row] for row in rows],
+            "documents": [self._documents[row] for row in rows] if "documents" in include else None,
+            "metadatas": [self._metadatas[row] for row in rows] if "metadatas" in include else None,
+            "embeddings": self._gather(rows).tolist() if "embeddings" in include else None,
+        }
+
+    def _gather(self, rows):
+        """Vector float32 của các hàng, lấy từ snapshot hoặc _tail"""
+        rows = np.asarray(rows, dtype=np.int64)
+        base = self._base_size()
+        in_base = rows < base
+        vectors = np.empty((len(rows), self._dim()), dtype=np.float32)
+        vectors[in_base] = self._vectors[rows[in_base]]
+        vectors[~in_base] = self._tail[rows[~in_base] - base]
+        return vectors
+
+    def get(self, ids=None, where=None, where_document=None, include=None, limit=None, offset=None):
+        include = _DEFAULT_GET_INCLUDE if include is None else include
+        with self._lock:
+            rows = self._select(ids, where, where_document)
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return self._records(rows, include)
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None, where_document=None,
+              include=None):
+        include = _DEFAULT_QUERY_INCLUDE if include is None else include
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(list(query_texts or []))
+        queries = normalize_rows(query_embeddings)
+
+        with self._lock:
+            filtered = bool(where or where_document)
+            rows = np.asarray(self._select(None, where, where_document), dtype=np.int64) if filtered else None
+            candidates = len(rows) if filtered else self.count()
+            if candidates == 0 or self._dim() != queries.shape[1]:
+                hits = np.empty((0, len(queries)), dtype=np.int64)
+                scores = np.empty((0, len(queries)), dtype=np.float32)
+            else:
+                hits, scores = self._search(queries, n_results, rows)
+
+            result = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+            for q in range(len(queries)):
+                query_rows = hits[:, q].tolist()
+                records = self._records(query_rows, include)
+                for key in ("ids", "documents", "metadatas", "embeddings"):
+                    result[key].append(records[key])
+                result["distances"].append((1.0 - scores[:, q]).tolist())
+
+        for key in ("documents", "metadatas", "distances", "embeddings"):
+            if key not in include:
+                result[key] = None
+        return result
+
+    def _search(self, queries, k, rows=None):
+        """
+        Top-k chính xác theo cosine
+
+        Args:
+            queries: Ma trận query đã chuẩn hóa (m x d)
+            k: Số kết quả mỗi query
+            rows: Chỉ tìm trong các hàng này (None = mọi hàng)
+
+        Returns:
+            Tuple (hits, scores) dạng (k x m): chỉ số hàng và cosine similarity
+        """
+        if rows is not None:
+            all_scores = self._gather(rows) @ queries.T
+        else:
+            # (n x d) @ (d x m): một phép nhân ma trận cho cả batch query, snapshot và _tail tính riêng
+            tail = self._tail[:self._size - self._base_size()]
+            all_scores = np.vstack([self._vectors @ queries.T, tail @ queries.T])
+            if self._deleted:
+                all_scores[list(self._deleted)] = -np.inf
+                k = min(k, self.count())
+        hits = top_k(all_scores, k)
+        scores = np.take_along_axis(all_scores, hits, axis=0)
+        return (rows[hits] if rows is not None else hits), scores
+
+
+class QuantizedVectorStore(FlatVectorStore):
+    def __init__(self, name, embedding_function, directory, flush_interval=None, rerank=None, block_rows=None):
+        """
+        Flat index nén int8 cho corpus lớn: quét bằng mã int8, xếp hạng lại bằng vector float32
+
+        Snapshot gồm `<name>.npy` (float32, giống FlatVectorStore), `<name>.int8.npy` (mã int8) và
+        `<name>.scale.npy` (hệ số theo từng chiều). Cả hai ma trận đều được memory-map: mỗi query chỉ
+        quét mã int8 (1/4 dung lượng float32) rồi đọc float32 của vài ứng viên tốt nhất để tính lại
+        cosine chính xác, nên phần lớn vector không cần nằm trong RAM. Hàng ghi sau snapshot (trong
+        _tail) được tính chính xác cho tới lần flush sau, lúc đó mã int8 được tạo lại cho cả snapshot.
+
+        Args:
+            name: Tên collection
+            embedding_function: Hàm embed documents / query_texts khi không truyền embeddings
+            directory: Thư mục snapshot (bắt buộc)
+            flush_interval: Như FlatVectorStore
+            rerank: Số ứng viên xếp hạng lại = rerank * k (QUANTIZED_RERANK, mặc định 4)
+            block_rows: Số hàng int8 giải nén mỗi lần khi quét (giới hạn bộ nhớ tạm, mặc định 4096)
+        """
+        self.rerank = max(1, rerank or int(os.getenv("QUANTIZED_RERANK", "4")))
+        self.block_rows = block_rows or _BLOCK_ROWS
+        self._codes = None
+        self._scale = None
+        self._vector_file = None
+        super().__init__(name, embedding_function, directory=directory, flush_interval=flush_interval)
+
+    def _code_paths(self):
+        base = Path(self.directory) / self.name
+        return base.with_suffix(".int8.npy"), base.with_suffix(".scale.npy")
+
+    def _load(self):
+        super()._load()
+        if not self._size:
+            return
+
+        codes_path, scale_path = self._code_paths()
+        try:
+            codes = np.load(codes_path, mmap_mode="r")
+            scale = np.load(scale_path)
+            if codes.shape == (self._size, self._vectors.shape[1]):
+                self._codes, self._scale = codes, scale
+                self._vector_file = open(self._paths()[0], "rb")
+                return
+        except (OSError, ValueError):
+            pass
+
+        # Snapshot float32 có từ trước (vd: VECTOR_STORE=flat) hoặc mã int8 cũ: lượng tử hóa lại
+        self._quantize()
+
+    def flush(self):
+        with self._lock:
+            wrote = self._dirty
+            if wrote:
+                self._close_vector_file()
+            super().flush()
+            if wrote and not self._dirty:
+                self._quantize()
+
+    def _close_vector_file(self):
+        if self._vector_file is not None:
+            self._vector_file.close()
+            self._vector_file = None
+
+    def _quantize(self):
+        """
+        Lượng tử hóa int8 đối xứng theo từng chiều: scale[d] = max|v[:, d]| / 127
+
+        Ghi mã int8 theo từng block từ snapshot float32 (đã memory-map) rồi memory-map mã int8.
+        """
+        vectors_path, _ = self._paths()
+        codes_path, scale_path = self._code_paths()
+        vectors = self._vectors
+        size, dim = vectors.shape
+
+        peak = np.zeros(dim, dtype=np.float32)
+        for start in range(0, size, self.block_rows):
+            np.maximum(peak, np.abs(vectors[start:start + self.block_rows]).max(axis=0), out=peak)
+        scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+
+        # Đóng memory-map cũ trước khi thay file (Windows không cho replace file đang map)
+        self._codes = None
+        try:
+            tmp_codes = codes_path.with_suffix(".tmp.npy")
+            codes = np.lib.format.open_memmap(tmp_codes, mode="w+", dtype=np.int8, shape=(size, dim))
+            for start in range(0, size, self.block_rows):
+                block = vectors[start:start + self.block_rows] / scale
+                codes[start:start + self.block_rows] = np.clip(np.rint(block), -127, 127)
+            codes.flush()
+            del codes
+            np.save(scale_path, scale)
+            os.replace(tmp_codes, codes_path)
+
+            self._codes = np.load(codes_path, mmap_mode="r")
+            self._scale = scale
+            self._close_vector_file()
+            self._vector_file = open(vectors_path, "rb")
+        except OSError as e:
+            print(f"Khong ghi duoc ma int8 cua '{self.name}': {e}")
+
+    def _search(self, queries, k, rows=None):
+        base = self._base_size()
+        # Chưa có mã int8 khớp với snapshot: tìm chính xác
+        if self._codes is None or self._vector_file is None or self._codes.shape[0] != base:
+            return super()._search(queries, k, rows)
+
+        if rows is None:
+            base_rows = np.setdiff1d(np.arange(base), list(self._deleted)) if self._deleted else None
+            tail_rows = np.arange(base, self._size)
+        else:
+            base_rows, tail_rows = rows[rows < base], rows[rows >= base]
+        hits, scores = self._search_codes(queries, k, base_rows)
+        if not len(tail_rows):
+            return hits, scores
+
+        # Hàng trong _tail chưa có mã int8: tính cosine chính xác rồi gộp với kết quả của snapshot
+        tail_scores = self._tail[tail_rows - base] @ queries.T
+        hits = np.vstack([hits, np.broadcast_to(tail_rows[:, None], tail_scores.shape)])
+        scores = np.vstack([scores, tail_scores])
+        order = top_k(scores, k)
+        return np.take_along_axis(hits, order, axis=0), np.take_along_axis(scores, order, axis=0)
+
+    def _search_codes(self, queries, k, rows=None):
+        """Quét mã int8 của snapshot, xếp hạng lại rerank * k ứng viên bằng float32"""
+        count = len(rows) if rows is not None else self._base_size()
+        if count == 0:
+            return np.empty((0, len(queries)), dtype=np.int64), np.empty((0, len(queries)), dtype=np.float32)
+
+        scaled = (queries * self._scale).T
+        approx = np.empty((count, len(queries)), dtype=np.float32)
+        for start in range(0, count, self.block_rows):
+            end = min(start + self.block_rows, count)
+            block = self._codes[rows[start:end]] if rows is not None else self._codes[start:end]
+            approx[start:end] = block.astype(np.float32) @ scaled
+
+        candidates = top_k(approx, k * self.rerank)
+        if rows is not None:
+            candidates = rows[candidates]
+
+        hits, scores = [], []
+        for q in range(len(queries)):
+            # Đọc float32 của ứng viên theo thứ tự trên đĩa, tính cosine chính xác
+            rows_q = np.sort(candidates[:, q])
+            exact = self._read_rows(rows_q) @ queries[q]
+            order = np.argsort(-exact, kind="stable")[:k]
+            hits.append(rows_q[order])
+            scores.append(exact[order])
+        return np.stack(hits, axis=1), np.stack(scores, axis=1)
+
+    def _read_rows(self, rows):
+        """
+        Đọc vector float32 của vài hàng bằng seek/read
+
+        Không đọc qua memory-map: kernel map cả vùng lớn quanh trang bị truy cập (readahead, large folio),
+        sau nhiều query toàn bộ file float32 sẽ nằm trong RSS.
+        """
+        dim = self._dim()
+        row_bytes = dim * 4
+        vectors = np.empty((len(rows), dim), dtype=np.float32)
+        for i, row in enumerate(rows):
+            self._vector_file.seek(self._vectors.offset + int(row) * row_bytes)
+            self._vector_file.readinto(vectors[i])
+        return vectors
+
+
+def create_vector_store(name, embedding_function, client=None, directory=None, backend=None, metadata=None):
+    """
+    Tạo (hoặc mở) collection theo backend
+
+    Args:
+        name: Tên collection
+        embedding_function: Embedding function dùng chung
+        client: ChromaDB client (backend chroma)
+        directory: Thư mục snapshot (backend flat / int8)
+        backend: BACKEND_CHROMA / BACKEND_FLAT / BACKEND_INT8 (mặc định theo VECTOR_STORE, "chroma")
+        metadata: Metadata khi tạo collection ChromaDB mới (vd: {"hnsw:space": "cosine"})
+    """
+    backend = backend or vector_store_backend()
+    if backend == BACKEND_FLAT:
+        return FlatVectorStore(name, embedding_function, directory=directory)
+    if backend == BACKEND_INT8:
+        return QuantizedVectorStore(name, embedding_function, directory=directory)
+
+    try:
+        collection = client.get_collection(name, embedding_function=embedding_function)
+    except Exception:
+        collection = client.create_collection(
+            name=name, metadata=metadata or {"hnsw:space": "cosine"}, embedding_function=embedding_function
+        )
+    return ChromaVectorStore(collection)
+
+
+def vector_store_backend():
+    backend = os.getenv("VECTOR_STORE", BACKEND_CHROMA).strip().lower()
+    if backend not in (BACKEND_CHROMA, BACKEND_FLAT, BACKEND_INT8):
+        print(f"VECTOR_STORE khong hop le: {backend}, dung {BACKEND_CHROMA}")
+        backend = BACKEND_CHROMA
+    return backend
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Batch generate User Stories từ file JSONL hoặc backlog Features của Rally
+
+    python scripts/batch_generate.py --input prompts.jsonl --output stories.jsonl --workers 2
+    python scripts/batch_generate.py --rally-workspace 123 --rally-project 456 --output features.jsonl
+
+Chạy lại cùng --output sẽ bỏ qua các prompt đã generate thành công (resume).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Thêm thư mục gốc vào Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.batch_generator import BatchStoryGenerator, prompts_from_rally_features
+from core.data_connector import DataConnector
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="File JSONL: moi dong {\"id\": ..., \"prompt\": ...} hoac chuoi JSON")
+    parser.add_argument("--rally-workspace", default="", help="Lay prompts tu Rally Features cua workspace")
+    parser.add_argument("--rally-project", default="", help="Lay prompts tu Rally Features cua project")
+    parser.add_argument("--output", required=True, help="File JSONL ket qua (dung de resume)")
+    parser.add_argument("--workers", type=int, default=None, help="So generation dong thoi (mac dinh BATCH_WORKERS hoac 1)")
+    parser.add_argument("--batch-size", type=int, default=16, help="So prompts moi lan batch retrieval")
+    parser.add_argument("--no-semantic-cache", action="store_true", help="Khong dung lai story cua prompt gan giong")
+    args = parser.parse_args()
+
+    if args.input:
+        prompts = args.input
+    elif args.rally_workspace or args.rally_project:
+        prompts = prompts_from_rally_features(DataConnector(), args.rally_workspace, args.rally_project)
+    else:
+        parser.error("Can --input hoac --rally-workspace/--rally-project")
+
+    generator = BatchStoryGenerator(
+        args.output,
+        workers=args.workers,
+        retrieval_batch_size=args.batch_size,
+        semantic_cache=not args.no_semantic_cache
+    )
+
+    print(f"🚀 Batch generation -> {args.output} ({generator.workers} workers)")
+
+    def progress(stats):
+        print(f"  ✅ {stats['completed']} xong, ❌ {stats['failed']} loi, "
+              f"⏭️ {stats['skipped']} bo qua - {stats['stories_per_minute']} stories/min")
+
+    stats = generator.run(prompts, progress=progress)
+
+    print("\n📈 Thống kê:")
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
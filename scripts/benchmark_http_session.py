@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: requests.get tạo kết nối mới mỗi lần vs session pool keep-alive
+Chạy với stub HTTP server local để đo chênh lệch latency do handshake.
+
+    python scripts/benchmark_http_session.py --requests 500
+    python scripts/benchmark_http_session.py --certfile cert.pem --keyfile key.pem   # đo cả TLS
+"""
+
+import argparse
+import json
+import os
+import ssl
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+import urllib3
+
+# Thêm thư mục gốc vào Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.http_session import HTTPSessionPool
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Trả về payload JSON giống Rally QueryResult, giữ kết nối keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+    payload = json.dumps({"QueryResult": {"Results": [], "TotalResultCount": 0}}).encode()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.payload)))
+        self.end_headers()
+        self.wfile.write(self.payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(certfile=None, keyfile=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/slm/webservice/v2.0/defect"
+
+
+def run(label, get, url, count, verify):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = get(url, verify=verify)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<22} mean={statistics.mean(latencies):7.3f}ms  "
+          f"p50={statistics.median(latencies):7.3f}ms  p95={p95:7.3f}ms")
+    return statistics.mean(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="So request moi che do")
+    parser.add_argument("--certfile", help="Cert PEM de chay stub server qua HTTPS")
+    parser.add_argument("--keyfile", help="Private key PEM cho --certfile")
+    args = parser.parse_args()
+
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    server, url = start_stub_server(args.certfile, args.keyfile)
+    print(f"🚀 Stub server: {url}")
+
+    try:
+        pool = HTTPSessionPool(pool_size=4, timeout=5)
+        session = pool.get_session("rally")
+
+        # Warm-up de khong tinh chi phi import/DNS lan dau
+        requests.get(url, verify=False)
+        session.get(url, verify=False)
+
+        bare = run("requests.get (no pool)", requests.get, url, args.requests, False)
+        pooled = run("pooled session", session.get, url, args.requests, False)
+        print(f"\n⚡ Speedup: {bare / pooled:.2f}x")
+        pool.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
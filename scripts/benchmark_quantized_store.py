@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark: flat index float32 vs flat index nén int8 (memory-map + xếp hạng lại float32)
+Đo recall@k so với kết quả chính xác, latency query và bộ nhớ resident (VmRSS, gồm cả trang
+memory-map đã đọc và documents / metadatas luôn nằm trong RAM) của từng chế độ, trước và sau khi
+ghi thêm / xóa một số document. Mỗi chế độ chạy trong process riêng để RSS không lẫn nhau.
+Vector được sinh theo cụm (giống embedding thật hơn vector ngẫu nhiên đều).
+
+    python scripts/benchmark_quantized_store.py
+    python scripts/benchmark_quantized_store.py --size 200000 --dim 384 --rerank 1 2 4 8 --doc-chars 1000
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Thêm thư mục gốc vào Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.vector_store import FlatVectorStore, QuantizedVectorStore
+
+
+BATCH_SIZE = 5000
+WRITE_BATCH = 100
+
+
+def rss_mb():
+    """VmRSS của process hiện tại (MB), None nếu không phải Linux"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def clustered_vectors(rng, count, dim, centers):
+    labels = rng.integers(0, len(centers), count)
+    return (centers[labels] + 0.6 * rng.standard_normal((count, dim))).astype(np.float32)
+
+
+def documents(ids, chars):
+    """Document giả dài khoảng `chars` ký tự, metadata giống bản ghi GitHub / Rally"""
+    texts = [(f"{doc_id} " * (chars // (len(doc_id) + 1) + 1))[:chars] for doc_id in ids]
+    metadatas = [{"type": "issue", "source": "github", "id": doc_id} for doc_id in ids]
+    return texts, metadatas
+
+
+def build_snapshot(directory, vectors, doc_chars):
+    """Ghi snapshot float32, rồi tạo mã int8 từ snapshot đó (như khi chuyển VECTOR_STORE=flat sang int8)"""
+    store = FlatVectorStore("bench", None, directory=directory, flush_interval=float("inf"))
+    for offset in range(0, len(vectors), BATCH_SIZE):
+        batch = vectors[offset:offset + BATCH_SIZE]
+        ids = [f"doc_{offset + i}" for i in range(len(batch))]
+        texts, metadatas = documents(ids, doc_chars)
+        store.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=batch)
+    store.flush()
+
+    start = time.perf_counter()
+    QuantizedVectorStore("bench", None, directory=directory)
+    return time.perf_counter() - start
+
+
+def measure(mode, directory, queries, limit, rerank, writes, doc_chars, output):
+    """Chạy trong process con: load snapshot, chạy queries, ghi / xóa, trả về latency / RSS / kết quả"""
+    before = rss_mb()
+    if mode == "flat":
+        store = FlatVectorStore("bench", None, directory=directory)
+    else:
+        store = QuantizedVectorStore("bench", None, directory=directory, rerank=rerank)
+
+    # Warm-up: trang memory-map được đọc vào RAM ở lần quét đầu tiên
+    store.query(query_embeddings=queries[:1], n_results=limit, include=[])
+
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = store.query(query_embeddings=[query], n_results=limit, include=[])
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(result["ids"][0])
+
+    after = rss_mb()
+
+    # Ghi thêm / xóa giữa hai lần flush: hàng mới nằm trong RAM, snapshot memory-map giữ nguyên
+    dim = len(queries[0])
+    rng = np.random.default_rng(0)
+    for offset in range(0, writes, WRITE_BATCH):
+        ids = [f"new_{offset + i}" for i in range(min(WRITE_BATCH, writes - offset))]
+        texts, metadatas = documents(ids, doc_chars)
+        store.upsert(ids=ids, documents=texts, metadatas=metadatas,
+                     embeddings=rng.standard_normal((len(ids), dim)).astype(np.float32))
+        store.delete(ids=[f"doc_{offset + i}" for i in range(len(ids))])
+    for query in queries:
+        store.query(query_embeddings=[query], n_results=limit, include=[])
+    written = rss_mb()
+
+    output.put({
+        "latencies": latencies,
+        "results": results,
+        "rss": after - before if before is not None and after is not None else None,
+        "rss_write": written - before if before is not None and written is not None else None
+    })
+
+
+def run(mode, directory, queries, limit, writes, doc_chars, rerank=None):
+    output = multiprocessing.Queue()
+    process = multiprocessing.Process(target=measure,
+                                      args=(mode, directory, queries, limit, rerank, writes, doc_chars, output))
+    process.start()
+    report = output.get()
+    process.join()
+    return report
+
+
+def recall(results, expected):
+    hits = sum(len(set(got) & set(want)) for got, want in zip(results, expected))
+    total = sum(len(want) for want in expected)
+    return hits / total if total else 1.0
+
+
+def print_row(label, report, expected=None):
+    latencies = sorted(report["latencies"])
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    rss = f"{report['rss']:8.1f}MB" if report["rss"] is not None else "     n/a"
+    rss_write = f"{report['rss_write']:8.1f}MB" if report["rss_write"] is not None else "     n/a"
+    quality = f"recall@{len(expected[0])}={recall(report['results'], expected):.3f}" if expected else "exact"
+    print(f"  {label:<14} mean={statistics.mean(latencies):8.3f}ms  p95={p95:8.3f}ms  rss={rss}  "
+          f"rss sau ghi={rss_write}  {quality}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100000, help="So document")
+    parser.add_argument("--dim", type=int, default=384, help="So chieu embedding (all-MiniLM-L6-v2 = 384)")
+    parser.add_argument("--queries", type=int, default=100, help="So query")
+    parser.add_argument("--limit", type=int, default=10, help="top-k")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 2, 4], help="He so ung vien xep hang lai")
+    parser.add_argument("--clusters", type=int, default=200, help="So cum khi sinh vector")
+    parser.add_argument("--doc-chars", type=int, default=500, help="Do dai moi document (ky tu)")
+    parser.add_argument("--writes", type=int, default=1000, help="So document ghi them / xoa sau khi do query")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.clusters, args.dim)).astype(np.float32)
+    vectors = clustered_vectors(rng, args.size, args.dim, centers)
+    queries = clustered_vectors(rng, args.queries, args.dim, centers).tolist()
+
+    float_mb = args.size * args.dim * 4 / 1024 / 1024
+    print(f"📦 {args.size} documents, dim={args.dim}, top-{args.limit}, {args.queries} queries")
+    print(f"   float32: {float_mb:.1f}MB, int8: {float_mb / 4:.1f}MB, documents ~{args.size * args.doc_chars / 1024 / 1024:.1f}MB")
+
+    with tempfile.TemporaryDirectory() as directory:
+        quantize_seconds = build_snapshot(directory, vectors, args.doc_chars)
+        del vectors
+        print(f"   Lượng tử hóa int8: {quantize_seconds:.2f}s\n")
+
+        exact = run("flat", directory, queries, args.limit, args.writes, args.doc_chars)
+        print_row("flat float32", exact)
+        for rerank in args.rerank:
+            report = run("int8", directory, queries, args.limit, args.writes, args.doc_chars, rerank)
+            print_row(f"int8 rerank={rerank}", report, exact["results"])
+
+
+if __name__ == "__main__":
+    main()
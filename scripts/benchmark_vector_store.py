@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ChromaDB (PersistentClient, HNSW) vs flat index NumPy in-process
+Dùng vector ngẫu nhiên (không cần embedding model) để đo thời gian ingest, latency query top-k,
+recall của HNSW so với kết quả chính xác của flat index, và thời gian snapshot / load memory-map.
+
+    python scripts/benchmark_vector_store.py
+    python scripts/benchmark_vector_store.py --sizes 1000 10000 100000 --queries 200 --dim 384
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+# Thêm thư mục gốc vào Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.vector_store import BACKEND_CHROMA, BACKEND_FLAT, FlatVectorStore, create_vector_store
+
+
+# Giới hạn số bản ghi mỗi lần add của ChromaDB
+BATCH_SIZE = 5000
+
+
+def ingest(store, vectors):
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), BATCH_SIZE):
+        batch = vectors[offset:offset + BATCH_SIZE]
+        ids = [f"doc_{offset + i}" for i in range(len(batch))]
+        store.add(
+            ids=ids,
+            documents=[f"document {doc_id}" for doc_id in ids],
+            metadatas=[{"type": "issue" if (offset + i) % 2 else "user_story"} for i in range(len(batch))],
+            embeddings=batch.tolist()
+        )
+    store.flush()
+    return time.perf_counter() - start
+
+
+def run_queries(store, queries, limit):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        result = store.query(query_embeddings=[query.tolist()], n_results=limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(result["ids"][0])
+    return latencies, results
+
+
+def summary(label, latencies, extra=""):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"  {label:<8} mean={statistics.mean(latencies):8.3f}ms  p50={statistics.median(latencies):8.3f}ms  "
+          f"p95={p95:8.3f}ms {extra}")
+    return statistics.mean(latencies)
+
+
+def recall(results, expected):
+    hits = sum(len(set(got) & set(want)) for got, want in zip(results, expected))
+    total = sum(len(want) for want in expected)
+    return hits / total if total else 1.0
+
+
+def benchmark(size, dim, query_count, limit, skip_chroma, rng):
+    print(f"\n📦 {size} documents, dim={dim}, top-{limit}, {query_count} queries")
+    vectors = rng.standard_normal((size, dim)).astype(np.float32)
+    queries = rng.standard_normal((query_count, dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as directory:
+        flat = create_vector_store("bench", None, directory=directory, backend=BACKEND_FLAT)
+        flat_ingest = ingest(flat, vectors)
+
+        start = time.perf_counter()
+        loaded = FlatVectorStore("bench", None, directory=directory)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        flat_latencies, expected = run_queries(loaded, queries, limit)
+        flat_mean = summary("flat", flat_latencies, f"ingest+snapshot={flat_ingest:.2f}s  mmap load={load_ms:.1f}ms")
+
+        if skip_chroma:
+            return
+
+        client = chromadb.PersistentClient(path=os.path.join(directory, "chroma"))
+        chroma = create_vector_store("bench", None, client=client, backend=BACKEND_CHROMA)
+        chroma_ingest = ingest(chroma, vectors)
+        chroma_latencies, chroma_results = run_queries(chroma, queries, limit)
+        chroma_mean = summary("chroma", chroma_latencies,
+                              f"ingest={chroma_ingest:.2f}s  recall@{limit}={recall(chroma_results, expected):.3f}")
+
+        print(f"  ⚡ flat nhanh hơn {chroma_mean / flat_mean:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="So document moi lan do")
+    parser.add_argument("--dim", type=int, default=384, help="So chieu embedding (all-MiniLM-L6-v2 = 384)")
+    parser.add_argument("--queries", type=int, default=100, help="So query moi lan do")
+    parser.add_argument("--limit", type=int, default=10, help="top-k")
+    parser.add_argument("--skip-chroma", action="store_true", help="Chi do flat index")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for size in args.sizes:
+        benchmark(size, args.dim, args.queries, args.limit, args.skip_chroma, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,19 +2,31 @@
 """
 ChromaDB Vector Database Setup và Management Script
 Sử dụng để setup vector database cho việc lưu trữ và tìm kiếm dữ liệu từ GitHub và Rally
+
+    python scripts/start_vector_db.py            # khởi tạo collections (embedded hoặc server theo VECTOR_DB_MODE)
+    python scripts/start_vector_db.py --serve    # chạy ChromaDB server cho chế độ VECTOR_DB_MODE=http
+    python scripts/start_vector_db.py --check    # kiểm tra kết nối tới server (upsert / query / delete)
 """
 
-import chromadb
+import argparse
 import os
+import shutil
+import subprocess
 import sys
 import json
+import time
 from datetime import datetime
 from pathlib import Path
 
 # Thêm thư mục gốc vào Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.data_connector import DataConnector
+from core.chroma_client import MODE_HTTP, create_chroma_client, describe, server_settings
+from core.documents import to_epoch
+from core.embedding_cache import get_embedding_function
+from core.ingest import upsert_changed
+from core.keyword_index import get_keyword_index
+from core.sync_engine import SyncEngine
 
 
 class VectorDBManager:
@@ -28,16 +40,24 @@ class VectorDBManager:
         self.db_path = db_path
         self.client = None
         self.collections = {}
+        self.embedding_function = None
+        self.keyword_index = get_keyword_index(db_path)
+        self.sync_engine = SyncEngine(
+            state_path=os.path.join(db_path, "sync_state.json"), keyword_index=self.keyword_index
+        )
         
     def initialize_db(self):
         """Khởi tạo ChromaDB client và tạo collections"""
         try:
-            # Tạo thư mục nếu chưa tồn tại
+            # Tạo thư mục nếu chưa tồn tại (cache, keyword index, sync state luôn ở local)
             Path(self.db_path).mkdir(parents=True, exist_ok=True)
             
-            # Khởi tạo ChromaDB client
-            self.client = chromadb.PersistentClient(path=self.db_path)
-            print(f"✅ Đã khởi tạo ChromaDB tại: {self.db_path}")
+            # Khởi tạo ChromaDB client: embedded hoặc HTTP server (VECTOR_DB_MODE)
+            self.client = create_chroma_client(self.db_path)
+            print(f"✅ Đã khởi tạo ChromaDB tại: {describe(self.db_path)}")
+            
+            # Embedding function có cache trên đĩa, dùng chung với VectorDBConnector
+            self.embedding_function = get_embedding_function(self.db_path)
             
             # Tạo collections cho các loại dữ liệu khác nhau
             self._create_collections()
@@ -81,13 +101,17 @@ class VectorDBManager:
             try:
                 # Kiểm tra xem collection đã tồn tại chưa
                 try:
-                    collection = self.client.get_collection(config["name"])
+                    collection = self.client.get_collection(
+                        config["name"],
+                        embedding_function=self.embedding_function
+                    )
                     print(f"📦 Collection '{config['name']}' đã tồn tại")
                 except:
                     # Tạo collection mới nếu chưa tồn tại
                     collection = self.client.create_collection(
                         name=config["name"],
-                        metadata=config["metadata"]
+                        metadata=config["metadata"],
+                        embedding_function=self.embedding_function
                     )
                     print(f"✅ Đã tạo collection '{config['name']}' - {config['description']}")
                 
@@ -96,30 +120,33 @@ class VectorDBManager:
             except Exception as e:
                 print(f"❌ Lỗi tạo collection '{config['name']}': {e}")
     
-    def add_github_data(self, repo_owner, repo_name, force_refresh=False):
+    def add_github_data(self, repo_owner, repo_name, force_refresh=False, reconcile=False):
         """
-        Thêm dữ liệu GitHub vào vector database
+        Thêm dữ liệu GitHub vào vector database (incremental theo high-water mark)
         
         Args:
             repo_owner: Tên owner của repository
             repo_name: Tên repository
-            force_refresh: Có force làm mới dữ liệu không
+            force_refresh: Có force làm mới dữ liệu không (bỏ qua high-water mark)
+            reconcile: Xóa các issue không còn tồn tại trên GitHub
         """
         try:
             print(f"🔄 Đang thu thập dữ liệu GitHub từ {repo_owner}/{repo_name}...")
             
-            # Khởi tạo data connector
-            connector = DataConnector()
-            
             # Lấy thông tin repository
-            repo_info = connector._get_repo_info(repo_owner, repo_name)
+            repo_info = self.sync_engine.connector._get_repo_info(f"{repo_owner}/{repo_name}")
             if repo_info:
                 self._add_repo_to_vector_db(repo_info, repo_owner, repo_name)
             
-            # Lấy issues và PRs
-            issues = connector._get_github_issues(repo_owner, repo_name)
-            if issues:
-                self._add_issues_to_vector_db(issues, repo_owner, repo_name)
+            # Lấy issues thay đổi kể từ lần sync trước
+            if "github_issues" in self.collections:
+                report = self.sync_engine.sync_github(
+                    self.collections["github_issues"], repo_owner, repo_name,
+                    full=force_refresh, reconcile=reconcile
+                )
+                print(f"📝 Issues: fetched {report['fetched']}, upserted {report['upserted']}, "
+                      f"deleted {report['deleted']}, embedding hit/miss "
+                      f"{report['embedding']['hits']}/{report['embedding']['misses']} ({report['duration']}s)")
                 
             print(f"✅ Đã thêm dữ liệu GitHub {repo_owner}/{repo_name} vào vector database")
             
@@ -144,8 +171,9 @@ class VectorDBManager:
         
         doc_id = f"repo_{repo_owner}_{repo_name}"
         
-        # Thêm vào collection
-        collection.add(
+        # Thêm vào collection (bỏ qua nếu nội dung không đổi)
+        stats = upsert_changed(
+            collection,
             documents=[doc_text],
             ids=[doc_id],
             metadatas=[{
@@ -154,124 +182,48 @@ class VectorDBManager:
                 "name": repo_name,
                 "language": repo_info.get('language', 'Unknown'),
                 "created_at": repo_info.get('created_at', ''),
-                "updated_at": datetime.now().isoformat()
-            }]
+                "created_ts": to_epoch(repo_info.get('created_at')) or 0.0,
+                "updated_at": datetime.now().isoformat(),
+                "updated_ts": datetime.now().timestamp()
+            }],
+            keyword_index=self.keyword_index
         )
         
-        print(f"📦 Đã thêm repository {repo_owner}/{repo_name} vào vector DB")
-    
-    def _add_issues_to_vector_db(self, issues, repo_owner, repo_name):
-        """Thêm GitHub issues/PRs vào vector database"""
-        if "github_issues" not in self.collections:
-            return
-            
-        collection = self.collections["github_issues"]
-        
-        documents = []
-        ids = []
-        metadatas = []
-        
-        for issue in issues:
-            # Tạo document text từ issue
-            doc_text = f"""
-            Title: {issue.get('title', '')}
-            Body: {issue.get('body', '')}
-            State: {issue.get('state', '')}
-            Labels: {', '.join([label.get('name', '') for label in issue.get('labels', [])])}
-            """
-            
-            doc_id = f"issue_{repo_owner}_{repo_name}_{issue.get('number', 0)}"
-            
-            documents.append(doc_text)
-            ids.append(doc_id)
-            metadatas.append({
-                "type": "issue" if not issue.get('pull_request') else "pull_request",
-                "repo_owner": repo_owner,
-                "repo_name": repo_name,
-                "number": issue.get('number', 0),
-                "state": issue.get('state', ''),
-                "created_at": issue.get('created_at', ''),
-                "updated_at": datetime.now().isoformat()
-            })
-        
-        if documents:
-            # Thêm batch vào collection
-            collection.add(
-                documents=documents,
-                ids=ids,
-                metadatas=metadatas
-            )
-            
-            print(f"📝 Đã thêm {len(documents)} issues/PRs từ {repo_owner}/{repo_name} vào vector DB")
+        print(f"📦 Đã thêm repository {repo_owner}/{repo_name} vào vector DB - {stats}")
     
-    def add_rally_data(self, story_ids=None, force_refresh=False):
+    def add_rally_data(self, workspace="", project="", force_refresh=False, reconcile=False):
         """
-        Thêm dữ liệu Rally vào vector database
+        Thêm dữ liệu Rally vào vector database (incremental theo LastUpdateDate)
         
         Args:
-            story_ids: List các story IDs cần thêm (None để lấy tất cả)
-            force_refresh: Có force làm mới dữ liệu không
+            workspace: Workspace ID (tùy chọn)
+            project: Project ID (tùy chọn)
+            force_refresh: Có force làm mới dữ liệu không (bỏ qua high-water mark)
+            reconcile: Xóa các artifact không còn tồn tại trên Rally
         """
         try:
             print("🔄 Đang thu thập dữ liệu Rally...")
             
-            # Khởi tạo data connector
-            connector = DataConnector()
-            
-            # Lấy Rally stories
-            stories = connector._get_rally_stories(story_ids)
-            if stories:
-                self._add_rally_stories_to_vector_db(stories)
+            targets = {
+                "stories": self.collections.get("rally_stories"),
+                "features": self.collections.get("rally_features"),
+                "defects": self.collections.get("rally_defects")
+            }
+            reports = self.sync_engine.sync_rally(
+                targets, workspace, project,
+                kinds=("stories", "features", "defects"),
+                full=force_refresh, reconcile=reconcile
+            )
+            for kind, report in reports.items():
+                print(f"📋 {kind}: fetched {report['fetched']}, upserted {report['upserted']}, "
+                      f"deleted {report['deleted']}, embedding hit/miss "
+                      f"{report['embedding']['hits']}/{report['embedding']['misses']} ({report['duration']}s)")
                 
             print("✅ Đã thêm dữ liệu Rally vào vector database")
             
         except Exception as e:
             print(f"❌ Lỗi thêm dữ liệu Rally: {e}")
     
-    def _add_rally_stories_to_vector_db(self, stories):
-        """Thêm Rally stories vào vector database"""
-        if "rally_stories" not in self.collections:
-            return
-            
-        collection = self.collections["rally_stories"]
-        
-        documents = []
-        ids = []
-        metadatas = []
-        
-        for story in stories:
-            # Tạo document text từ story
-            doc_text = f"""
-            Story ID: {story.get('FormattedID', '')}
-            Name: {story.get('Name', '')}
-            Description: {story.get('Description', '')}
-            State: {story.get('ScheduleState', '')}
-            Iteration: {story.get('Iteration', {}).get('Name', '') if story.get('Iteration') else ''}
-            Owner: {story.get('Owner', {}).get('_refObjectName', '') if story.get('Owner') else ''}
-            """
-            
-            doc_id = f"rally_story_{story.get('FormattedID', '')}"
-            
-            documents.append(doc_text)
-            ids.append(doc_id)
-            metadatas.append({
-                "type": "user_story",
-                "formatted_id": story.get('FormattedID', ''),
-                "state": story.get('ScheduleState', ''),
-                "created_date": story.get('CreationDate', ''),
-                "updated_at": datetime.now().isoformat()
-            })
-        
-        if documents:
-            # Thêm batch vào collection
-            collection.add(
-                documents=documents,
-                ids=ids,
-                metadatas=metadatas
-            )
-            
-            print(f"📋 Đã thêm {len(documents)} Rally stories vào vector DB")
-    
     def search_similar(self, query, collection_name, limit=5):
         """
         Tìm kiếm dữ liệu tương tự trong vector database
@@ -331,13 +283,79 @@ class VectorDBManager:
             print(f"❌ Lỗi xóa collection: {e}")
 
 
+def serve(db_path, host=None, port=None):
+    """Chạy ChromaDB server trên thư mục db_path (chặn tới khi dừng bằng Ctrl+C)"""
+    settings = server_settings()
+    host = host or settings["host"]
+    port = port or settings["port"]
+
+    chroma = shutil.which("chroma")
+    if not chroma:
+        print("❌ Không tìm thấy lệnh `chroma` (cài chromadb trong môi trường hiện tại)")
+        return 1
+
+    Path(db_path).mkdir(parents=True, exist_ok=True)
+    print(f"🚀 ChromaDB server tại http://{host}:{port} - dữ liệu: {db_path}")
+    print("   Đặt VECTOR_DB_MODE=http, CHROMA_HOST, CHROMA_PORT trong .env để app kết nối tới server")
+    try:
+        return subprocess.call([chroma, "run", "--path", db_path, "--host", host, "--port", str(port)])
+    except KeyboardInterrupt:
+        return 0
+
+
+def check_server(db_path, host=None, port=None):
+    """
+    Kiểm tra end-to-end với ChromaDB server đang chạy
+
+    Tạo collection tạm, upsert / query / get / delete một document rồi xóa collection.
+    """
+    settings = {**server_settings(), "mode": MODE_HTTP}
+    settings.update({key: value for key, value in (("host", host), ("port", port)) if value})
+    name = f"healthcheck_{os.getpid()}"
+    try:
+        started = time.perf_counter()
+        client = create_chroma_client(db_path, settings)
+        print(f"✅ Kết nối {describe(db_path, settings)} ({(time.perf_counter() - started) * 1000:.0f}ms)")
+
+        collection = client.create_collection(name, metadata={"hnsw:space": "cosine"})
+        try:
+            collection.upsert(ids=["probe"], embeddings=[[1.0, 0.0, 0.0]],
+                              documents=["probe"], metadatas=[{"type": "probe"}])
+            result = collection.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=1)
+            assert result["ids"][0] == ["probe"], result["ids"]
+            assert collection.get(ids=["probe"])["documents"] == ["probe"]
+            collection.delete(ids=["probe"])
+            assert collection.count() == 0
+        finally:
+            client.delete_collection(name)
+
+        print(f"✅ upsert/query/get/delete OK ({(time.perf_counter() - started) * 1000:.0f}ms)")
+        return 0
+    except Exception as e:
+        print(f"❌ Kiểm tra ChromaDB server thất bại: {e}")
+        return 1
+
+
 def main():
     """Main function để chạy script"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-path", default=os.getenv("VECTOR_DB_PATH", "./chroma_db"), help="Thu muc ChromaDB")
+    parser.add_argument("--serve", action="store_true", help="Chay ChromaDB server (cho VECTOR_DB_MODE=http)")
+    parser.add_argument("--host", default=None, help="Host cua server (mac dinh CHROMA_HOST)")
+    parser.add_argument("--port", type=int, default=None, help="Port cua server (mac dinh CHROMA_PORT)")
+    parser.add_argument("--check", action="store_true", help="Kiem tra ket noi toi ChromaDB server roi thoat")
+    args = parser.parse_args()
+
+    if args.serve:
+        sys.exit(serve(args.db_path, args.host, args.port))
+    if args.check:
+        sys.exit(check_server(args.db_path, args.host, args.port))
+
     print("🚀 Khởi động ChromaDB Vector Database Manager")
     print("=" * 50)
     
     # Khởi tạo Vector DB Manager
-    db_manager = VectorDBManager()
+    db_manager = VectorDBManager(args.db_path)
     
     # Initialize database
     if not db_manager.initialize_db():
@@ -352,7 +370,7 @@ def main():
     print("\n🎯 Vector Database đã sẵn sàng!")
     print("Bạn có thể:")
     print("1. Thêm dữ liệu GitHub: db_manager.add_github_data('owner', 'repo')")
-    print("2. Thêm dữ liệu Rally: db_manager.add_rally_data()")
+    print("2. Thêm dữ liệu Rally: db_manager.add_rally_data('workspace', 'project')")
     print("3. Tìm kiếm: db_manager.search_similar('query', 'collection_name')")
     
     return db_manager
@@ -0,0 +1,114 @@
+"""
+VectorDBConnector qua ChromaDB server (VECTOR_DB_MODE=http)
+Khởi động `scripts/start_vector_db.py --serve` trên port trống; bỏ qua khi chưa cài chromadb.
+"""
+
+import hashlib
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _hash_embed(texts):
+    """Embedding giả từ bag-of-words băm, không cần tải model"""
+    vectors = []
+    for text in texts:
+        vector = [0.0] * 64
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+@pytest.fixture(scope="module")
+def chroma_server(tmp_path_factory):
+    if not shutil.which("chroma"):
+        pytest.skip("Khong tim thay lenh `chroma`")
+
+    port = _free_port()
+    db_path = tmp_path_factory.mktemp("chroma_server")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "scripts", "start_vector_db.py"), "--serve",
+         "--db-path", str(db_path), "--host", "127.0.0.1", "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                chromadb.HttpClient(host="127.0.0.1", port=port).heartbeat()
+                break
+            except Exception:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    pytest.skip("ChromaDB server khong khoi dong duoc")
+                time.sleep(0.5)
+        yield "127.0.0.1", port
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+@pytest.fixture
+def connector(chroma_server, tmp_path, monkeypatch):
+    from core import vector_db
+    from core.embedding_cache import CachedEmbeddingFunction
+
+    host, port = chroma_server
+    monkeypatch.setenv("VECTOR_DB_MODE", "http")
+    monkeypatch.setenv("VECTOR_STORE", "chroma")
+    monkeypatch.setenv("CHROMA_HOST", host)
+    monkeypatch.setenv("CHROMA_PORT", str(port))
+    monkeypatch.setattr(vector_db, "get_embedding_function",
+                        lambda db_path: CachedEmbeddingFunction(base_function=_hash_embed))
+
+    connector = vector_db.VectorDBConnector(db_path=str(tmp_path))
+    assert connector.initialize()
+    yield connector
+    for name in list(connector.collections):
+        connector.client.delete_collection(name)
+
+
+def test_connector_uses_http_client(connector):
+    # Client HTTP trả lời heartbeat, dữ liệu không nằm trong thư mục local
+    assert connector.client.heartbeat()
+    assert not os.path.exists(os.path.join(connector.db_path, "chroma.sqlite3"))
+
+
+def test_add_and_search_over_http(connector):
+    context = {
+        "repo_info": {"description": "Demo repository", "language": "Python", "readme": ""},
+        "issues": [
+            {"number": 1, "title": "Login with SSO fails", "state": "open", "body": "SSO login redirect loop",
+             "labels": [], "updated_at": "2024-01-02T00:00:00Z"},
+            {"number": 2, "title": "Export report to PDF", "state": "closed", "body": "PDF export is blank",
+             "labels": [], "updated_at": "2024-01-03T00:00:00Z"},
+        ]
+    }
+
+    assert connector.add_github_context("org", "repo", context)
+    assert connector.get_stats()["github_data"] == 3
+
+    results = connector.search_relevant_context("SSO login redirect", context_type="github", limit=2)
+    assert results
+    assert "Login with SSO fails" in results[0]["text"]
+
+    closed = connector.search_relevant_context("PDF export", context_type="github", limit=5, state="closed")
+    assert [result["metadata"]["number"] for result in closed] == [2]
@@ -0,0 +1,46 @@
+from core.chunking import Chunker
+
+
+def test_long_first_line_is_chunked_as_body():
+    chunker = Chunker(size=200, overlap=30, enabled=True)
+    text = "a " * 500
+
+    chunks = chunker.split(text)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert sum(chunk.count("a") for chunk in chunks) >= 500
+
+
+def test_long_first_line_is_not_repeated_as_title():
+    chunker = Chunker(size=200, overlap=30, enabled=True)
+    first = "word " * 60
+    text = first + "\n\n" + "\n\n".join(f"Paragraph {i} " + "text " * 20 for i in range(10))
+
+    chunks = chunker.split(text)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert "word" not in chunks[-1]
+
+
+def test_document_title_is_kept_in_every_chunk_within_size():
+    chunker = Chunker(size=200, overlap=30, enabled=True)
+    text = "Issue #12: Login fails\n" + "\n\n".join(f"Paragraph {i} " + "text " * 20 for i in range(10))
+
+    chunks = chunker.split(text)
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith("Issue #12: Login fails\n") for chunk in chunks)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+
+
+def test_long_document_title_is_shortened_in_prefix():
+    chunker = Chunker(size=200, overlap=30, enabled=True)
+    title = "Issue #12: " + "very long title " * 10
+    text = title + "\n" + "\n\n".join(f"Paragraph {i} " + "text " * 20 for i in range(10))
+
+    chunks = chunker.split(text)
+
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert all(chunk.startswith("Issue #12: ") for chunk in chunks)
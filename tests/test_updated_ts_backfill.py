@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("chromadb")
+
+from core import vector_db
+from core.embedding_cache import CachedEmbeddingFunction
+
+
+def _embed(texts):
+    return [[float(len(text)), 1.0, float(text.count("login"))] for text in texts]
+
+
+def _connector(tmp_path, monkeypatch):
+    monkeypatch.setenv("VECTOR_STORE", "flat")
+    monkeypatch.setattr(vector_db, "get_embedding_function",
+                        lambda db_path: CachedEmbeddingFunction(base_function=_embed))
+    connector = vector_db.VectorDBConnector(db_path=str(tmp_path))
+    assert connector.initialize()
+    return connector
+
+
+def test_documents_without_updated_ts_are_backfilled(tmp_path, monkeypatch):
+    connector = _connector(tmp_path, monkeypatch)
+    collection = connector.collections["github_data"]
+    # Document ingest trước khi có updated_ts: chỉ có updated_at dạng ISO
+    collection.upsert(
+        ids=["old_1", "old_2"],
+        documents=["Issue #1: login fails", "Issue #2: export"],
+        metadatas=[{"type": "issue", "updated_at": "2024-01-02T00:00:00Z"},
+                   {"type": "issue", "updated_at": "2020-01-02T00:00:00Z"}]
+    )
+    collection.flush()
+    connector.keyword_index.rebuild(collection)
+    connector.sync_engine.state.reset(vector_db.UPDATED_TS_BACKFILL_KEY)
+
+    reopened = _connector(tmp_path, monkeypatch)
+
+    metadatas = reopened.collections["github_data"].get(ids=["old_1", "old_2"])["metadatas"]
+    assert all("updated_ts" in metadata for metadata in metadatas)
+    results = reopened.search_relevant_context("login", context_type="github", updated_after="2023-01-01")
+    assert [result["id"] for result in results] == ["old_1"]
+    assert reopened.sync_engine.state.get(vector_db.UPDATED_TS_BACKFILL_KEY) == {"github_data": True,
+                                                                                  "rally_data": True}